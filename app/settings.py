@@ -1,3 +1,4 @@
+import copy
 import os
 """
 Django settings for app project.
@@ -17,6 +18,11 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_flag(name):
+    """Indique si une variable d'environnement active une option"""
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
@@ -44,20 +50,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'website.metrics.MetricsMiddleware',
+    'website.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'website.instrumentation.RequestTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'website.routers.PrimaryStickinessMiddleware',
+    'website.profiling.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Moteur Django standard, avec mesure du temps de rendu
+        # (website.instrumentation)
+        'BACKEND': 'website.instrumentation.TimedDjangoTemplates',
         'DIRS': [
             BASE_DIR.joinpath('templates'),
         ],
@@ -82,8 +95,186 @@ WSGI_APPLICATION = 'app.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('LITREVIEW_DB_NAME', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+# Profil de production pour SQLite, activé par LITREVIEW_SQLITE_TUNING :
+# journal WAL (les lectures ne sont plus bloquées par une écriture),
+# mémoire partagée (mmap) et cache de pages agrandis, attente en cas
+# de verrou, et connexions conservées d'une requête à l'autre.
+# Les transactions sont ouvertes en mode IMMEDIATE pour qu'un écrivain
+# prenne le verrou dès le début plutôt que d'échouer en cours de route.
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # En Kio (64 Mio)
+    'busy_timeout': 5000,  # En millisecondes
+}
+
+# LITREVIEW_DB_ENGINE=postgresql remplace SQLite par PostgreSQL
+# (pilote psycopg, dans requirements.txt), avec le pool
+# de connexions de Django. Les connexions sont alors rendues au pool à la
+# fin de chaque requête : CONN_MAX_AGE doit rester à 0.
+
+if os.environ.get('LITREVIEW_DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('LITREVIEW_DB_NAME', 'litreview'),
+            'USER': os.environ.get('LITREVIEW_DB_USER', 'litreview'),
+            'PASSWORD': os.environ.get('LITREVIEW_DB_PASSWORD', ''),
+            'HOST': os.environ.get('LITREVIEW_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('LITREVIEW_DB_PORT', '5432'),
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(
+                        os.environ.get('LITREVIEW_DB_POOL_MIN_SIZE', 2)
+                    ),
+                    'max_size': int(
+                        os.environ.get('LITREVIEW_DB_POOL_MAX_SIZE', 10)
+                    ),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+elif env_flag('LITREVIEW_SQLITE_TUNING'):
+    DATABASES['default'].update({
+        'OPTIONS': {
+            'init_command': ';'.join(
+                f'PRAGMA {name}={value}'
+                for name, value in SQLITE_PRAGMAS.items()
+            ),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'CONN_MAX_AGE': int(os.environ.get('LITREVIEW_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# Réplique en lecture seule, activée par LITREVIEW_DB_REPLICA_NAME (fichier
+# SQLite ou nom de la base PostgreSQL) et/ou LITREVIEW_DB_REPLICA_HOST.
+# Les vues décorées par website.routers.read_only_view y lisent, sauf
+# pendant REPLICA_STICKINESS secondes après une écriture de l'utilisateur.
+# Sans réplique configurée, l'alias "replica" désigne la base principale
+# et n'est pas utilisé (DATABASE_REPLICA vaut None). Pendant les tests,
+# il est un miroir de la base principale, que les tests du routeur
+# activent avec DATABASE_REPLICA.
+
+REPLICA_OVERRIDES = {
+    key: os.environ[variable]
+    for key, variable in (
+        ('NAME', 'LITREVIEW_DB_REPLICA_NAME'),
+        ('HOST', 'LITREVIEW_DB_REPLICA_HOST'),
+    )
+    if os.environ.get(variable)
+}
+
+DATABASES['replica'] = {
+    **copy.deepcopy(DATABASES['default']),
+    **REPLICA_OVERRIDES,
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_REPLICA = 'replica' if REPLICA_OVERRIDES else None
+
+DATABASE_ROUTERS = ['website.routers.ReplicaRouter']
+
+REPLICA_STICKINESS = int(
+    os.environ.get('LITREVIEW_DB_REPLICA_STICKINESS', 10)
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Par défaut, cache en mémoire locale (propre à chaque processus).
+# LITREVIEW_CACHE_DIR active un cache sur fichiers, partagé entre
+# les processus du serveur. Les versions des flux, qui invalident
+# les pages et les auteurs visibles en cache, sont stockées dans la base
+# (Profile.feed_version) : un cache local à chaque processus ne sert
+# jamais de page ni d'auteurs visibles périmés.
+
+if os.environ.get('LITREVIEW_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['LITREVIEW_CACHE_DIR'],
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'litreview',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Durée de conservation (en secondes) des pages de flux
+# et des auteurs visibles en cache
+FEED_CACHE_TIMEOUT = int(os.environ.get('LITREVIEW_FEED_CACHE_TIMEOUT', 300))
+
+# Envoi des pages "Flux" et "Posts" en flux continu (StreamingHttpResponse)
+# plutôt qu'en une seule réponse rendue en mémoire
+FEED_STREAMING = env_flag('LITREVIEW_FEED_STREAMING')
+
+
+# Instrumentation des requêtes (website.instrumentation) : proportion
+# des requêtes mesurées, entre 0 (désactivée) et 1 (toutes)
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.environ.get('LITREVIEW_TIMING_SAMPLE_RATE', 0)
+)
+
+# Profils de requêtes demandés par le staff (website.profiling) :
+# répertoire des fichiers .prof et nombre de profils conservés
+PROFILE_DIR = os.environ.get('LITREVIEW_PROFILE_DIR', BASE_DIR / 'profiles')
+PROFILE_KEEP = int(os.environ.get('LITREVIEW_PROFILE_KEEP', 50))
+
+# Métriques (website.metrics) : répertoire partagé par les processus
+# du serveur, et jeton donnant accès à /metrics/ aux collecteurs
+# (en plus des membres du staff)
+METRICS_DIR = os.environ.get('LITREVIEW_METRICS_DIR')
+METRICS_TOKEN = os.environ.get('LITREVIEW_METRICS_TOKEN')
+
+# Requêtes SQL lentes (website.slow_queries) : seuil en millisecondes
+# (0, la valeur par défaut, désactive le relevé), nombre de requêtes
+# conservées dans la base, et journal tournant
+SLOW_QUERY_THRESHOLD_MS = float(
+    os.environ.get('LITREVIEW_SLOW_QUERY_MS', 0)
+)
+SLOW_QUERY_KEEP = int(os.environ.get('LITREVIEW_SLOW_QUERY_KEEP', 500))
+SLOW_QUERY_LOG = os.environ.get(
+    'LITREVIEW_SLOW_QUERY_LOG', BASE_DIR / 'slow_queries.log'
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'website.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'website.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -29,11 +29,20 @@ urlpatterns = [
     path('signup/', authentication.views.signup_page, name='signup'),
     path('flux/', website.views.flux, name='flux'),
     path('follows/', website.views.follows, name='follows'),
+    path('follows/<str:name>/', website.views.follows_page,
+         name='follows_page'),
     path('unfollow/<str:user_id>/', website.views.unfollow, name='unfollow'),
     path('block/<str:user_id>/', website.views.block, name='block'),
      path('unblock/<str:user_id>/', website.views.unblock, name='unblock'),
+    path('relations/<str:action>/', website.views.update_relations,
+         name='update_relations'),
     path('search-users/', website.views.search_users, name='search_users'),
+    path('feed-posts/', website.views.feed_posts, name='feed_posts'),
+    path('feed-cache-stats/', website.views.feed_cache_stats,
+         name='feed_cache_stats'),
+    path('metrics/', website.views.metrics, name='metrics'),
     path('posts/', website.views.posts, name='posts'),
+    path('export-posts/', website.views.export_posts, name='export_posts'),
     path('create-ticket/', website.views.create_ticket, name='create_ticket'),
     path('edit-ticket/<int:post_id>/<str:post_type>/',
          website.views.edit_post, name='edit_ticket'),
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+
+PASSWORD = "Critiques-Litteraires-2024"
+
+# Lecture de l'utilisateur, création de la session et mise à jour
+# de last_login (les savepoints sont ceux de la transaction de test)
+LOGIN_QUERIES = 9
+
+# Vérification du nom, création de l'utilisateur et de son profil,
+# puis connexion
+SIGNUP_QUERIES = 11
+
+
+class AuthenticationQueryTests(TestCase):
+    """
+    Nombre de requêtes SQL des pages de connexion et d'inscription.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user("reader", password=PASSWORD)
+
+    def test_login_page_does_not_query_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("login"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_login(self):
+        with self.assertNumQueries(LOGIN_QUERIES):
+            response = self.client.post(reverse("login"), {
+                "username": "reader", "password": PASSWORD
+            })
+        self.assertRedirects(
+            response, reverse("flux"), fetch_redirect_response=False
+        )
+
+    def test_signup_creates_user_and_profile(self):
+        with self.assertNumQueries(SIGNUP_QUERIES):
+            response = self.client.post(reverse("signup"), {
+                "username": "writer",
+                "password": PASSWORD,
+                "confirm_password": PASSWORD,
+            })
+        self.assertRedirects(
+            response, reverse("flux"), fetch_redirect_response=False
+        )
+        self.assertTrue(
+            User.objects.filter(username="writer", profile__isnull=False)
+            .exists()
+        )
@@ -50,6 +50,15 @@ IF NOT EXIST "manage.py" (
     exit /b
 )
 
+REM Applique les migrations de la base de données
+echo [INFO] Application des migrations...
+python manage.py migrate >nul 2>&1
+IF ERRORLEVEL 1 (
+    echo [ERREUR] Echec de l'application des migrations.
+    pause
+    exit /b
+)
+
 REM Lance le serveur
 echo [INFO] Lancement du programme...
 start python manage.py runserver
@@ -49,6 +49,15 @@ if [ ! -f "manage.py" ]; then
     exit 1
 fi
 
+# Applique les migrations de la base de données
+echo "[INFO] Application des migrations..."
+python3 manage.py migrate
+if [ $? -ne 0 ]; then
+    echo "[ERREUR] Échec de l'application des migrations."
+    deactivate
+    exit 1
+fi
+
 # Lance le serveur Django en arrière-plan
 echo "[INFO] Lancement du programme..."
 python3 manage.py runserver &
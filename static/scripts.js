@@ -40,9 +40,227 @@ async function searchUser(input, suggestionList) {
 }
 
 
+// Crée un élément HTML avec une classe et un texte optionnels
+function createElement(tagName, className, text) {
+  const element = document.createElement(tagName);
+  if (className) {
+    element.className = className;
+  }
+  if (text !== undefined) {
+    element.textContent = text;
+  }
+  return element;
+}
+
+
+// Crée l'image de couverture d'un ticket
+function createTicketImage(url, title) {
+  const image = createElement('img', 'ticket-image');
+  image.src = url;
+  image.alt = `Image de couverture de ${title}`;
+  image.title = title;
+  return image;
+}
+
+
+// Crée la carte d'un post du flux, comme le template "flux.html"
+function createPostCard(post) {
+  const card = createElement('div', 'post');
+  const action = post.type === 'ticket' ? 'demandé une critique' : 'publié une critique';
+
+  const header = createElement('p');
+  if (post.is_own) {
+    header.textContent = `Vous avez ${action}`;
+  } else {
+    header.appendChild(createElement('span', 'bold-element', `👤 ${post.author}`));
+    header.append(` a ${action}`);
+  }
+  card.appendChild(header);
+  card.appendChild(createElement('p', 'ticket-date', post.time_created));
+
+  let title = post.title;
+  if (post.type === 'review') {
+    title += ' - ' + '★'.repeat(post.rating) + '☆'.repeat(5 - post.rating);
+  }
+  card.appendChild(createElement('p', 'ticket-title', title));
+  card.appendChild(createElement('p', 'ticket-description', post.body));
+
+  if (post.image) {
+    card.appendChild(createTicketImage(post.image, post.title));
+  }
+
+  if (post.review_url) {
+    const buttons = createElement('p', 'ticket-buttons');
+    const link = createElement('a', 'answer-button button', 'Créer une critique');
+    link.href = post.review_url;
+    link.title = 'Créer une critique';
+    buttons.appendChild(link);
+    card.appendChild(buttons);
+  }
+
+  if (post.ticket) {
+    const ticket = createElement('div', 'post');
+    const ticketId = createElement('p', null, 'Ticket ');
+    ticketId.appendChild(createElement('b', null, post.ticket.id));
+    ticket.appendChild(ticketId);
+    ticket.appendChild(createElement('b', null, `👤 ${post.ticket.author}`));
+    ticket.appendChild(createElement('p', 'ticket-title', post.ticket.title));
+    if (post.ticket.description) {
+      ticket.appendChild(createElement('p', 'ticket-description', post.ticket.description));
+    }
+    if (post.ticket.image) {
+      ticket.appendChild(createTicketImage(post.ticket.image, post.ticket.title));
+    }
+    card.appendChild(ticket);
+  }
+
+  return card;
+}
+
+
+// Charge les posts suivants du flux lorsque l'utilisateur atteint le bas de la page
+function infiniteScroll(postsList, moreLink) {
+  if (!postsList || !postsList.dataset.feedUrl || !moreLink) {
+    return;
+  }
+
+  // Le curseur est placé après les posts, pour que la page puisse être envoyée en flux continu
+  let cursor = moreLink.dataset.nextCursor;
+  if (!cursor) {
+    return;
+  }
+
+  // Le lien de pagination reste disponible si JavaScript est désactivé
+  moreLink.classList.add('hidden');
+
+  const sentinel = document.createElement('div');
+  postsList.after(sentinel);
+  let loading = false;
+  let observer;
+
+  const loadMore = async () => {
+    if (loading || !cursor) {
+      return;
+    }
+
+    loading = true;
+    try {
+      const response = await fetch(`${postsList.dataset.feedUrl}?cursor=${encodeURIComponent(cursor)}`);
+      if (!response.ok) {
+        throw new Error(`Erreur HTTP ${response.status}`);
+      }
+      const data = await response.json();
+
+      data.posts.forEach((post) => postsList.appendChild(createPostCard(post)));
+      cursor = data.next_cursor;
+      moreLink.classList.add('hidden');
+    } catch (error) {
+      // En cas d'échec, le lien de pagination réapparaît pour réessayer
+      moreLink.classList.remove('hidden');
+    } finally {
+      loading = false;
+    }
+
+    if (cursor) {
+      moreLink.querySelector('a').href = `?cursor=${encodeURIComponent(cursor)}`;
+    } else {
+      observer.disconnect();
+      moreLink.remove();
+    }
+  };
+
+  moreLink.querySelector('a').addEventListener('click', (e) => {
+    e.preventDefault();
+    loadMore();
+  });
+
+  observer = new IntersectionObserver((entries) => {
+    if (entries[0].isIntersecting) {
+      loadMore();
+    }
+  });
+
+  observer.observe(sentinel);
+}
+
+
+// Boutons de chaque liste de la page "follows", comme le template "follows.html"
+const FOLLOWS_BUTTONS = {
+  following: [
+    ['block', '🚫 Bloquer', "Bloquer l'utilisateur"],
+    ['unfollow', '❌ Désabonner', 'Se désabonner'],
+  ],
+  followers: [
+    ['block', '🚫 Bloquer', "Bloquer l'utilisateur"],
+  ],
+  blocked: [
+    ['unblock', '🔓 Débloquer', "Débloquer l'utilisateur"],
+  ],
+};
+
+
+// Crée l'élément d'un utilisateur d'une liste de la page "follows"
+function createFollowsItem(listName, user) {
+  const item = createElement('div', null, `👤 ${user.username}`);
+  const options = createElement('p', 'follows-options');
+  FOLLOWS_BUTTONS[listName].forEach(([action, label, title]) => {
+    const link = createElement('a', 'button', label);
+    link.href = `../${action}/user_${user.id}/`;
+    link.title = title;
+    options.appendChild(link);
+  });
+  item.appendChild(options);
+  return item;
+}
+
+
+// Charge la page suivante d'une liste de la page "follows" sans recharger la page
+function loadMoreUsers(moreLink) {
+  const list = document.getElementById(`${moreLink.dataset.list}-list`);
+  if (!list || !list.dataset.listUrl) {
+    return;
+  }
+
+  let loading = false;
+  moreLink.addEventListener('click', async (e) => {
+    e.preventDefault();
+    if (loading) {
+      return;
+    }
+
+    loading = true;
+    try {
+      const cursor = encodeURIComponent(moreLink.dataset.nextCursor);
+      const response = await fetch(`${list.dataset.listUrl}?cursor=${cursor}`);
+      if (!response.ok) {
+        throw new Error(`Erreur HTTP ${response.status}`);
+      }
+      const data = await response.json();
+
+      data.users.forEach((user) => list.appendChild(createFollowsItem(list.dataset.list, user)));
+      if (data.next_cursor) {
+        moreLink.dataset.nextCursor = data.next_cursor;
+      } else {
+        moreLink.remove();
+      }
+    } catch (error) {
+      // Le lien reste en place : un nouveau clic relance le chargement
+    } finally {
+      loading = false;
+    }
+  });
+}
+
+
 document.addEventListener('DOMContentLoaded', () => {
   const input = document.getElementById('search-username');
   const suggestionList = document.getElementById('users-suggestions-list');
   searchUser(input, suggestionList);
+
+  const postsList = document.getElementById('posts-list');
+  const moreLink = document.getElementById('more-posts');
+  infiniteScroll(postsList, moreLink);
+
+  document.querySelectorAll('.more-users').forEach(loadMoreUsers);
 });
 
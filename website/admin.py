@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Ticket
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import RequestProfile, SlowQuery, Ticket
 
 
 @admin.register(Ticket)
@@ -7,3 +10,99 @@ class TicketAdmin(admin.ModelAdmin):
     list_display = ('title', 'user', 'time_created')
     list_filter = ('time_created', 'user')
     search_fields = ('title', 'description')
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """
+    Profils de requêtes demandés par le staff (website.profiling) :
+    liste des plus récents, résumé des fonctions les plus coûteuses
+    et téléchargement du fichier .prof.
+    """
+
+    list_display = (
+        'time_created', 'view_name', 'path', 'user', 'duration_ms', 'peak_kb'
+    )
+    list_filter = ('view_name',)
+    search_fields = ('path', 'user__username')
+    fields = (
+        'time_created', 'user', 'path', 'view_name', 'duration_ms', 'peak_kb',
+        'download', 'functions', 'allocations'
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Fichier')
+    def download(self, obj):
+        url = reverse('admin:website_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, obj.file_name)
+
+    @admin.display(description='Fonctions (temps cumulé)')
+    def functions(self, obj):
+        return format_html('<pre>{}</pre>', obj.top_functions)
+
+    @admin.display(description='Allocations mémoire')
+    def allocations(self, obj):
+        return format_html('<pre>{}</pre>', obj.top_allocations)
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='website_requestprofile_download'
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        profile = self.get_object(request, str(pk))
+        if profile is None or not self.has_view_permission(request, profile):
+            raise Http404
+        try:
+            return FileResponse(
+                open(profile.file_path, 'rb'),
+                as_attachment=True,
+                filename=profile.file_name
+            )
+        except FileNotFoundError:
+            raise Http404
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """
+    Requêtes SQL lentes relevées par website.slow_queries,
+    avec leur plan d'exécution.
+    """
+
+    list_display = ('time_created', 'duration_ms', 'view', 'database', 'query')
+    list_filter = ('view', 'database')
+    search_fields = ('sql', 'path')
+    fields = (
+        'time_created', 'duration_ms', 'view', 'path', 'database',
+        'statement', 'params', 'execution_plan'
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Requête')
+    def query(self, obj):
+        return obj.sql[:120]
+
+    @admin.display(description='SQL')
+    def statement(self, obj):
+        return format_html('<pre>{}</pre>', obj.sql)
+
+    @admin.display(description="Plan d'exécution")
+    def execution_plan(self, obj):
+        return format_html('<pre>{}</pre>', obj.plan)
@@ -0,0 +1,188 @@
+import statistics
+import time
+import tracemalloc
+from typing import Callable, NamedTuple
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+# Mesures comparées d'une exécution à l'autre
+METRICS = ("wall_ms", "queries", "peak_kb")
+
+
+class Case(NamedTuple):
+    """
+    Requête mesurée par le benchmark des vues.
+
+    Attributs:
+        name (str): Nom de la vue.
+        method (str): "get" ou "post".
+        url (str): Nom de l'URL de la vue.
+        data (Callable[[int], dict]): Paramètres de la n-ième requête
+        (un titre différent à chaque création de ticket, par exemple).
+    """
+
+    name: str
+    method: str
+    url: str
+    data: Callable[[int], dict]
+
+
+def core_cases(search: str):
+    """
+    Requêtes des vues principales, dans l'ordre du benchmark.
+
+    Args:
+        search (str): Début de nom d'utilisateur recherché par search_users.
+
+    Returns:
+        list[Case]: Les requêtes à mesurer.
+    """
+
+    def ticket(index):
+        return {
+            "title": f"Ticket de test {index}",
+            "description": "Description du ticket de test.",
+        }
+
+    def standalone_review(index):
+        return {
+            "title": f"Ticket critiqué {index}",
+            "description": "Description du ticket critiqué.",
+            "headline": "Critique de test",
+            "rating": 4,
+            "comment": "Commentaire de la critique de test.",
+        }
+
+    return [
+        Case("flux", "get", "flux", lambda index: {}),
+        Case("posts", "get", "posts", lambda index: {}),
+        Case("follows", "get", "follows", lambda index: {}),
+        Case("search_users", "get", "search_users",
+             lambda index: {"search": search}),
+        Case("create_ticket", "post", "create_ticket", ticket),
+        Case("create_standalone_review", "post", "create_standalone_review",
+             standalone_review),
+    ]
+
+
+def send(client, case: Case, index: int = 0):
+    """
+    Envoie la n-ième requête d'un cas et lit toute la réponse,
+    y compris une réponse diffusée en flux continu.
+
+    Les messages laissés par les requêtes précédentes sont supprimés :
+    chaque requête est ainsi mesurée dans le même état.
+
+    Raises:
+        ValueError: Si la vue répond par une erreur.
+    """
+
+    client.cookies.pop(CookieStorage.cookie_name, None)
+    response = getattr(client, case.method)(
+        reverse(case.url), case.data(index)
+    )
+    if response.streaming:
+        b"".join(response.streaming_content)
+    else:
+        response.content
+
+    if response.status_code >= 400:
+        raise ValueError(f"{case.name} : statut {response.status_code}")
+    return response
+
+
+def count_queries(client, case: Case, index: int = 0):
+    """
+    Retourne le nombre de requêtes SQL exécutées par une requête.
+    """
+
+    with CaptureQueriesContext(connection) as queries:
+        send(client, case, index)
+    return len(queries)
+
+
+def measure(client, case: Case, repeat: int = 5, before=None):
+    """
+    Mesure une vue : temps de réponse, nombre de requêtes SQL
+    et pic de mémoire allouée.
+
+    Le temps est mesuré sans tracemalloc, qui ralentit l'exécution :
+    la mémoire est mesurée par une requête supplémentaire.
+
+    Args:
+        client (Client): Client de test, connecté.
+        case (Case): La requête à mesurer.
+        repeat (int): Nombre de requêtes chronométrées.
+        before (Callable | None): Fonction appelée avant chaque requête,
+        pour vider le cache par exemple.
+
+    Returns:
+        dict: Temps médian et minimal (ms), requêtes SQL et pic
+        de mémoire (Ko).
+    """
+
+    before = before or (lambda: None)
+    timings = []
+    for index in range(repeat):
+        before()
+        start = time.perf_counter()
+        send(client, case, index)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    before()
+    queries = count_queries(client, case, repeat)
+
+    before()
+    tracemalloc.start()
+    try:
+        send(client, case, repeat + 1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms": round(statistics.median(timings), 2),
+        "wall_ms_min": round(min(timings), 2),
+        "queries": queries,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(baseline: dict, results: dict, threshold: float):
+    """
+    Compare deux exécutions du benchmark.
+
+    Le temps et la mémoire sont en régression s'ils dépassent la référence
+    de plus de threshold (0.2 pour 20 %). Le nombre de requêtes SQL,
+    qui ne dépend pas de la machine, ne doit jamais augmenter.
+
+    Args:
+        baseline (dict): Résultats de référence, par taille puis par vue.
+        results (dict): Résultats de l'exécution courante.
+        threshold (float): Augmentation relative tolérée.
+
+    Returns:
+        list[str]: Les régressions constatées.
+    """
+
+    regressions = []
+    for size, cases in results.items():
+        for name, current in cases.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                continue
+            for metric in METRICS:
+                before, after = reference.get(metric), current[metric]
+                if before is None:
+                    continue
+                limit = before if metric == "queries" else (
+                    before * (1 + threshold)
+                )
+                if after > limit:
+                    regressions.append(
+                        f"{name} ({size}) : {metric} {before} -> {after}"
+                    )
+    return regressions
@@ -0,0 +1,170 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from .metrics import registry
+from .models import Profile
+
+
+PAGE_KEY = "feed:page:{kind}:{user_id}:{version}:{cursor}"
+STATS_KEY = "feed:stats:{outcome}"
+
+
+def feed_version(user):
+    """
+    Retourne le numéro de version du flux d'un utilisateur.
+
+    La version est lue dans la base (Profile.feed_version), et non dans
+    le cache : tous les processus du serveur voient ainsi la même version,
+    quel que soit le cache configuré. Elle n'est lue qu'une fois par
+    requête (l'ETag et le cache des pages l'utilisent tous deux).
+
+    Args:
+        user (User): L'utilisateur.
+
+    Returns:
+        int: La version courante du flux (0 si l'utilisateur
+        n'a pas de profil).
+    """
+
+    version = getattr(user, "_feed_version", None)
+
+    if version is None:
+        version = Profile.objects.filter(user=user).values_list(
+            "feed_version", flat=True
+        ).first() or 0
+        user._feed_version = version
+
+    return version
+
+
+def bump_feed_versions(user_ids):
+    """
+    Invalide les pages en cache des utilisateurs donnés en incrémentant
+    la version de leur flux.
+
+    L'incrément est écrit dans la transaction en cours : il devient
+    visible de tous les processus en même temps que les données
+    qui l'ont provoqué.
+
+    Args:
+        user_ids (Iterable[int]): Les utilisateurs dont l'ensemble
+        de posts visibles a changé.
+    """
+
+    user_ids = set(user_ids)
+
+    if user_ids:
+        Profile.objects.filter(user__in=user_ids).update(
+            feed_version=F("feed_version") + 1
+        )
+
+
+def cached_feed(kind: str, user, cursor: str | None, build):
+    """
+    Retourne le contenu d'une page (flux ou posts) depuis le cache,
+    ou le construit et le met en cache.
+
+    La clé contient la version du flux de l'utilisateur : une page
+    n'est jamais invalidée explicitement, elle cesse simplement d'être
+    lue dès que la version change.
+
+    Args:
+        kind (str): Le type de page ("flux" ou "posts").
+        user (User): L'utilisateur qui consulte la page.
+        cursor (str | None): Le curseur de la page.
+        build (callable): Fonction construisant le contenu de la page.
+
+    Returns:
+        Le contenu de la page, tel que retourné par build.
+    """
+
+    key = PAGE_KEY.format(
+        kind=kind,
+        user_id=user.pk,
+        version=feed_version(user),
+        cursor=cursor or ""
+    )
+    content = cache.get(key)
+
+    if content is None:
+        _record("misses")
+        registry.inc("litreview_feed_cache_total", kind=kind, outcome="miss")
+        content = build()
+        cache.set(key, content, settings.FEED_CACHE_TIMEOUT)
+    else:
+        _record("hits")
+        registry.inc("litreview_feed_cache_total", kind=kind, outcome="hit")
+
+    return content
+
+
+def feed_etag(kind: str, request):
+    """
+    Calcule l'ETag d'une page (flux ou posts).
+
+    L'ETag dépend de l'utilisateur, de la version de son flux
+    et du curseur : il change dès qu'un post visible, un abonnement
+    ou un blocage change. La version étant lue dans la base,
+    tous les processus du serveur calculent le même ETag et aucun
+    ne répond "304 Not Modified" pour une page périmée.
+
+    Args:
+        kind (str): Le type de page ("flux" ou "posts").
+        request (HttpRequest): La requête HTTP.
+
+    Returns:
+        str: L'ETag de la page.
+    """
+
+    raw = ":".join([
+        kind,
+        str(request.user.pk),
+        str(feed_version(request.user)),
+        request.GET.get("cursor", "")
+    ])
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def _record(outcome: str):
+    """
+    Incrémente le compteur de succès ou d'échecs du cache.
+    """
+
+    key = STATS_KEY.format(outcome=outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def cache_stats():
+    """
+    Retourne les statistiques du cache des flux.
+
+    Returns:
+        dict: Nombre de succès ("hits"), d'échecs ("misses")
+        et taux de succès ("hit_rate", entre 0 et 1).
+    """
+
+    hits = cache.get(STATS_KEY.format(outcome="hits"), 0)
+    misses = cache.get(STATS_KEY.format(outcome="misses"), 0)
+    total = hits + misses
+
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0
+    }
+
+
+def reset_cache_stats():
+    """
+    Remet à zéro les statistiques du cache des flux.
+    """
+
+    cache.delete_many([
+        STATS_KEY.format(outcome="hits"),
+        STATS_KEY.format(outcome="misses")
+    ])
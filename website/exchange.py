@@ -0,0 +1,138 @@
+import csv
+import json
+from .models import Relation, Ticket, Review
+
+
+# Colonnes du format d'échange des posts, communes à l'import et à l'export
+FIELDS = [
+    'type', 'author', 'title', 'description',
+    'ticket_author', 'ticket_title', 'headline', 'rating', 'comment'
+]
+
+# Colonnes supplémentaires de l'export : cible d'un abonnement ou
+# d'un blocage, et date de création des posts (ignorées par l'import)
+EXPORT_FIELDS = FIELDS + ['target', 'time_created']
+
+# Types de lignes décrivant le réseau de l'utilisateur,
+# dans l'ordre des types de Relation (FOLLOW, BLOCK)
+SOCIAL_TYPES = ('follow', 'block')
+
+# Nombre de lignes lues par requête lors d'un export
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def read_rows(stream, file_format: str):
+    """
+    Lit les lignes d'un fichier JSONL ou CSV une à une.
+
+    Yields:
+        tuple: Le numéro de la ligne (à partir de 1) et ses valeurs.
+    """
+
+    if file_format == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            row = {'_error': f'JSON invalide ({error})'}
+        yield number, row
+
+
+def user_rows(user, chunk_size: int = CHUNK_SIZE):
+    """
+    Génère les tickets, critiques, abonnements et blocages d'un utilisateur,
+    au format d'échange.
+
+    Chaque requête est lue avec un itérateur par paquets de chunk_size
+    lignes : la mémoire utilisée ne dépend pas du nombre de posts.
+
+    Args:
+        user (User): L'utilisateur exporté.
+        chunk_size (int): Nombre de lignes lues par requête.
+
+    Yields:
+        dict: Les lignes de l'export.
+    """
+
+    tickets = Ticket.objects.filter(user=user).order_by('pk').values_list(
+        'title', 'description', 'time_created'
+    )
+    for title, description, time_created in tickets.iterator(chunk_size):
+        yield {
+            'type': 'ticket',
+            'author': user.username,
+            'title': title,
+            'description': description,
+            'time_created': time_created.isoformat(),
+        }
+
+    reviews = Review.objects.filter(user=user).order_by('pk').values_list(
+        'ticket__user__username', 'ticket__title',
+        'headline', 'rating', 'comment', 'time_created'
+    )
+    for row in reviews.iterator(chunk_size):
+        ticket_author, ticket_title, headline, rating, comment, created = row
+        yield {
+            'type': 'review',
+            'author': user.username,
+            'ticket_author': ticket_author,
+            'ticket_title': ticket_title,
+            'headline': headline,
+            'rating': rating,
+            'comment': comment,
+            'time_created': created.isoformat(),
+        }
+
+    relations = Relation.objects.filter(user=user).order_by(
+        'kind', 'pk'
+    ).values_list('kind', 'target__username')
+    for kind, target in relations.iterator(chunk_size):
+        yield {
+            'type': SOCIAL_TYPES[kind],
+            'author': user.username,
+            'target': target,
+        }
+
+
+class _Echo:
+    """
+    Pseudo-fichier retournant ce qui y est écrit, pour obtenir
+    chaque ligne CSV sous forme de chaîne.
+    """
+
+    def write(self, value):
+        return value
+
+
+def encode_rows(rows, file_format: str):
+    """
+    Encode des lignes au format JSONL ou CSV, une à une.
+
+    Args:
+        rows (Iterable[dict]): Les lignes à encoder.
+        file_format (str): "jsonl" ou "csv".
+
+    Yields:
+        str: Les lignes encodées, en-tête compris pour le CSV.
+    """
+
+    if file_format == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+        return
+
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
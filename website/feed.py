@@ -0,0 +1,788 @@
+import base64
+import heapq
+import json
+from datetime import datetime
+from itertools import chain, islice
+from typing import NamedTuple
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Value, BooleanField, IntegerField, F, Max, Q
+from django.urls import reverse
+from django.utils import dateformat, timezone
+from .models import FeedEntry, Relation, Ticket, Review
+from .visibility import IdList, visible_authors
+
+
+# Nombre de posts affichés par page du flux
+PAGE_SIZE = 20
+
+# Taille des lots d'insertion dans le flux matérialisé
+BATCH_SIZE = 500
+
+# Types de posts, utilisés comme second critère de tri du flux
+POST_TICKET = 0
+POST_REVIEW = 1
+
+
+class FeedPage(NamedTuple):
+    """
+    Page du flux.
+
+    Attributs:
+        posts (list): Tickets et critiques de la page, triés du plus récent
+        au plus ancien.
+        next_cursor (str | None): Curseur de la page suivante,
+        None s'il s'agit de la dernière page.
+    """
+
+    posts: list
+    next_cursor: str | None
+
+
+def encode_cursor(time_created: datetime, post_type: int, post_id: int):
+    """
+    Encode la position d'un post dans le flux sous forme de curseur.
+
+    Args:
+        time_created (datetime): Date de création du post.
+        post_type (int): Type du post (POST_TICKET ou POST_REVIEW).
+        post_id (int): Identifiant du post.
+
+    Returns:
+        str: Le curseur, utilisable dans une URL.
+    """
+
+    raw = f"{time_created.isoformat()}|{post_type}|{post_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str | None):
+    """
+    Décode un curseur produit par encode_cursor.
+
+    Args:
+        cursor (str | None): Le curseur reçu dans la requête.
+
+    Returns:
+        tuple | None: (time_created, post_type, post_id), ou None si
+        le curseur est absent ou invalide.
+    """
+
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        time_created, post_type, post_id = raw.split("|")
+        return (
+            datetime.fromisoformat(time_created),
+            int(post_type),
+            int(post_id)
+        )
+    except ValueError:
+        return None
+
+
+def visible_tickets(user):
+    """
+    Tickets visibles dans le flux d'un utilisateur.
+
+    Il s'agit des tickets de l'utilisateur et des utilisateurs qu'il suit,
+    à l'exclusion des utilisateurs bloqués ou qui l'ont bloqué.
+    Le filtre porte sur la liste précalculée des auteurs visibles.
+
+    Args:
+        user (User): L'utilisateur dont on construit le flux.
+
+    Returns:
+        QuerySet: Les tickets visibles, sans tri.
+    """
+
+    authors = visible_authors(user)
+    return Ticket.objects.filter(user_id__in=IdList(authors.authors))
+
+
+def visible_reviews(user):
+    """
+    Critiques visibles dans le flux d'un utilisateur.
+
+    Il s'agit des critiques de l'utilisateur, des utilisateurs qu'il suit
+    et des critiques portant sur les tickets des utilisateurs suivis,
+    à l'exclusion de celles impliquant un utilisateur bloqué.
+
+    Args:
+        user (User): L'utilisateur dont on construit le flux.
+
+    Returns:
+        QuerySet: Les critiques visibles, sans tri.
+    """
+
+    authors = visible_authors(user)
+    reviews = Review.objects.filter(
+        Q(user_id__in=IdList(authors.authors))
+        | Q(ticket__user_id__in=IdList(authors.followed))
+    )
+
+    if not authors.hidden:
+        return reviews
+
+    hidden = IdList(authors.hidden)
+    return reviews.exclude(
+        Q(user_id__in=hidden) | Q(ticket__user_id__in=hidden)
+    )
+
+
+def _after(queryset, cursor, post_type: int):
+    """
+    Restreint une requête aux posts situés après le curseur.
+
+    Le flux est trié par (time_created, type, id) décroissants :
+    la condition est simplifiée pour chaque côté de l'union
+    puisque le type y est constant.
+    """
+
+    if cursor is None:
+        return queryset
+
+    time_created, cursor_type, cursor_id = cursor
+
+    if post_type < cursor_type:
+        return queryset.filter(time_created__lte=time_created)
+    if post_type > cursor_type:
+        return queryset.filter(time_created__lt=time_created)
+    return queryset.filter(
+        Q(time_created__lt=time_created)
+        | Q(time_created=time_created, id__lt=cursor_id)
+    )
+
+
+def merged_rows(tickets, reviews, cursor: str | None = None,
+                page_size: int = PAGE_SIZE):
+    """
+    Requête UNION ALL des lignes (time_created, post_type, id)
+    d'une page du flux fusionnant tickets et critiques.
+
+    Args:
+        tickets (QuerySet): Les tickets à inclure.
+        reviews (QuerySet): Les critiques à inclure.
+        cursor (str | None): Curseur de la page demandée.
+        page_size (int): Nombre de posts par page.
+
+    Returns:
+        QuerySet: Au plus page_size + 1 lignes, triées par date décroissante.
+    """
+
+    position = decode_cursor(cursor)
+
+    ticket_rows = _after(tickets, position, POST_TICKET).order_by().annotate(
+        post_type=Value(POST_TICKET, output_field=IntegerField())
+    ).values_list("time_created", "post_type", "id")
+
+    review_rows = _after(reviews, position, POST_REVIEW).order_by().annotate(
+        post_type=Value(POST_REVIEW, output_field=IntegerField())
+    ).values_list("time_created", "post_type", "id")
+
+    return ticket_rows.union(review_rows, all=True).order_by(
+        "-time_created", "-post_type", "-id"
+    )[:page_size + 1]
+
+
+def merged_feed(tickets, reviews, cursor: str | None = None,
+                page_size: int = PAGE_SIZE):
+    """
+    Construit une page du flux fusionnant tickets et critiques.
+
+    La fusion et le tri sont faits par la base de données avec
+    un UNION ALL, puis seuls les posts de la page sont chargés.
+    La pagination se fait par curseur sur (time_created, type, id) :
+    le coût d'une page ne dépend pas de l'historique de l'utilisateur.
+
+    Args:
+        tickets (QuerySet): Les tickets à inclure.
+        reviews (QuerySet): Les critiques à inclure.
+        cursor (str | None): Curseur de la page demandée.
+        page_size (int): Nombre de posts par page.
+
+    Returns:
+        FeedPage: Les posts de la page et le curseur de la page suivante.
+    """
+
+    rows = list(merged_rows(tickets, reviews, cursor, page_size))
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*rows[-1])
+
+    return FeedPage(load_posts(rows), next_cursor)
+
+
+def _ticket_posts(tickets):
+    """
+    Tickets avec les champs attendus par les templates du flux.
+    """
+
+    return tickets.annotate(
+        is_ticket=Value(True, output_field=BooleanField())
+    ).select_related("user")
+
+
+def _review_posts(reviews):
+    """
+    Critiques avec les champs attendus par les templates du flux.
+    """
+
+    return reviews.annotate(
+        is_ticket=Value(False, output_field=BooleanField()),
+        title=F("headline")
+    ).select_related("user", "ticket", "ticket__user")
+
+
+def _post_position(post):
+    """
+    Position (time_created, type, id) d'un post chargé par _ticket_posts
+    ou _review_posts.
+    """
+
+    post_type = POST_TICKET if post.is_ticket else POST_REVIEW
+    return post.time_created, post_type, post.pk
+
+
+def iter_merged_feed(tickets, reviews, cursor: str | None = None,
+                     page_size: int = PAGE_SIZE):
+    """
+    Génère les posts d'une page du flux fusionnant tickets et critiques
+    au fur et à mesure de leur lecture, sans construire la page en mémoire.
+
+    Les tickets et les critiques sont lus par deux requêtes triées
+    par date décroissante, fusionnées à la volée dans l'ordre de
+    merged_feed.
+
+    Args:
+        tickets (QuerySet): Les tickets à inclure.
+        reviews (QuerySet): Les critiques à inclure.
+        cursor (str | None): Curseur de la page demandée.
+        page_size (int): Nombre de posts par page.
+
+    Yields:
+        Ticket | Review: Les posts de la page.
+
+    Returns:
+        str | None: Le curseur de la page suivante.
+    """
+
+    position = decode_cursor(cursor)
+    sources = [
+        _ticket_posts(_after(tickets, position, POST_TICKET)),
+        _review_posts(_after(reviews, position, POST_REVIEW)),
+    ]
+    posts = heapq.merge(
+        *(
+            source.order_by("-time_created", "-id")[:page_size + 1].iterator(
+                chunk_size=page_size + 1
+            )
+            for source in sources
+        ),
+        key=_post_position,
+        reverse=True
+    )
+
+    last = None
+    for index, post in enumerate(posts):
+        if index == page_size:
+            return encode_cursor(*_post_position(last))
+        yield post
+        last = post
+    return None
+
+
+def load_posts(rows):
+    """
+    Charge les tickets et critiques correspondant aux lignes du flux.
+
+    Args:
+        rows (list): Liste de tuples (time_created, post_type, id).
+
+    Returns:
+        list: Les posts, dans l'ordre des lignes, avec les champs
+        "is_ticket" et "title" attendus par les templates.
+    """
+
+    ticket_ids = [post_id for _, kind, post_id in rows if kind == POST_TICKET]
+    review_ids = [post_id for _, kind, post_id in rows if kind == POST_REVIEW]
+
+    tickets = _ticket_posts(Ticket.objects.all()).in_bulk(
+        ticket_ids
+    ) if ticket_ids else {}
+
+    reviews = _review_posts(Review.objects.all()).in_bulk(
+        review_ids
+    ) if review_ids else {}
+
+    posts = []
+    for _, kind, post_id in rows:
+        source = tickets if kind == POST_TICKET else reviews
+        if post_id in source:
+            posts.append(source[post_id])
+    return posts
+
+
+def feed_entries(user, cursor: str | None = None,
+                 page_size: int = PAGE_SIZE):
+    """
+    Entrées du flux matérialisé d'un utilisateur situées après un curseur.
+
+    La requête est un parcours de l'index
+    (viewer, time_created, post_type, post_id), sans jointure sur
+    les abonnements ni les blocages. Elle retourne une entrée de plus
+    que la taille de la page, pour savoir s'il existe une page suivante.
+
+    Args:
+        user (User): L'utilisateur dont on affiche le flux.
+        cursor (str | None): Curseur de la page demandée.
+        page_size (int): Nombre de posts par page.
+
+    Returns:
+        QuerySet: Au plus page_size + 1 entrées, avec leurs posts.
+    """
+
+    entries = FeedEntry.objects.filter(viewer=user)
+
+    position = decode_cursor(cursor)
+    if position is not None:
+        time_created, post_type, post_id = position
+        entries = entries.filter(time_created__lte=time_created).filter(
+            Q(time_created__lt=time_created)
+            | Q(time_created=time_created, post_type__lt=post_type)
+            | Q(time_created=time_created, post_type=post_type,
+                post_id__lt=post_id)
+        )
+
+    return entries.select_related(
+        "ticket__user", "review__user", "review__ticket__user"
+    ).order_by("-time_created", "-post_type", "-post_id")[:page_size + 1]
+
+
+def entry_cursor(entry: FeedEntry):
+    """
+    Curseur désignant la position d'une entrée du flux.
+    """
+
+    return encode_cursor(entry.time_created, entry.post_type, entry.post_id)
+
+
+def entry_post(entry: FeedEntry):
+    """
+    Post d'une entrée du flux, avec les champs "is_ticket" et "title"
+    attendus par les templates.
+    """
+
+    if entry.post_type == POST_TICKET:
+        post = entry.ticket
+        post.is_ticket = True
+    else:
+        post = entry.review
+        post.is_ticket = False
+        post.title = post.headline
+    return post
+
+
+def latest_feed_post(user):
+    """
+    Date de création du post le plus récent du flux d'un utilisateur.
+
+    Args:
+        user (User): L'utilisateur concerné.
+
+    Returns:
+        datetime | None: La date, ou None si le flux est vide.
+    """
+
+    return FeedEntry.objects.filter(viewer=user).aggregate(
+        latest=Max("time_created")
+    )["latest"]
+
+
+def latest_user_post(user):
+    """
+    Date de création du post le plus récent publié par un utilisateur.
+
+    Args:
+        user (User): L'utilisateur concerné.
+
+    Returns:
+        datetime | None: La date, ou None si l'utilisateur n'a rien publié.
+    """
+
+    dates = [
+        model.objects.filter(user=user).aggregate(
+            latest=Max("time_created")
+        )["latest"]
+        for model in (Ticket, Review)
+    ]
+    return max((date for date in dates if date), default=None)
+
+
+def feed_page(user, cursor: str | None = None, page_size: int = PAGE_SIZE):
+    """
+    Construit une page du flux matérialisé d'un utilisateur.
+
+    Args:
+        user (User): L'utilisateur dont on affiche le flux.
+        cursor (str | None): Curseur de la page demandée.
+        page_size (int): Nombre de posts par page.
+
+    Returns:
+        FeedPage: Les posts de la page et le curseur de la page suivante.
+    """
+
+    entries = list(feed_entries(user, cursor, page_size))
+
+    next_cursor = None
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        next_cursor = entry_cursor(entries[-1])
+
+    return FeedPage([entry_post(entry) for entry in entries], next_cursor)
+
+
+def iter_feed_page(user, cursor: str | None = None,
+                   page_size: int = PAGE_SIZE):
+    """
+    Génère les posts d'une page du flux matérialisé au fur et à mesure
+    de leur lecture, sans construire la page en mémoire.
+
+    Args:
+        user (User): L'utilisateur dont on affiche le flux.
+        cursor (str | None): Curseur de la page demandée.
+        page_size (int): Nombre de posts par page.
+
+    Yields:
+        Ticket | Review: Les posts de la page.
+
+    Returns:
+        str | None: Le curseur de la page suivante.
+    """
+
+    entries = feed_entries(user, cursor, page_size)
+    last = None
+
+    for index, entry in enumerate(entries.iterator(chunk_size=page_size)):
+        if index == page_size:
+            return entry_cursor(last)
+        yield entry_post(entry)
+        last = entry
+    return None
+
+
+def _format_date(value: datetime):
+    """
+    Formate une date comme le filtre "date" des templates du flux.
+    """
+
+    return dateformat.format(timezone.localtime(value), "H:i, j F Y")
+
+
+def serialize_post(post, user):
+    """
+    Sérialise un post du flux pour l'API JSON.
+
+    Args:
+        post (Ticket | Review): Le post, tel que retourné par entry_post.
+        user (User): L'utilisateur qui consulte le flux.
+
+    Returns:
+        dict: Les données nécessaires à l'affichage du post.
+    """
+
+    data = {
+        "type": "ticket" if post.is_ticket else "review",
+        "id": post.id,
+        "author": post.user.username,
+        "is_own": post.user_id == user.id,
+        "time_created": _format_date(post.time_created),
+        "title": post.title,
+        "image": post.image.url if post.is_ticket and post.image else None,
+    }
+
+    if post.is_ticket:
+        data["body"] = post.description
+        data["review_url"] = (
+            reverse("create_related_review", args=[post.id])
+            if post.user_id != user.id and not post.has_review
+            else None
+        )
+    else:
+        ticket = post.ticket
+        data["body"] = post.comment
+        data["rating"] = post.rating
+        data["ticket"] = {
+            "id": ticket.id,
+            "author": ticket.user.username,
+            "title": ticket.title,
+            "description": ticket.description,
+            "image": ticket.image.url if ticket.image else None,
+        }
+
+    return data
+
+
+def stream_feed_json(user, cursor: str | None = None,
+                     page_size: int = PAGE_SIZE):
+    """
+    Génère, morceau par morceau, la page du flux au format JSON.
+
+    Les entrées sont lues avec un itérateur et sérialisées une à une :
+    la page n'est jamais construite entièrement en mémoire.
+    Le document produit a la forme
+    {"posts": [...], "next_cursor": "..." | null}.
+
+    Args:
+        user (User): L'utilisateur dont on affiche le flux.
+        cursor (str | None): Curseur de la page demandée.
+        page_size (int): Nombre de posts par page.
+
+    Yields:
+        str: Les morceaux du document JSON.
+    """
+
+    entries = feed_entries(user, cursor, page_size)
+    next_cursor = None
+    last = None
+
+    yield '{"posts": ['
+    for index, entry in enumerate(entries.iterator(chunk_size=page_size)):
+        if index == page_size:
+            next_cursor = entry_cursor(last)
+            break
+        data = serialize_post(entry_post(entry), user)
+        yield ("," if index else "") + json.dumps(data)
+        last = entry
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+
+def _followers(author_ids):
+    """
+    Sous-requête des abonnés des auteurs (index relation_target_idx).
+    """
+
+    return Relation.objects.filter(
+        target__in=author_ids, kind=Relation.FOLLOW
+    ).values("user_id")
+
+
+def _hidden_from(author_ids):
+    """
+    Condition écartant les utilisateurs bloqués par les auteurs
+    ou qui les ont bloqués.
+    """
+
+    blocks = Relation.objects.filter(kind=Relation.BLOCK)
+    return (
+        Q(pk__in=blocks.filter(user__in=author_ids).values("target_id"))
+        | Q(pk__in=blocks.filter(target__in=author_ids).values("user_id"))
+    )
+
+
+def ticket_audience(ticket: Ticket):
+    """
+    Utilisateurs dont le flux doit contenir un ticket.
+
+    Il s'agit de l'auteur et de ses abonnés, à l'exclusion des utilisateurs
+    qu'il a bloqués ou qui l'ont bloqué.
+
+    Args:
+        ticket (Ticket): Le ticket publié.
+
+    Returns:
+        QuerySet: Les utilisateurs concernés.
+    """
+
+    return User.objects.filter(
+        Q(pk=ticket.user_id) | Q(pk__in=_followers([ticket.user_id]))
+    ).exclude(_hidden_from([ticket.user_id]))
+
+
+def review_audience(review: Review):
+    """
+    Utilisateurs dont le flux doit contenir une critique.
+
+    Il s'agit de l'auteur, de ses abonnés et des abonnés de l'auteur
+    du ticket, à l'exclusion des utilisateurs bloqués par l'un des deux
+    auteurs ou qui ont bloqué l'un d'eux.
+
+    Args:
+        review (Review): La critique publiée.
+
+    Returns:
+        QuerySet: Les utilisateurs concernés.
+    """
+
+    authors = [review.user_id, review.ticket.user_id]
+
+    return User.objects.filter(
+        Q(pk=review.user_id) | Q(pk__in=_followers(authors))
+    ).exclude(_hidden_from(authors))
+
+
+def fan_out(post):
+    """
+    Ajoute un nouveau post au flux de tous les utilisateurs concernés.
+
+    Args:
+        post (Ticket | Review): Le post publié.
+
+    Returns:
+        list: Les identifiants des utilisateurs concernés.
+    """
+
+    return list(fan_out_many([post]))
+
+
+def fan_out_many(posts):
+    """
+    Ajoute des posts au flux de tous les utilisateurs concernés.
+
+    L'audience ne dépend que de l'auteur (et de l'auteur du ticket pour
+    une critique) : elle est calculée une seule fois par auteur, et toutes
+    les entrées sont insérées par lots.
+
+    Args:
+        posts (Iterable[Ticket | Review]): Les posts publiés.
+
+    Returns:
+        set: Les identifiants des utilisateurs concernés.
+    """
+
+    audiences = {}
+    entries = []
+
+    for post in posts:
+        if isinstance(post, Ticket):
+            key = (POST_TICKET, post.user_id)
+            audience = ticket_audience
+            fields = {"post_type": POST_TICKET, "ticket": post}
+        else:
+            key = (POST_REVIEW, post.user_id, post.ticket.user_id)
+            audience = review_audience
+            fields = {"post_type": POST_REVIEW, "review": post}
+
+        if key not in audiences:
+            audiences[key] = list(
+                audience(post).values_list("id", flat=True)
+            )
+
+        entries.extend(
+            FeedEntry(
+                viewer_id=viewer_id,
+                post_id=post.pk,
+                time_created=post.time_created,
+                **fields
+            )
+            for viewer_id in audiences[key]
+        )
+
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+    return set(chain.from_iterable(audiences.values()))
+
+
+def post_viewers(post):
+    """
+    Utilisateurs dont le flux affiche un post, y compris
+    à l'intérieur d'une critique dans le cas d'un ticket.
+
+    Args:
+        post (Ticket | Review): Le post concerné.
+
+    Returns:
+        set: Les identifiants des utilisateurs concernés.
+    """
+
+    if isinstance(post, Ticket):
+        entries = FeedEntry.objects.filter(
+            Q(ticket=post) | Q(review__ticket=post)
+        )
+    else:
+        entries = FeedEntry.objects.filter(review=post)
+
+    return set(entries.values_list("viewer_id", flat=True)) | {post.user_id}
+
+
+def _insert_entries(user, tickets, reviews, batch_size: int = BATCH_SIZE):
+    """
+    Ajoute au flux d'un utilisateur les tickets et critiques donnés,
+    par lots et sans dupliquer les entrées existantes.
+    """
+
+    entries = chain(
+        (
+            FeedEntry(
+                viewer=user, post_type=POST_TICKET, post_id=pk,
+                ticket_id=pk, time_created=time_created
+            )
+            for pk, time_created in tickets.values_list(
+                "id", "time_created"
+            ).iterator(chunk_size=batch_size)
+        ),
+        (
+            FeedEntry(
+                viewer=user, post_type=POST_REVIEW, post_id=pk,
+                review_id=pk, time_created=time_created
+            )
+            for pk, time_created in reviews.values_list(
+                "id", "time_created"
+            ).iterator(chunk_size=batch_size)
+        ),
+    )
+
+    while batch := list(islice(entries, batch_size)):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def sync_feed(user, user_ids):
+    """
+    Resynchronise le flux d'un utilisateur pour les posts impliquant
+    certains utilisateurs.
+
+    Utilisée après un abonnement, un désabonnement, un blocage ou
+    un déblocage : les entrées devenues invisibles sont supprimées
+    et les posts devenus visibles sont ajoutés.
+
+    Args:
+        user (User): L'utilisateur dont le flux est mis à jour.
+        user_ids (Iterable[int]): Les utilisateurs dont la relation
+        avec l'utilisateur a changé.
+    """
+
+    user_ids = list(user_ids)
+    tickets = visible_tickets(user)
+    reviews = visible_reviews(user)
+
+    with transaction.atomic():
+        FeedEntry.objects.filter(viewer=user).filter(
+            Q(ticket__user__in=user_ids)
+            | Q(review__user__in=user_ids)
+            | Q(review__ticket__user__in=user_ids)
+        ).exclude(ticket__in=tickets).exclude(review__in=reviews).delete()
+
+        _insert_entries(
+            user,
+            tickets.filter(user__in=user_ids),
+            reviews.filter(Q(user__in=user_ids) | Q(ticket__user__in=user_ids))
+        )
+
+
+def rebuild_feed(user):
+    """
+    Reconstruit entièrement le flux matérialisé d'un utilisateur.
+
+    Args:
+        user (User): L'utilisateur dont le flux est reconstruit.
+    """
+
+    with transaction.atomic():
+        FeedEntry.objects.filter(viewer=user).delete()
+        _insert_entries(user, visible_tickets(user), visible_reviews(user))
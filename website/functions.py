@@ -1,8 +1,12 @@
+from uuid import uuid4
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from functools import wraps
-from django.http import HttpRequest
+from django.http import HttpRequest, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.template.loader import get_template, render_to_string
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 
 def delete_messages(request: HttpRequest):
@@ -14,6 +18,108 @@ def delete_messages(request: HttpRequest):
         pass
 
 
+def has_pending_messages(request: HttpRequest):
+    """
+    Indique si des messages sont en attente d'affichage,
+    sans les marquer comme lus.
+    """
+    return len(messages.get_messages(request)) > 0
+
+
+def conditional_page(etag_func, last_modified_func):
+    """
+    Décorateur gérant les requêtes conditionnelles (ETag et Last-Modified)
+    d'une page personnelle.
+
+    La réponse "304 Not Modified" est envoyée sans exécuter la vue
+    lorsque la page n'a pas changé. Les validateurs sont ignorés
+    lorsque des messages sont en attente, pour que la page les affiche.
+    La réponse est marquée privée et doit être revalidée à chaque accès.
+
+    Args:
+        etag_func (callable): Calcule l'ETag à partir de la requête.
+        last_modified_func (callable): Calcule la date de dernière
+        modification à partir de la requête.
+    """
+    def etag(request, *args, **kwargs):
+        if has_pending_messages(request):
+            return None
+        return etag_func(request)
+
+    def last_modified(request, *args, **kwargs):
+        if has_pending_messages(request):
+            return None
+        return last_modified_func(request)
+
+    def decorator(view_func):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(
+            view_func
+        )
+        return cache_control(private=True, no_cache=True)(view)
+
+    return decorator
+
+
+def _render_cards(request: HttpRequest, card_template: str, posts):
+    """
+    Génère le rendu HTML de chaque post, puis retourne la valeur
+    de retour du générateur de posts (le curseur de la page suivante).
+    """
+    template = get_template(card_template)
+    while True:
+        try:
+            post = next(posts)
+        except StopIteration as end:
+            return end.value
+        yield template.render({"post": post}, request)
+
+
+def stream_page(
+        request: HttpRequest, template_name: str, card_template: str,
+        more_template: str, posts
+        ):
+    """
+    Rend une page de posts en flux continu (StreamingHttpResponse).
+
+    La page est rendue une seule fois, sans ses posts ni son lien vers
+    la page suivante, puis découpée aux emplacements indiqués par
+    les variables "posts_marker" et "more_marker" du template.
+    Le haut de la page est envoyé immédiatement, puis chaque post est
+    rendu avec le template de carte au fur et à mesure qu'il est lu,
+    enfin le lien vers la page suivante et le bas de la page.
+
+    Args:
+        request (HttpRequest): La requête HTTP.
+        template_name (str): Le template de la page.
+        card_template (str): Le template d'un post.
+        more_template (str): Le template du lien vers la page suivante.
+        posts (Generator): Génère les posts de la page, puis retourne
+        le curseur de la page suivante.
+
+    Returns:
+        StreamingHttpResponse: La réponse HTTP.
+    """
+    posts_marker = f"posts-{uuid4().hex}"
+    more_marker = f"more-{uuid4().hex}"
+    context = {
+        "posts": [], "posts_marker": posts_marker, "more_marker": more_marker
+    }
+    page = render_to_string(template_name, context, request)
+    head, rest = page.split(posts_marker)
+    middle, tail = rest.split(more_marker)
+
+    def content():
+        yield head
+        next_cursor = yield from _render_cards(request, card_template, posts)
+        yield middle
+        yield render_to_string(
+            more_template, {"next_cursor": next_cursor}, request
+            )
+        yield tail
+
+    return StreamingHttpResponse(content())
+
+
 def clear_messages(view_func):
     """
     Décorateur pour supprimer les messages avant d'exécuter une vue.
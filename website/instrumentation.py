@@ -0,0 +1,240 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de requêtes en double détaillées dans le journal
+MAX_DUPLICATES_LOGGED = 5
+
+# Mesures de la requête HTTP en cours, si elle fait partie de l'échantillon
+_current = ContextVar("request_stats", default=None)
+
+# Observateurs des requêtes SQL du contexte en cours (observe_queries)
+_observers = ContextVar("query_observers", default=())
+
+# Vrai pendant l'appel des observateurs : les requêtes qu'ils exécutent
+# eux-mêmes (EXPLAIN des requêtes lentes) ne sont pas observées
+_dispatching = ContextVar("query_dispatching", default=False)
+
+
+def _dispatch_query(execute, sql, params, many, context):
+    """
+    Enveloppe d'exécution SQL (connection.execute_wrapper) commune
+    à tous les observateurs : chaque requête est chronométrée une seule
+    fois, puis transmise aux observateurs avec sa durée.
+    """
+
+    observers = _observers.get()
+    if not observers or _dispatching.get():
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        token = _dispatching.set(True)
+        try:
+            for observer in observers:
+                observer(context["connection"], sql, params, many, duration)
+        finally:
+            _dispatching.reset(token)
+
+
+@contextmanager
+def observe_queries(observer):
+    """
+    Transmet à observer les requêtes SQL exécutées dans le bloc,
+    sur toutes les bases.
+
+    L'enveloppe d'exécution n'est installée qu'une fois, par le bloc
+    le plus externe : les middlewares de mesure, de métriques et
+    de relevé des requêtes lentes partagent la même mesure.
+
+    Args:
+        observer (callable): Appelé avec la connexion, la requête SQL,
+        ses paramètres, l'indicateur executemany et la durée
+        d'exécution en secondes.
+    """
+
+    observers = _observers.get()
+    token = _observers.set(observers + (observer,))
+    try:
+        with ExitStack() as stack:
+            if not observers:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_dispatch_query)
+                    )
+            yield
+    finally:
+        _observers.reset(token)
+
+
+class RequestStats:
+    """
+    Mesures d'une requête HTTP : requêtes SQL (nombre, durée,
+    doublons) et temps de rendu des templates.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, connection, sql, params, many, duration):
+        """
+        Observateur des requêtes SQL (observe_queries).
+        """
+
+        self.db_time += duration
+        self.queries += 1
+        self.statements[(sql, repr(params))] += 1
+
+    def duplicates(self):
+        """
+        Requêtes exécutées plusieurs fois avec les mêmes paramètres,
+        des plus fréquentes aux moins fréquentes.
+
+        Returns:
+            list[tuple]: Couples (sql, nombre d'exécutions).
+        """
+
+        return [
+            (sql, count)
+            for (sql, _), count in self.statements.most_common()
+            if count > 1
+        ]
+
+
+class TimedTemplate(Template):
+    """
+    Template dont le rendu est chronométré lorsque la requête en cours
+    est mesurée.
+    """
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Moteur de templates Django mesurant le temps de rendu des templates
+    chargés par les vues (render, get_template). Les templates inclus
+    ({% include %}, {% extends %}) sont comptés dans leur parent.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def server_timing(stats, total: float):
+    """
+    Construit l'en-tête Server-Timing d'une requête mesurée
+    (en ASCII, seuls les noms et les durées étant toujours affichés
+    par les navigateurs).
+
+    Args:
+        stats (RequestStats): Les mesures de la requête.
+        total (float): Durée totale du traitement, en secondes.
+
+    Returns:
+        str: La valeur de l'en-tête.
+    """
+
+    duplicated = sum(count - 1 for _, count in stats.duplicates())
+    return ", ".join([
+        f"db;dur={stats.db_time * 1000:.1f}",
+        f'queries;desc="{stats.queries}"',
+        f'duplicates;desc="{duplicated}"',
+        f"tpl;dur={stats.template_time * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ])
+
+
+class RequestTimingMiddleware:
+    """
+    Middleware mesurant une partie des requêtes HTTP (proportion
+    REQUEST_TIMING_SAMPLE_RATE) : nombre et durée des requêtes SQL,
+    temps de rendu des templates et durée totale.
+
+    Les mesures sont renvoyées dans l'en-tête Server-Timing
+    et journalisées en JSON (logger website.instrumentation),
+    avec la vue appelée. Les requêtes SQL répétées à l'identique,
+    signe d'un problème N+1, sont signalées par un avertissement.
+    Le middleware est désactivé si la proportion vaut 0.
+
+    Pour une réponse en flux continu, seul le traitement effectué
+    avant l'envoi du premier octet est mesuré.
+    """
+
+    def __init__(self, get_response):
+        if settings.REQUEST_TIMING_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with observe_queries(stats):
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _current.reset(token)
+
+        response["Server-Timing"] = server_timing(stats, total)
+        self.log(request, response, stats, total)
+        return response
+
+    def log(self, request, response, stats, total):
+        match = request.resolver_match
+        duplicates = stats.duplicates()
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "function": match._func_path if match else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "db_ms": round(stats.db_time * 1000, 1),
+            "template_ms": round(stats.template_time * 1000, 1),
+            "queries": stats.queries,
+            "duplicated_queries": sum(count - 1 for _, count in duplicates),
+        }
+
+        if duplicates:
+            record["duplicates"] = [
+                {"sql": sql, "count": count}
+                for sql, count in duplicates[:MAX_DUPLICATES_LOGGED]
+            ]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
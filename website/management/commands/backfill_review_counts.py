@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from website.models import Ticket, Review
+
+
+class Command(BaseCommand):
+    help = 'Recalcule le nombre de critiques de chaque ticket'
+
+    def handle(self, *args, **kwargs):
+        review_counts = Review.objects.filter(
+            ticket=OuterRef('pk')
+        ).order_by().values('ticket').annotate(
+            total=Count('pk')
+        ).values('total')
+
+        updated = Ticket.objects.update(
+            review_count=Coalesce(Subquery(review_counts), 0)
+        )
+        self.stdout.write(
+            f'Nombre de critiques recalculé pour {updated} tickets.'
+            )
@@ -0,0 +1,149 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+SCHEMA = """
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    time_created REAL NOT NULL
+);
+CREATE INDEX post_user_time ON post (user_id, time_created DESC);
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare le débit de lectures et d\'écritures concurrentes sur SQLite '
+        'avec et sans le profil de production (SQLITE_PRAGMAS, connexions '
+        'persistantes). Les mesures sont faites sur une base temporaire.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5.0)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'profil':<12}{'lectures/s':>12}{'écritures/s':>13}"
+            f"{'verrous':>10}"
+        )
+        for name, tuned in (('défaut', False), ('production', True)):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.create_database(path, options)
+                reads, writes, locked = self.run(path, tuned, options)
+            duration = options['duration']
+            self.stdout.write(
+                f'{name:<12}{reads / duration:>12.0f}'
+                f'{writes / duration:>13.0f}{locked:>10}'
+            )
+
+    def create_database(self, path, options):
+        """
+        Crée la base temporaire et y insère --posts posts.
+        """
+
+        connection = sqlite3.connect(path)
+        connection.executescript(SCHEMA)
+        now = time.time()
+        connection.executemany(
+            'INSERT INTO post (user_id, title, time_created) VALUES (?, ?, ?)',
+            (
+                (index % options['users'], f'post-{index}', now - index)
+                for index in range(options['posts'])
+            )
+        )
+        connection.commit()
+        connection.close()
+
+    def connect(self, path, tuned):
+        """
+        Ouvre une connexion, avec les PRAGMA du profil de production
+        si tuned est vrai.
+        """
+
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        if tuned:
+            for name, value in settings.SQLITE_PRAGMAS.items():
+                connection.execute(f'PRAGMA {name}={value}')
+        return connection
+
+    def run(self, path, tuned, options):
+        """
+        Lance les lecteurs et les écrivains pendant --duration secondes.
+
+        Sans profil, chaque opération ouvre sa propre connexion, comme
+        une requête avec CONN_MAX_AGE=0. Avec le profil, chaque thread
+        conserve sa connexion.
+
+        Returns:
+            tuple: Nombre de lectures, d'écritures et d'opérations
+            abandonnées sur un verrou.
+        """
+
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def read(connection, rng):
+            connection.execute(
+                'SELECT id, title FROM post WHERE user_id = ? '
+                'ORDER BY time_created DESC LIMIT 20',
+                (rng.randrange(options['users']),)
+            ).fetchall()
+
+        def write(connection, rng):
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'INSERT INTO post (user_id, title, time_created) '
+                'VALUES (?, ?, ?)',
+                (rng.randrange(options['users']), 'bench', time.time())
+            )
+            connection.execute('COMMIT')
+
+        def worker(operation, counter, seed):
+            rng = random.Random(seed)
+            connection = self.connect(path, tuned) if tuned else None
+            done = locked = 0
+            while time.perf_counter() < deadline:
+                current = connection or self.connect(path, tuned)
+                try:
+                    operation(current, rng)
+                    done += 1
+                except sqlite3.OperationalError:
+                    locked += 1
+                    if current.in_transaction:
+                        current.execute('ROLLBACK')
+                finally:
+                    if connection is None:
+                        current.close()
+            if connection is not None:
+                connection.close()
+            with lock:
+                counts[counter] += done
+                counts['locked'] += locked
+
+        threads = [
+            threading.Thread(target=worker, args=(read, 'reads', index))
+            for index in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(write, 'writes', -index))
+            for index in range(1, options['writers'] + 1)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return counts['reads'], counts['writes'], counts['locked']
@@ -0,0 +1,137 @@
+import json
+import platform
+from io import StringIO
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.utils import timezone
+from website.benchmarks import compare, core_cases, measure
+from website.models import FeedEntry
+
+
+# Cache privé du benchmark, vidé avant chaque requête
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-views',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure les vues principales (flux, posts, follows, search_users, '
+        'create_ticket, create_standalone_review) sur des jeux de données '
+        'de plusieurs tailles générés par seed_scale, dans une transaction '
+        'annulée à la fin : temps de réponse, requêtes SQL et pic de '
+        'mémoire. Les pages sont mesurées sans cache. Avec --compare, '
+        'échoue si une mesure dépasse la référence de plus de --threshold.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[100, 1000],
+            help='Nombres d\'utilisateurs (10 tickets par utilisateur)'
+            )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Fichier JSON où enregistrer les résultats'
+            )
+        parser.add_argument(
+            '--compare', help='Fichier JSON des résultats de référence'
+            )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Augmentation tolérée du temps et de la mémoire (0.2 = 20 %%)'
+            )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)['results']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(
+                    f"Référence illisible ({options['compare']}) : {error}"
+                    )
+
+        # Client de test sur la base principale, avec un cache privé
+        with override_settings(
+            CACHES=BENCH_CACHES,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            DATABASE_REPLICA=None
+        ):
+            results = {
+                str(size): self.run_size(size, options)
+                for size in options['sizes']
+            }
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Résultats enregistrés dans {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(baseline, results, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(f'Régression : {regression}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} régression(s).')
+            self.stdout.write(self.style.SUCCESS('Aucune régression.'))
+
+    def run_size(self, size, options):
+        """
+        Génère un jeu de données de size utilisateurs et mesure chaque vue,
+        pour l'utilisateur dont le flux est le plus fourni.
+
+        Returns:
+            dict: Les mesures, par vue.
+        """
+
+        prefix = f'bench{size}'
+        with transaction.atomic():
+            call_command(
+                'seed_scale', users=size, tickets=size * 10,
+                seed=options['seed'], prefix=prefix, stdout=StringIO()
+            )
+            viewer_id = (
+                FeedEntry.objects
+                .filter(viewer__username__startswith=f'{prefix}-')
+                .values('viewer').annotate(entries=Count('id'))
+                .order_by('-entries').values_list('viewer', flat=True)
+                .first()
+            )
+            client = Client()
+            client.force_login(User.objects.get(pk=viewer_id))
+
+            self.stdout.write(f'{size} utilisateurs')
+            self.stdout.write(
+                f"  {'vue':<26}{'temps':>10}{'requêtes':>10}{'mémoire':>12}"
+            )
+            results = {}
+            for case in core_cases(prefix):
+                result = measure(client, case, options['repeat'], cache.clear)
+                results[case.name] = result
+                self.stdout.write(
+                    f"  {case.name:<26}{result['wall_ms']:>8.1f}ms"
+                    f"{result['queries']:>10}{result['peak_kb']:>10.0f}Ko"
+                )
+
+            transaction.set_rollback(True)
+        return results
@@ -0,0 +1,152 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from website.feed import visible_tickets, visible_reviews
+from website.models import Profile, Relation, Ticket, Review
+
+
+def _related(user, kind):
+    return Relation.objects.filter(user=user, kind=kind).values('target')
+
+
+def _blocked_by(user):
+    return Relation.objects.filter(
+        target=user, kind=Relation.BLOCK
+    ).values('user')
+
+
+def subquery_tickets(user):
+    """
+    Tickets visibles, filtrés par des sous-requêtes sur la table Relation,
+    sans la liste précalculée des auteurs visibles.
+    """
+
+    return Ticket.objects.filter(
+        Q(user__in=_related(user, Relation.FOLLOW)) | Q(user=user)
+    ).exclude(
+        Q(user__in=_blocked_by(user))
+        | Q(user__in=_related(user, Relation.BLOCK))
+    )
+
+
+def subquery_reviews(user):
+    """
+    Critiques visibles, filtrées par des sous-requêtes sur la table
+    Relation, sans la liste précalculée des auteurs visibles.
+    """
+
+    followed = _related(user, Relation.FOLLOW)
+    blocked = _related(user, Relation.BLOCK)
+    return Review.objects.filter(
+        Q(user__in=followed)
+        | Q(user=user)
+        | Q(ticket__user__in=followed)
+    ).exclude(
+        Q(user__in=_blocked_by(user))
+        | Q(ticket__user__in=_blocked_by(user))
+        | Q(user__in=blocked)
+        | Q(ticket__user__in=blocked)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure les requêtes de visibilité du flux avec la liste précalculée '
+        'des auteurs visibles, et avec des sous-requêtes sur la table '
+        'Relation pour comparaison. Les données de test sont créées dans '
+        'une transaction annulée à la fin.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--blocks', type=int, default=1000)
+        parser.add_argument('--posts-per-user', type=int, default=2)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            viewer = self.create_dataset(options)
+            self.run(viewer, options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_dataset(self, options):
+        """
+        Crée un utilisateur suivant --follows utilisateurs, et --blocks
+        autres utilisateurs bloqués (une moitié par lui, l'autre moitié
+        l'a bloqué).
+        """
+
+        total = options['follows'] + options['blocks']
+        viewer = User.objects.create_user('bench-viewer', password=None)
+
+        users = User.objects.bulk_create(
+            User(username=f'bench-{index}', password='!')
+            for index in range(total)
+        )
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+
+        blocked = users[:options['blocks']]
+        Relation.objects.bulk_create(
+            Relation(user=viewer, target=user, kind=Relation.FOLLOW)
+            for user in users[options['blocks']:]
+        )
+        Relation.objects.bulk_create(
+            Relation(user=viewer, target=user, kind=Relation.BLOCK)
+            if index % 2 else
+            Relation(user=user, target=viewer, kind=Relation.BLOCK)
+            for index, user in enumerate(blocked)
+        )
+
+        tickets = Ticket.objects.bulk_create(
+            Ticket(user=user, title=f'bench-{user.pk}-{index}')
+            for user in users
+            for index in range(options['posts_per_user'])
+        )
+        Review.objects.bulk_create(
+            Review(
+                ticket=ticket, user=users[-index - 1], headline='bench',
+                rating=3
+            )
+            for index, ticket in enumerate(tickets[::2])
+        )
+
+        self.stdout.write(
+            f"{options['follows']} abonnements, {len(blocked)} blocages, "
+            f'{len(tickets)} tickets, {len(tickets[::2])} critiques.'
+        )
+        return viewer
+
+    def measure(self, queryset, repeat):
+        """
+        Retourne le meilleur temps (en ms) pour compter les résultats
+        et lire la première page triée.
+        """
+
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset.count()
+            list(queryset.order_by('-time_created')[:20])
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def run(self, viewer, repeat):
+        cases = [
+            ('tickets', subquery_tickets, visible_tickets),
+            ('critiques', subquery_reviews, visible_reviews),
+        ]
+
+        self.stdout.write(
+            f"{'requête':<12}{'sous-requêtes':>15}{'auteurs':>12}"
+        )
+        for name, subquery, current in cases:
+            if subquery(viewer).count() != current(viewer).count():
+                raise CommandError(f'Résultats différents pour les {name}.')
+            before = self.measure(subquery(viewer), repeat)
+            after = self.measure(current(viewer), repeat)
+            self.stdout.write(
+                f'{name:<12}{before:>13.1f}ms{after:>10.1f}ms'
+            )
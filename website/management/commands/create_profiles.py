@@ -1,16 +1,79 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from website.models import Profile
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from website.cache import bump_feed_versions
+from website.feed import rebuild_feed
+from website.models import Profile, Ticket, Review
+from website.relations import recount_relations, stale_counters
 
 
 class Command(BaseCommand):
-    help = 'Crée les profils pour les utilisateurs existants'
-
-    def handle(self, *args, **kwargs):
-        users_without_profiles = User.objects.filter(profile__isnull=True)
-        for user in users_without_profiles:
-            Profile.objects.create(user=user)
-            self.stdout.write(
-                f'Profil créé pour l\'utilisateur {user.username}'
+    help = (
+        'Répare les profils : crée par lots les profils manquants, supprime '
+        'les profils orphelins et recalcule les compteurs d\'abonnements '
+        'et de blocages faussés. Avec --check, affiche les anomalies '
+        'sans rien modifier.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Affiche les anomalies sans rien modifier'
+            )
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(profile__isnull=True)
+        orphans = Profile.objects.exclude(
+            Exists(User.objects.filter(pk=OuterRef('user_id')))
+        )
+        stale = stale_counters()
+
+        self.stdout.write(
+            f'{missing.count()} utilisateurs sans profil, '
+            f'{orphans.count()} profils orphelins, '
+            f'{stale.count()} profils aux compteurs faussés.'
+        )
+
+        if options['check']:
+            return
+
+        self.create_missing(missing, options['batch_size'])
+        deleted, _ = orphans.delete()
+        if deleted:
+            self.stdout.write(f'{deleted} profils orphelins supprimés.')
+        stale_ids = list(stale.values_list('pk', flat=True))
+        recounted = recount_relations(Profile.objects.filter(pk__in=stale_ids))
+        if recounted:
+            self.stdout.write(f'{recounted} profils recomptés.')
+
+        self.stdout.write(self.style.SUCCESS('Profils réparés.'))
+
+    def create_missing(self, users, batch_size):
+        """
+        Crée les profils manquants par lots, puis construit le flux
+        des utilisateurs qui avaient déjà publié.
+        """
+
+        total = users.count()
+        user_ids = users.order_by('pk').values_list('pk', flat=True)
+        created = last = 0
+
+        while batch := list(user_ids.filter(pk__gt=last)[:batch_size]):
+            last = batch[-1]
+            with transaction.atomic():
+                Profile.objects.bulk_create(
+                    [Profile(user_id=user_id) for user_id in batch],
+                    ignore_conflicts=True
                 )
-        self.stdout.write('Tous les profils manquants ont été créés.')
+                authors = User.objects.filter(pk__in=batch).filter(
+                    Exists(Ticket.objects.filter(user=OuterRef('pk')))
+                    | Exists(Review.objects.filter(user=OuterRef('pk')))
+                ).select_related('profile')
+                for author in authors:
+                    rebuild_feed(author)
+                    bump_feed_versions([author.pk])
+
+            created += len(batch)
+            self.stdout.write(f'{created}/{total} profils créés')
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection
+from website.feed import (
+    feed_entries, merged_rows, visible_reviews, visible_tickets
+)
+from website.models import FeedEntry, Ticket, Review
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche le plan d'exécution des requêtes du flux pour un "
+        "utilisateur, sur la base de données configurée (SQLite ou "
+        "PostgreSQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True)
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Exécute les requêtes et affiche les temps réels '
+            '(PostgreSQL uniquement)'
+            )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(
+                f"L'utilisateur {options['user']} n'existe pas."
+                )
+
+        explain_options = {}
+        if options['analyze']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('--analyze nécessite PostgreSQL.')
+            explain_options = {'analyze': True, 'buffers': True}
+
+        queries = {
+            'flux : page du flux matérialisé': feed_entries(user),
+            'flux : post le plus récent': FeedEntry.objects.filter(
+                viewer=user
+            ).order_by('-time_created')[:1],
+            'posts : page fusionnée (UNION ALL)': merged_rows(
+                Ticket.objects.filter(user=user),
+                Review.objects.filter(user=user)
+            ),
+            'visibilité : tickets': visible_tickets(user).order_by(
+                '-time_created'
+            )[:20],
+            'visibilité : critiques': visible_reviews(user).order_by(
+                '-time_created'
+            )[:20],
+        }
+
+        self.stdout.write(f'Base de données : {connection.vendor}')
+        for name, queryset in queries.items():
+            self.stdout.write(f'\n-- {name}')
+            self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from website.exchange import CHUNK_SIZE, encode_rows, user_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporte les tickets, critiques, abonnements et blocages d\'un '
+        'utilisateur au format JSONL ou CSV, compatible avec import_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True)
+        parser.add_argument('--format', choices=['jsonl', 'csv'],
+                            default='jsonl')
+        parser.add_argument(
+            '--output', help='Fichier de sortie (par défaut la sortie standard)'
+            )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            username=options['user'], profile__isnull=False
+        ).first()
+        if user is None:
+            raise CommandError(
+                f"L'utilisateur {options['user']} n'existe pas."
+                )
+
+        lines = encode_rows(
+            user_rows(user, options['chunk_size']), options['format']
+        )
+
+        if options['output']:
+            with open(
+                options['output'], 'w', newline='', encoding='utf-8'
+            ) as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
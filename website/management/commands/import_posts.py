@@ -0,0 +1,342 @@
+import json
+import sys
+import time
+from collections import Counter
+from functools import partial
+from itertools import chain, islice
+from pathlib import Path
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from website.cache import bump_feed_versions
+from website.exchange import FIELDS, SOCIAL_TYPES, read_rows
+from website.feed import fan_out_many
+from website.models import FeedEntry, Ticket, Review
+
+
+class Command(BaseCommand):
+    help = (
+        'Importe des tickets et des critiques depuis un fichier JSONL ou CSV '
+        '(colonnes : ' + ', '.join(FIELDS) + '). Une critique désigne son '
+        'ticket par ticket_author et ticket_title. Les abonnements et '
+        'blocages d\'un export sont ignorés et comptés à part. Les lignes '
+        'sont validées et enregistrées par lots ; un point de reprise '
+        'permet de relancer l\'import après une erreur avec --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier à importer, ou - pour stdin')
+        parser.add_argument('--format', choices=['jsonl', 'csv'])
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint',
+            help='Fichier du point de reprise (par défaut <path>.checkpoint)'
+            )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Reprend après la dernière ligne enregistrée'
+            )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        checkpoint = options['checkpoint'] or (
+            None if path == '-' else f'{path}.checkpoint'
+        )
+        start_after = self.read_checkpoint(checkpoint, options['resume'])
+
+        self.stats = Counter()
+        started = time.perf_counter()
+
+        stream = sys.stdin if path == '-' else self.open(path)
+        try:
+            rows = (
+                (number, row)
+                for number, row in read_rows(stream, file_format)
+                if number > start_after
+            )
+            while batch := list(islice(rows, options['batch_size'])):
+                with transaction.atomic():
+                    self.import_batch(batch)
+                    transaction.on_commit(partial(
+                        self.write_checkpoint, checkpoint, batch[-1][0]
+                    ))
+                self.report(started)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        # Le point de reprise suit les validations : il n'est écrit,
+        # puis supprimé, qu'une fois les lots réellement enregistrés.
+        if checkpoint:
+            transaction.on_commit(
+                partial(Path(checkpoint).unlink, missing_ok=True)
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Import terminé : {self.stats['tickets']} tickets, "
+            f"{self.stats['reviews']} critiques, "
+            f"{self.stats['skipped']} abonnements et blocages ignorés, "
+            f"{self.stats['rejected']} lignes rejetées."
+        ))
+
+    def open(self, path):
+        try:
+            return open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(f'Impossible de lire {path} : {error}')
+
+    def read_checkpoint(self, checkpoint, resume):
+        """
+        Retourne la dernière ligne enregistrée lors d'un import précédent.
+        """
+
+        if not resume:
+            return 0
+        if not checkpoint:
+            raise CommandError('--resume nécessite --checkpoint avec stdin.')
+        try:
+            with open(checkpoint, encoding='utf-8') as file:
+                line = json.load(file)['line']
+        except FileNotFoundError:
+            return 0
+        self.stdout.write(f'Reprise après la ligne {line}.')
+        return line
+
+    def write_checkpoint(self, checkpoint, line):
+        if checkpoint:
+            with open(checkpoint, 'w', encoding='utf-8') as file:
+                json.dump({'line': line}, file)
+
+    def report(self, started):
+        rows = self.stats['rows']
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{rows} lignes en {elapsed:.1f} s '
+            f'({rows / elapsed if elapsed else 0:.0f} lignes/s)'
+        )
+
+    def reject(self, number, error):
+        self.stats['rejected'] += 1
+        if isinstance(error, ValidationError):
+            error = ' '.join(error.messages)
+        self.stderr.write(f'Ligne {number} : {error}')
+
+    def import_batch(self, batch):
+        """
+        Valide et enregistre un lot de lignes.
+
+        Les auteurs, les titres déjà utilisés et les tickets critiqués
+        sont lus en une requête chacun pour tout le lot. Les posts sont
+        ensuite insérés avec bulk_create, qui ne déclenche pas les signaux :
+        le flux, le nombre de critiques et le cache sont mis à jour ici.
+        """
+
+        self.stats['rows'] += len(batch)
+
+        usernames = {
+            row.get(key) for _, row in batch
+            for key in ('author', 'ticket_author')
+        }
+        users = User.objects.select_related('profile').in_bulk(
+            [name for name in usernames if name], field_name='username'
+        )
+
+        ticket_rows = [
+            (number, row) for number, row in batch
+            if row.get('type') == 'ticket'
+        ]
+        review_rows = [
+            (number, row) for number, row in batch
+            if row.get('type') == 'review'
+        ]
+        for number, row in batch:
+            if row.get('type') in SOCIAL_TYPES:
+                self.stats['skipped'] += 1
+            elif row.get('type') not in ('ticket', 'review'):
+                self.reject(
+                    number, row.get('_error', 'type inconnu (ticket, review)')
+                    )
+
+        tickets = self.build_tickets(ticket_rows, users)
+        Ticket.objects.bulk_create(tickets.values())
+
+        reviews = self.build_reviews(review_rows, users, tickets)
+        Review.objects.bulk_create(reviews)
+
+        self.stats['tickets'] += len(tickets)
+        self.stats['reviews'] += len(reviews)
+
+        viewer_ids = fan_out_many(chain(tickets.values(), reviews))
+        viewer_ids.update(self.add_review_counts(reviews))
+        bump_feed_versions(viewer_ids)
+
+    def build_tickets(self, rows, users):
+        """
+        Construit les tickets valides du lot.
+
+        Les titres en double sont détectés avec une seule requête
+        pour tout le lot, ainsi qu'à l'intérieur du lot.
+
+        Returns:
+            dict: Les tickets, par couple (auteur, titre).
+        """
+
+        candidates = {}
+        for number, row in rows:
+            author = users.get(row.get('author'))
+            if author is None:
+                self.reject(number, f"auteur inconnu ({row.get('author')})")
+                continue
+
+            ticket = Ticket(
+                user=author,
+                title=row.get('title') or '',
+                description=row.get('description') or ''
+            )
+            try:
+                ticket.full_clean(
+                    exclude=['user', 'image'],
+                    validate_unique=False,
+                    validate_constraints=False
+                )
+            except ValidationError as error:
+                self.reject(number, error)
+                continue
+
+            key = (author.username, ticket.title)
+            if key in candidates:
+                self.reject(number, f'ticket en double ({ticket.title})')
+                continue
+            candidates[key] = (number, ticket)
+
+        existing = set()
+        if candidates:
+            existing = set(
+                Ticket.objects.filter(
+                    user__username__in={key[0] for key in candidates},
+                    title__in={key[1] for key in candidates}
+                ).values_list('user__username', 'title')
+            )
+
+        tickets = {}
+        for key, (number, ticket) in candidates.items():
+            if key in existing:
+                self.reject(
+                    number, f'Ticket déjà existant pour ({ticket.title}).'
+                    )
+            else:
+                tickets[key] = ticket
+        return tickets
+
+    def build_reviews(self, rows, users, tickets):
+        """
+        Construit les critiques valides du lot.
+
+        Le ticket critiqué est recherché parmi les tickets du lot,
+        puis en base avec une seule requête pour tout le lot. Une
+        critique identique à une critique existante est rejetée, ce qui
+        rend sûre la reprise d'un lot déjà enregistré.
+
+        Returns:
+            list: Les critiques.
+        """
+
+        wanted = {
+            (row.get('ticket_author'), row.get('ticket_title'))
+            for _, row in rows
+        } - tickets.keys()
+
+        known = dict(tickets)
+        if wanted:
+            candidates = Ticket.objects.select_related(
+                'user__profile'
+            ).filter(
+                user__username__in={key[0] for key in wanted},
+                title__in={key[1] for key in wanted}
+            )
+            for ticket in candidates:
+                key = (ticket.user.username, ticket.title)
+                if key in wanted:
+                    known[key] = ticket
+
+        existing = set()
+        authors = {users[row['author']].pk for _, row in rows
+                   if row.get('author') in users}
+        ticket_ids = {ticket.pk for ticket in known.values() if ticket.pk}
+        if authors and ticket_ids:
+            existing = set(Review.objects.filter(
+                user__in=authors, ticket__in=ticket_ids
+            ).values_list('user_id', 'ticket_id', 'headline', 'comment'))
+
+        reviews = []
+        for number, row in rows:
+            author = users.get(row.get('author'))
+            ticket = known.get(
+                (row.get('ticket_author'), row.get('ticket_title'))
+            )
+            if author is None:
+                self.reject(number, f"auteur inconnu ({row.get('author')})")
+                continue
+            if ticket is None:
+                self.reject(
+                    number, f"ticket introuvable ({row.get('ticket_title')})"
+                    )
+                continue
+
+            review = Review(
+                ticket=ticket,
+                user=author,
+                headline=row.get('headline') or '',
+                rating=row.get('rating'),
+                comment=row.get('comment') or ''
+            )
+            try:
+                review.full_clean(
+                    exclude=['ticket', 'user'],
+                    validate_unique=False,
+                    validate_constraints=False
+                )
+            except ValidationError as error:
+                self.reject(number, error)
+                continue
+
+            key = (author.pk, ticket.pk, review.headline, review.comment)
+            if ticket.pk and key in existing:
+                self.reject(
+                    number, f'critique déjà existante ({review.headline})'
+                    )
+                continue
+            existing.add(key)
+            reviews.append(review)
+
+        return reviews
+
+    def add_review_counts(self, reviews):
+        """
+        Met à jour le nombre de critiques des tickets critiqués.
+
+        Returns:
+            set: Les utilisateurs qui voient ces tickets dans leur flux.
+        """
+
+        counts = Counter(review.ticket_id for review in reviews)
+        by_count = {}
+        for ticket_id, count in counts.items():
+            by_count.setdefault(count, []).append(ticket_id)
+
+        for count, ticket_ids in by_count.items():
+            Ticket.objects.filter(pk__in=ticket_ids).update(
+                review_count=F('review_count') + count
+            )
+
+        return set(
+            FeedEntry.objects.filter(ticket_id__in=counts).values_list(
+                'viewer_id', flat=True
+            )
+        )
+
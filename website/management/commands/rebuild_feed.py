@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from website.cache import bump_feed_versions
+from website.feed import rebuild_feed
+from website.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit le flux matérialisé (FeedEntry) des utilisateurs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Ne reconstruit que le flux de cet utilisateur'
+            )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(profile__isnull=False).order_by('id')
+
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(
+                    f"L'utilisateur {options['user']} n'existe pas."
+                    )
+        else:
+            FeedEntry.objects.all().delete()
+
+        for user in users.select_related('profile').iterator():
+            rebuild_feed(user)
+            bump_feed_versions([user.pk])
+
+        self.stdout.write(
+            f'Flux reconstruit : '
+            f'{FeedEntry.objects.filter(viewer__in=users).count()} entrées.'
+            )
@@ -0,0 +1,398 @@
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from website.feed import POST_TICKET, POST_REVIEW
+from website.models import FeedEntry, Profile, Relation, Ticket, Review
+from website.relations import recount_relations
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère un jeu de données de test à grande échelle : utilisateurs, '
+        'abonnements en loi de puissance, blocages, tickets, critiques, '
+        'images factices et flux matérialisé. Le résultat ne dépend que de '
+        '--seed et des paramètres de taille.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--tickets', type=int, default=10000,
+            help='Nombre total de tickets'
+            )
+        parser.add_argument(
+            '--review-ratio', type=float, default=0.5,
+            help='Proportion de tickets ayant reçu une critique'
+            )
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Nombre moyen d\'abonnements par utilisateur'
+            )
+        parser.add_argument(
+            '--blocks', type=float, default=0.5,
+            help='Nombre moyen de blocages par utilisateur'
+            )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.0,
+            help='Proportion de tickets avec une image factice'
+            )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Période couverte par les posts, jusqu\'à aujourd\'hui'
+            )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument(
+            '--password', default='litreview-seed',
+            help='Mot de passe commun des utilisateurs générés'
+            )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-feed', action='store_true',
+            help='Ne construit pas le flux matérialisé (voir rebuild_feed)'
+            )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Des utilisateurs "{prefix}-*" existent déjà : '
+                f'choisissez un autre --prefix.'
+                )
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.perf_counter()
+
+        with transaction.atomic():
+            users = self.create_users(options)
+            follows, blocks = self.create_graph(users, options)
+            tickets, reviews = self.create_posts(users, follows, options)
+            if not options['no_feed']:
+                self.create_feed(users, follows, blocks, tickets, reviews)
+
+        self.log('Jeu de données créé.')
+
+    def log(self, message):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} s] {message}')
+
+    def insert(self, model, objects):
+        """
+        Insère des objets par lots, sans les garder tous en mémoire.
+
+        Returns:
+            int: Le nombre d'objets insérés.
+        """
+
+        objects = iter(objects)
+        count = 0
+        while batch := list(islice(objects, self.batch_size)):
+            model.objects.bulk_create(batch)
+            count += len(batch)
+        return count
+
+    def insert_posts(self, model, posts):
+        """
+        Insère des tickets ou des critiques par lots, avec leurs dates.
+
+        bulk_create remplace time_created par la date courante
+        (auto_now_add) : les dates générées sont rétablies ensuite
+        sur les identifiants renvoyés, par un UPDATE exécuté avec
+        executemany.
+
+        Returns:
+            list: Les identifiants des posts, dans l'ordre d'insertion.
+        """
+
+        quote = connection.ops.quote_name
+        adapt = connection.ops.adapt_datetimefield_value
+        sql = 'UPDATE {} SET {} = %s WHERE {} = %s'.format(
+            quote(model._meta.db_table),
+            quote(model._meta.get_field('time_created').column),
+            quote(model._meta.pk.column)
+        )
+
+        posts = iter(posts)
+        ids = []
+        with connection.cursor() as cursor:
+            while batch := list(islice(posts, self.batch_size)):
+                created = [adapt(post.time_created) for post in batch]
+                model.objects.bulk_create(batch)
+                cursor.executemany(sql, [
+                    (time_created, post.pk)
+                    for post, time_created in zip(batch, created)
+                ])
+                ids.extend(post.pk for post in batch)
+        return ids
+
+    def insert_rows(self, model, fields, rows):
+        """
+        Insère des lignes brutes par lots avec executemany.
+
+        Plus rapide que bulk_create pour les tables volumineuses :
+        aucune instance de modèle n'est construite. Les valeurs doivent
+        donc déjà être converties pour la base (connection.ops).
+
+        Returns:
+            int: Le nombre de lignes insérées.
+        """
+
+        quote = connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in fields]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns))
+        )
+
+        rows = iter(rows)
+        count = 0
+        with connection.cursor() as cursor:
+            while batch := list(islice(rows, self.batch_size)):
+                cursor.executemany(sql, batch)
+                count += len(batch)
+        return count
+
+    def create_users(self, options):
+        """
+        Crée les utilisateurs et leurs profils.
+
+        Returns:
+            list: Les identifiants des utilisateurs, dans l'ordre de création.
+        """
+
+        password = make_password(options['password'])
+        prefix = options['prefix']
+        self.insert(User, (
+            User(username=f'{prefix}-{index}', password=password)
+            for index in range(options['users'])
+        ))
+        users = list(
+            User.objects.filter(username__startswith=f'{prefix}-')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.insert(Profile, (Profile(user_id=user_id) for user_id in users))
+
+        self.profiles = Profile.objects.filter(
+            user__username__startswith=f'{prefix}-'
+        )
+        self.log(f'{len(users)} utilisateurs et profils.')
+        return users
+
+    def create_graph(self, users, options):
+        """
+        Crée les abonnements et les blocages.
+
+        La popularité suit une loi de puissance (loi de Zipf) :
+        quelques utilisateurs concentrent la plupart des abonnés.
+        Le nombre d'abonnements de chaque utilisateur varie autour
+        de la moyenne --follows.
+
+        Returns:
+            tuple: Les abonnés de chaque utilisateur, et les couples
+            d'utilisateurs bloqués (dans les deux sens).
+        """
+
+        rng = self.rng
+        popularity = users[:]
+        rng.shuffle(popularity)
+        cum_weights = list(accumulate(
+            1 / (rank + 1) for rank in range(len(popularity))
+        ))
+
+        followers = {user_id: set() for user_id in users}
+        for user_id in users:
+            count = 0
+            if options['follows']:
+                count = min(
+                    int(rng.expovariate(1 / options['follows'])),
+                    len(users) - 1
+                )
+            for followed in rng.choices(
+                popularity, cum_weights=cum_weights, k=count
+            ):
+                if followed != user_id:
+                    followers[followed].add(user_id)
+
+        blocked = set()
+        block_count = int(len(users) * options['blocks'])
+        for _ in range(block_count):
+            user_id, target = rng.sample(users, 2)
+            blocked.add((user_id, target))
+
+        # Un abonnement et un blocage ne coexistent pas entre
+        # deux utilisateurs (voir website.relations.block)
+        hidden = blocked | {(target, user_id) for user_id, target in blocked}
+        for followed, users_following in followers.items():
+            users_following -= {
+                user_id for user_id in users_following
+                if (user_id, followed) in hidden
+            }
+
+        follow_count = self.insert(Relation, (
+            Relation(
+                user_id=follower, target_id=followed, kind=Relation.FOLLOW
+            )
+            for followed, users_following in followers.items()
+            for follower in users_following
+        ))
+        self.insert(Relation, (
+            Relation(user_id=user_id, target_id=target, kind=Relation.BLOCK)
+            for user_id, target in blocked
+        ))
+        recount_relations(self.profiles)
+
+        self.log(f'{follow_count} abonnements, {len(blocked)} blocages.')
+        return followers, hidden
+
+    def placeholder_images(self, count):
+        """
+        Crée quelques images factices, partagées par les tickets.
+        """
+
+        from PIL import Image
+
+        names = []
+        for index in range(count):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (120, 160), color).save(buffer, 'PNG')
+            names.append(default_storage.save(
+                f'tickets/seed/placeholder-{index}.png',
+                ContentFile(buffer.getvalue())
+            ))
+        return names
+
+    def create_posts(self, users, followers, options):
+        """
+        Crée les tickets et les critiques, répartis sur --days jours.
+
+        Un ticket critiqué l'est de préférence par un abonné de son auteur.
+
+        Returns:
+            tuple: Les tickets et les critiques, sous forme de listes
+            de tuples (id, auteur, date) et (id, auteur, auteur du ticket,
+            date).
+        """
+
+        rng = self.rng
+        now = timezone.now()
+        period = timedelta(days=options['days']).total_seconds()
+        images = self.placeholder_images(8) if options['image_ratio'] else []
+
+        # Les plus actifs publient davantage, avec la même loi de puissance
+        cum_weights = list(accumulate(
+            1 / (rank + 1) ** 0.5 for rank in range(len(users))
+        ))
+        authors = rng.choices(users, cum_weights=cum_weights,
+                              k=options['tickets'])
+
+        planned = []
+        for index, author in enumerate(authors):
+            created = now - timedelta(seconds=rng.random() * period)
+            reviewer = None
+            if rng.random() < options['review_ratio']:
+                candidates = followers[author]
+                reviewer = (
+                    rng.choice(tuple(candidates)) if candidates
+                    else rng.choice(users)
+                )
+            image = (
+                rng.choice(images)
+                if images and rng.random() < options['image_ratio'] else None
+            )
+            planned.append((index, author, created, reviewer, image))
+
+        prefix = options['prefix']
+        ticket_ids = self.insert_posts(Ticket, (
+            Ticket(
+                user_id=author,
+                title=f'{prefix} ticket {index}',
+                description=f'Description du ticket {index}.',
+                image=image,
+                time_created=created,
+                review_count=1 if reviewer else 0
+            )
+            for index, author, created, reviewer, image in planned
+        ))
+        tickets = [
+            (ticket_id, author, created)
+            for ticket_id, (_, author, created, _, _) in zip(
+                ticket_ids, planned
+            )
+        ]
+
+        review_plan = [
+            (ticket_id, author, reviewer, min(
+                created + timedelta(seconds=rng.random() * 86400), now
+            ))
+            for ticket_id, (_, author, created, reviewer, _) in zip(
+                ticket_ids, planned
+            )
+            if reviewer
+        ]
+        review_ids = self.insert_posts(Review, (
+            Review(
+                ticket_id=ticket_id,
+                user_id=reviewer,
+                headline=f'Critique du ticket {ticket_id}',
+                rating=rng.randint(0, 5),
+                comment='Commentaire généré.',
+                time_created=created
+            )
+            for ticket_id, _, reviewer, created in review_plan
+        ))
+        reviews = [
+            (review_id, reviewer, author, created)
+            for review_id, (_, author, reviewer, created) in zip(
+                review_ids, review_plan
+            )
+        ]
+
+        self.log(f'{len(tickets)} tickets, {len(reviews)} critiques.')
+        return tickets, reviews
+
+    def create_feed(self, users, followers, hidden, tickets, reviews):
+        """
+        Construit le flux matérialisé avec les règles de visibilité
+        de website.feed : l'auteur et ses abonnés (et ceux de l'auteur
+        du ticket pour une critique), sauf en cas de blocage.
+        """
+
+        def audience(*authors):
+            viewers = set(authors[:1])
+            for author in authors:
+                viewers |= followers[author]
+            return (
+                viewer for viewer in viewers
+                if not any((viewer, author) in hidden for author in authors)
+            )
+
+        adapt = connection.ops.adapt_datetimefield_value
+        fields = ['viewer', 'post_type', 'post_id', 'ticket', 'review',
+                  'time_created']
+
+        rows = (
+            (viewer, POST_TICKET, ticket_id, ticket_id, None, adapt(created))
+            for ticket_id, author, created in tickets
+            for viewer in audience(author)
+        )
+        count = self.insert_rows(FeedEntry, fields, rows)
+
+        rows = (
+            (viewer, POST_REVIEW, review_id, None, review_id, adapt(created))
+            for review_id, reviewer, ticket_author, created in reviews
+            for viewer in audience(reviewer, ticket_author)
+        )
+        count += self.insert_rows(FeedEntry, fields, rows)
+        self.log(f'{count} entrées de flux.')
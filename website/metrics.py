@@ -0,0 +1,322 @@
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from django.conf import settings
+from .instrumentation import observe_queries
+
+
+# Limites des histogrammes
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+UPLOAD_BUCKETS = (
+    10_000, 100_000, 500_000, 1_000_000, 2_000_000, 5_000_000, 10_000_000
+)
+
+# Métriques exposées : nom -> (type, description, limites des histogrammes)
+METRICS = {
+    "litreview_requests_total": (
+        "counter", "Requêtes HTTP traitées, par vue, méthode et statut.",
+        None
+    ),
+    "litreview_request_duration_seconds": (
+        "histogram", "Durée de traitement des requêtes, par vue.",
+        DURATION_BUCKETS
+    ),
+    "litreview_request_queries": (
+        "histogram", "Requêtes SQL exécutées par requête HTTP, par vue.",
+        QUERY_BUCKETS
+    ),
+    "litreview_feed_cache_total": (
+        "counter",
+        "Lectures du cache des pages de flux, par page et résultat.", None
+    ),
+    "litreview_upload_bytes": (
+        "histogram", "Taille des fichiers envoyés, par vue.", UPLOAD_BUCKETS
+    ),
+}
+
+# Délai minimal (en secondes) entre deux écritures du fichier du processus
+FLUSH_INTERVAL = 5
+
+# Âge (en secondes) au-delà duquel le fichier d'un processus est ignoré
+STALE_AFTER = 12 * FLUSH_INTERVAL
+
+
+def _key(labels):
+    """
+    Clé d'un échantillon : ses étiquettes triées, en texte.
+    """
+
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Registry:
+    """
+    Registre des métriques d'un processus, protégé par un verrou
+    pour les serveurs multi-threads.
+
+    Si METRICS_DIR est défini, chaque processus y écrit régulièrement
+    ses valeurs dans un fichier <pid>.json : le point d'accès des métriques
+    additionne alors les valeurs de tous les processus du serveur.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in METRICS}
+        self.flushed = 0.0
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Incrémente un compteur.
+        """
+
+        key = _key(labels)
+        with self.lock:
+            samples = self.values[name]
+            samples[key] = samples.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Ajoute une observation à un histogramme.
+        """
+
+        buckets = METRICS[name][2]
+        key = _key(labels)
+        with self.lock:
+            samples = self.values[name]
+            sample = samples.get(key)
+            if sample is None:
+                sample = samples[key] = {
+                    "buckets": [0] * len(buckets), "sum": 0, "count": 0
+                }
+            for index, limit in enumerate(buckets):
+                if value <= limit:
+                    sample["buckets"][index] += 1
+                    break
+            sample["sum"] += value
+            sample["count"] += 1
+
+    def snapshot(self):
+        """
+        Copie des valeurs, sérialisable en JSON.
+        """
+
+        with self.lock:
+            return {
+                name: [
+                    [list(key), value if not isinstance(value, dict) else {
+                        **value, "buckets": list(value["buckets"])
+                    }]
+                    for key, value in samples.items()
+                ]
+                for name, samples in self.values.items()
+            }
+
+    def flush(self, force: bool = False):
+        """
+        Écrit les valeurs du processus dans METRICS_DIR, au plus toutes
+        les FLUSH_INTERVAL secondes (sauf si force est vrai).
+        """
+
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory:
+            return
+        if not force and now - self.flushed < FLUSH_INTERVAL:
+            return
+        self.flushed = now
+
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        temporary = path / f".{os.getpid()}.json.tmp"
+        temporary.write_text(json.dumps(self.snapshot()), encoding="utf-8")
+        os.replace(temporary, path / f"{os.getpid()}.json")
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+
+def _merge(total, snapshot):
+    """
+    Ajoute les valeurs d'un instantané à un total.
+    """
+
+    for name, samples in snapshot.items():
+        if name not in total:
+            continue
+        for key, value in samples:
+            key = tuple(tuple(pair) for pair in key)
+            current = total[name].get(key)
+            if not isinstance(value, dict):
+                total[name][key] = (current or 0) + value
+            elif current is None:
+                total[name][key] = value
+            else:
+                current["buckets"] = [
+                    a + b for a, b in zip(current["buckets"], value["buckets"])
+                ]
+                current["sum"] += value["sum"]
+                current["count"] += value["count"]
+
+
+def _alive(pid):
+    """
+    Indique si le processus pid existe encore sur cette machine.
+    """
+
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect():
+    """
+    Valeurs de toutes les métriques : celles du processus courant,
+    et celles des autres processus enregistrées dans METRICS_DIR.
+
+    Le fichier d'un processus terminé (redémarrage d'un worker) est
+    supprimé, pour que ses valeurs ne s'ajoutent pas à celles de son
+    remplaçant. Un fichier plus vieux que STALE_AFTER secondes est
+    ignoré sans être supprimé : celui d'un autre serveur partageant
+    le répertoire, ou d'un processus inactif, qui le réécrira à sa
+    prochaine requête.
+
+    Returns:
+        dict: Les échantillons de chaque métrique, par étiquettes.
+    """
+
+    total = {name: {} for name in METRICS}
+    _merge(total, registry.snapshot())
+
+    if settings.METRICS_DIR:
+        own = os.getpid()
+        oldest = time.time() - STALE_AFTER
+        for path in Path(settings.METRICS_DIR).glob("*.json"):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == own:
+                continue
+            try:
+                if not _alive(pid):
+                    path.unlink(missing_ok=True)
+                    continue
+                if path.stat().st_mtime < oldest:
+                    continue
+                _merge(total, json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                # Fichier en cours de remplacement ou illisible
+                continue
+    return total
+
+
+def _labels(key, **extra):
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"')
+         .replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    body = ",".join(f'{name}="{value}"' for name, value in escaped)
+    return "{" + body + "}"
+
+
+def render():
+    """
+    Métriques au format texte de Prometheus.
+
+    Returns:
+        str: Le document à renvoyer au collecteur.
+    """
+
+    lines = []
+    for name, samples in collect().items():
+        kind, description, buckets = METRICS[name]
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        for key, value in sorted(samples.items()):
+            if kind == "counter":
+                lines.append(f"{name}{_labels(key)} {value}")
+                continue
+
+            cumulative = 0
+            for limit, count in zip(buckets, value["buckets"]):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_labels(key, le=limit)} {cumulative}"
+                )
+            lines.append(
+                f'{name}_bucket{_labels(key, le="+Inf")} {value["count"]}'
+            )
+            lines.append(f"{name}_sum{_labels(key)} {value['sum']}")
+            lines.append(f"{name}_count{_labels(key)} {value['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+class QueryCounter:
+    """
+    Observateur des requêtes SQL (observe_queries) les comptant.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, connection, sql, params, many, duration):
+        self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Middleware enregistrant, pour chaque requête, sa durée, son nombre
+    de requêtes SQL et la taille des fichiers envoyés, étiquetés par
+    le nom de l'URL de la vue (app/urls.py).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(counter):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else "none"
+        registry.inc(
+            "litreview_requests_total",
+            view=view, method=request.method, status=response.status_code
+        )
+        registry.observe(
+            "litreview_request_duration_seconds", duration, view=view
+        )
+        registry.observe("litreview_request_queries", counter.count, view=view)
+
+        # Seulement si la vue a lu les fichiers : ne force pas leur lecture
+        if "_files" in request.__dict__:
+            for _, uploads in request.FILES.lists():
+                for upload in uploads:
+                    registry.observe(
+                        "litreview_upload_bytes", upload.size, view=view
+                    )
+
+        registry.flush()
+        return response
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def populate_feed(apps, schema_editor):
+    """
+    Remplit le flux matérialisé à partir des tickets et critiques existants.
+    """
+
+    Profile = apps.get_model('website', 'Profile')
+    Ticket = apps.get_model('website', 'Ticket')
+    Review = apps.get_model('website', 'Review')
+    FeedEntry = apps.get_model('website', 'FeedEntry')
+
+    for profile in Profile.objects.all():
+        followed = profile.follows.all()
+        blocked = profile.blocked.all()
+
+        tickets = Ticket.objects.filter(
+            Q(user__profile__in=followed) | Q(user_id=profile.user_id)
+        ).exclude(
+            Q(user__profile__blocked=profile) | Q(user__profile__in=blocked)
+        )
+        reviews = Review.objects.filter(
+            Q(user__profile__in=followed)
+            | Q(user_id=profile.user_id)
+            | Q(ticket__user__profile__in=followed)
+        ).exclude(
+            Q(user__profile__blocked=profile)
+            | Q(ticket__user__profile__blocked=profile)
+            | Q(user__profile__in=blocked)
+            | Q(ticket__user__profile__in=blocked)
+        )
+
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    viewer_id=profile.user_id, post_type=0, post_id=pk,
+                    ticket_id=pk, time_created=time_created
+                )
+                for pk, time_created in tickets.values_list(
+                    'id', 'time_created'
+                )
+            ] + [
+                FeedEntry(
+                    viewer_id=profile.user_id, post_type=1, post_id=pk,
+                    review_id=pk, time_created=time_created
+                )
+                for pk, time_created in reviews.values_list(
+                    'id', 'time_created'
+                )
+            ],
+            batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_type', models.PositiveSmallIntegerField()),
+                ('post_id', models.PositiveBigIntegerField()),
+                ('time_created', models.DateTimeField()),
+                ('review', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='website.review')),
+                ('ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='website.ticket')),
+                ('viewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['viewer', '-time_created', '-post_type', '-post_id'], name='feed_entry_page_idx')],
+                'constraints': [models.UniqueConstraint(fields=('viewer', 'post_type', 'post_id'), name='unique_feed_entry')],
+            },
+        ),
+        migrations.RunPython(populate_feed, migrations.RunPython.noop),
+    ]
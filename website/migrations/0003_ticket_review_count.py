@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_review_count(apps, schema_editor):
+    """
+    Initialise le nombre de critiques des tickets existants.
+    """
+
+    Ticket = apps.get_model('website', 'Ticket')
+    Review = apps.get_model('website', 'Review')
+
+    review_counts = Review.objects.filter(
+        ticket=OuterRef('pk')
+    ).order_by().values('ticket').annotate(total=Count('pk')).values('total')
+
+    Ticket.objects.update(
+        review_count=Coalesce(Subquery(review_counts), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0002_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_review_count, migrations.RunPython.noop),
+    ]
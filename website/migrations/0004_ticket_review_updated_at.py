@@ -0,0 +1,41 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def initialize_updated_at(apps, schema_editor):
+    """
+    Initialise la date de modification des posts existants
+    à leur date de création.
+    """
+
+    for model_name in ('Ticket', 'Review'):
+        model = apps.get_model('website', model_name)
+        model.objects.update(updated_at=F('time_created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0003_ticket_review_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(initialize_updated_at, migrations.RunPython.noop),
+    ]
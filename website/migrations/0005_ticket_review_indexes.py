@@ -0,0 +1,68 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_titles(apps, schema_editor):
+    """
+    Renomme les tickets dont le titre est déjà utilisé par un ticket
+    plus ancien du même utilisateur (« Titre (2) », « Titre (3) »...),
+    pour que la contrainte d'unicité puisse être ajoutée.
+    """
+
+    Ticket = apps.get_model('website', 'Ticket')
+    max_length = Ticket._meta.get_field('title').max_length
+    duplicates = Ticket.objects.values('user_id', 'title').annotate(
+        total=Count('id')
+    ).filter(total__gt=1)
+
+    for duplicate in duplicates:
+        user_tickets = Ticket.objects.filter(user_id=duplicate['user_id'])
+        titles = set(user_tickets.values_list('title', flat=True))
+        tickets = user_tickets.filter(
+            title=duplicate['title']
+        ).order_by('time_created', 'id')[1:]
+
+        number = 1
+        for ticket in tickets:
+            while True:
+                number += 1
+                suffix = f" ({number})"
+                title = duplicate['title'][:max_length - len(suffix)] + suffix
+                if title not in titles:
+                    break
+            titles.add(title)
+            # update() : la date de modification du ticket est conservée
+            Ticket.objects.filter(pk=ticket.pk).update(title=title)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0004_ticket_review_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', '-time_created'], name='review_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['ticket', 'user'], name='review_ticket_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user', '-time_created'], name='ticket_user_time_idx'),
+        ),
+        migrations.RunPython(
+            rename_duplicate_titles, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ticket',
+            constraint=models.UniqueConstraint(fields=('user', 'title'), name='unique_ticket_title_per_user', violation_error_message='Vous avez déjà créé un ticket avec ce titre.'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0006_requestprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view', models.CharField(blank=True, max_length=255)),
+                ('path', models.CharField(max_length=2048)),
+                ('database', models.CharField(max_length=64)),
+                ('sql', models.TextField()),
+                ('params', models.TextField(blank=True)),
+                ('duration_ms', models.FloatField()),
+                ('plan', models.TextField(blank=True)),
+                ('time_created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'slow query',
+                'verbose_name_plural': 'slow queries',
+                'ordering': ['-time_created'],
+            },
+        ),
+    ]
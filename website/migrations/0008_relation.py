@@ -0,0 +1,154 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+FOLLOW = 0
+BLOCK = 1
+
+# Table de l'ancien modèle authentication.UserFollows, créée sans migration
+LEGACY_FOLLOWS_TABLE = 'authentication_userfollows'
+
+
+def _insert(Relation, pairs, kind):
+    """
+    Insère des relations par lots, en ignorant les doublons
+    et les relations d'un utilisateur avec lui-même.
+    """
+
+    batch = []
+    for user_id, target_id in pairs:
+        if user_id == target_id:
+            continue
+        batch.append(Relation(user_id=user_id, target_id=target_id, kind=kind))
+        if len(batch) == 1000:
+            Relation.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Relation.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def copy_relations(apps, schema_editor):
+    """
+    Reporte dans Relation les abonnements et blocages de Profile.follows,
+    Profile.blocked et de l'ancienne table UserFollows, puis calcule
+    les compteurs des profils.
+
+    Un abonnement entre deux utilisateurs dont l'un a bloqué l'autre
+    n'est pas repris : les posts étaient déjà masqués.
+    """
+
+    Profile = apps.get_model('website', 'Profile')
+    Relation = apps.get_model('website', 'Relation')
+    connection = schema_editor.connection
+
+    for kind, through in (
+        (FOLLOW, Profile.follows.through), (BLOCK, Profile.blocked.through)
+    ):
+        _insert(Relation, through.objects.values_list(
+            'from_profile__user_id', 'to_profile__user_id'
+        ).iterator(chunk_size=2000), kind)
+
+    if LEGACY_FOLLOWS_TABLE in connection.introspection.table_names():
+        table = connection.ops.quote_name(LEGACY_FOLLOWS_TABLE)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT user_id, followed_user_id FROM {table}')
+            _insert(Relation, cursor.fetchall(), FOLLOW)
+        schema_editor.execute(f'DROP TABLE {table}')
+
+    blocks = Relation.objects.filter(kind=BLOCK)
+    Relation.objects.filter(kind=FOLLOW).filter(
+        Exists(blocks.filter(user=OuterRef('user'), target=OuterRef('target')))
+        | Exists(blocks.filter(user=OuterRef('target'), target=OuterRef('user')))
+    ).delete()
+
+    def counts(side, kind):
+        return Coalesce(Subquery(
+            Relation.objects.filter(kind=kind, **{side: OuterRef('user_id')})
+            .order_by().values(side).annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+
+    Profile.objects.update(
+        following_count=counts('user', FOLLOW),
+        followers_count=counts('target', FOLLOW),
+        blocked_count=counts('user', BLOCK),
+    )
+
+
+def restore_relations(apps, schema_editor):
+    """
+    Reporte les relations dans Profile.follows et Profile.blocked.
+    """
+
+    Profile = apps.get_model('website', 'Profile')
+    Relation = apps.get_model('website', 'Relation')
+    profiles = dict(Profile.objects.values_list('user_id', 'pk'))
+
+    for kind, through in (
+        (FOLLOW, Profile.follows.through), (BLOCK, Profile.blocked.through)
+    ):
+        through.objects.bulk_create(
+            (
+                through(
+                    from_profile_id=profiles[user_id],
+                    to_profile_id=profiles[target_id]
+                )
+                for user_id, target_id in Relation.objects.filter(
+                    kind=kind
+                ).values_list('user_id', 'target_id')
+                if user_id in profiles and target_id in profiles
+            ),
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0007_slowquery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='blocked_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Relation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField()),
+                ('time_created', models.DateTimeField(auto_now_add=True)),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_relations', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target', 'kind', 'user'], name='relation_target_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'kind', 'target'), name='unique_relation'), models.CheckConstraint(condition=models.Q(('user', models.F('target')), _negated=True), name='relation_not_self')],
+            },
+        ),
+        migrations.RunPython(copy_relations, restore_relations),
+        migrations.RemoveField(
+            model_name='profile',
+            name='blocked',
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='follows',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:54
+
+import website.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0008_relation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='feed_version',
+            field=models.PositiveBigIntegerField(default=website.models.initial_feed_version, editable=False),
+        ),
+    ]
@@ -1,8 +1,9 @@
 import os
+import time
 import uuid
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -64,6 +65,18 @@ def ticket_image_upload_path(instance, filename: str):
         )
 
 
+def initial_feed_version():
+    """
+    Version initiale du flux d'un profil, tirée de l'horloge (en µs).
+
+    Elle est supérieure aux versions des profils précédents : un profil
+    recréé avec le même identifiant (base restaurée, transaction annulée)
+    ne relit pas les pages mises en cache pour l'ancien.
+    """
+
+    return time.time_ns() // 1000
+
+
 class Profile(models.Model):
     """
     Modèle représentant un profil utilisateur dans l'application.
@@ -73,12 +86,18 @@ class Profile(models.Model):
     user : OneToOneField
         Une relation un-à-un avec le modèle User.
         Supprime le profil si l'utilisateur est supprimé.
-    follows : ManyToManyField
-        Une relation plusieurs-à-plusieurs avec d'autres profils.
-        Permet de suivre des utilisateurs.
-    blocked : ManyToManyField
-        Une relation plusieurs-à-plusieurs avec d'autres profils.
-        Permet de bloquer des utilisateurs.
+    following_count : PositiveIntegerField
+        Nombre d'utilisateurs suivis.
+    followers_count : PositiveIntegerField
+        Nombre d'abonnés.
+    blocked_count : PositiveIntegerField
+        Nombre d'utilisateurs bloqués.
+    feed_version : PositiveBigIntegerField
+        Version du flux de l'utilisateur, incrémentée à chaque changement
+        de ses posts visibles (website.cache).
+
+    Les compteurs reflètent la table Relation : ils sont mis à jour
+    dans la même transaction que les relations (website.relations).
 
     Méthodes:
     ---------
@@ -89,15 +108,75 @@ class Profile(models.Model):
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name='profile'
         )
-    follows = models.ManyToManyField(
-        'self', symmetrical=False, related_name='followed_by', blank=True
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    blocked_count = models.PositiveIntegerField(default=0, editable=False)
+    feed_version = models.PositiveBigIntegerField(
+        default=initial_feed_version, editable=False
+    )
+
+    def __str__(self):
+        return self.user.username
+
+
+class Relation(models.Model):
+    """
+    Modèle représentant un abonnement ou un blocage d'un utilisateur
+    envers un autre.
+
+    Les relations sont créées et supprimées par les fonctions
+    de website.relations, qui tiennent à jour les compteurs des profils
+    et les flux. Un abonnement et un blocage ne coexistent jamais entre
+    deux utilisateurs : bloquer un utilisateur supprime les abonnements
+    dans les deux sens.
+
+    Attributs:
+        user (ForeignKey): Utilisateur qui s'abonne ou qui bloque.
+        target (ForeignKey): Utilisateur suivi ou bloqué.
+        kind (PositiveSmallIntegerField): Type de relation
+        (FOLLOW pour un abonnement, BLOCK pour un blocage).
+        time_created (DateTimeField): Date de création de la relation.
+    """
+
+    FOLLOW = 0
+    BLOCK = 1
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='relations'
         )
-    blocked = models.ManyToManyField(
-        'self', symmetrical=False, related_name='blocked_by', blank=True
+    target = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='incoming_relations'
         )
+    kind = models.PositiveSmallIntegerField()
+    time_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Sert aussi d'index pour les relations d'un utilisateur
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'target'],
+                name='unique_relation'
+                ),
+            models.CheckConstraint(
+                condition=~models.Q(user=models.F('target')),
+                name='relation_not_self'
+                ),
+        ]
+        indexes = [
+            # Relations visant un utilisateur (abonnés, blocages subis)
+            models.Index(
+                fields=['target', 'kind', 'user'],
+                name='relation_target_idx'
+                ),
+        ]
 
     def __str__(self):
-        return self.user.username
+        verb = 'suit' if self.kind == self.FOLLOW else 'bloque'
+        return f'{self.user_id} {verb} {self.target_id}'
 
 
 class Ticket(models.Model):
@@ -112,8 +191,15 @@ class Ticket(models.Model):
         image (ImageField): Image associée au ticket, peut être vide ou nulle.
         time_created (DateTimeField): Date et heure de création du ticket,
         définie automatiquement à la création.
+        updated_at (DateTimeField): Date et heure de la dernière
+        modification, mise à jour automatiquement à chaque sauvegarde.
+        review_count (PositiveIntegerField): Nombre de critiques du ticket,
+        tenu à jour par les signaux de website.signals.
 
     Méthodes:
+        has_review: Indique si le ticket a déjà reçu une critique.
+        save: Valide et enregistre le ticket, en convertissant
+        un titre en double en ValidationError.
         __str__: Retourne le titre du ticket.
     """
 
@@ -130,24 +216,59 @@ class Ticket(models.Model):
         validators=[validate_image_extension]
         )
     time_created = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'title'],
+                name='unique_ticket_title_per_user',
+                violation_error_message=(
+                    "Vous avez déjà créé un ticket avec ce titre."
+                    )
+                ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-time_created'],
+                name='ticket_user_time_idx'
+                ),
+        ]
+
+    @property
+    def has_review(self):
+        """Indique si le ticket a déjà reçu une critique"""
+        return self.review_count > 0
 
-    def clean(self):
-        """Validation pour éviter un titre dupliqué pour un même utilisateur"""
-        if not hasattr(self, "user") or self.user is None:
-            return
-
-        if (
-            Ticket.objects.filter(user=self.user, title=self.title)
-            .exclude(pk=self.pk)
-            .exists()
-        ):
+    def save(self, *args, **kwargs):
+        """
+        Valide et enregistre le ticket.
+
+        L'unicité du titre pour un même utilisateur est vérifiée par
+        la contrainte de la base de données, sans requête préalable :
+        une violation est convertie en ValidationError. La nouvelle image,
+        déjà écrite sur le disque à ce stade, est alors supprimée.
+        """
+        self.full_clean(validate_constraints=False)
+        new_image = bool(self.image) and not self.image._committed
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError as error:
+            if new_image:
+                self.image.delete(save=False)
+            if not self._has_duplicate_title():
+                raise
             raise ValidationError(
                 f"Vous avez déjà créé un ticket pour ({self.title})."
-                )
+                ) from error
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+    def _has_duplicate_title(self):
+        """Indique si l'utilisateur a déjà un autre ticket de même titre"""
+        return Ticket.objects.filter(
+            user_id=self.user_id, title=self.title
+        ).exclude(pk=self.pk).exists()
 
     def __str__(self):
         return self.title
@@ -165,6 +286,8 @@ class Review(models.Model):
         comment (TextField): Commentaire de la critique, peut être vide.
         time_created (DateTimeField): Date et heure de création de la critique,
         définie automatiquement à la création.
+        updated_at (DateTimeField): Date et heure de la dernière
+        modification, mise à jour automatiquement à chaque sauvegarde.
     """
 
     ticket = models.ForeignKey(to=Ticket, on_delete=models.CASCADE)
@@ -179,11 +302,160 @@ class Review(models.Model):
     headline = models.CharField(max_length=128)
     comment = models.TextField(max_length=8192, blank=True)
     time_created = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-time_created'],
+                name='review_user_time_idx'
+                ),
+            models.Index(
+                fields=['ticket', 'user'],
+                name='review_ticket_user_idx'
+                ),
+        ]
 
     def __str__(self):
         return self.headline
 
 
+class FeedEntry(models.Model):
+    """
+    Modèle représentant un post (ticket ou critique) du flux d'un utilisateur.
+
+    Le flux est matérialisé à l'écriture : une entrée est créée pour chaque
+    utilisateur autorisé à voir un post, et maintenue à jour par les signaux
+    de website.signals. La lecture d'une page du flux se limite ainsi
+    à un parcours de l'index (viewer, time_created, post_type, post_id).
+
+    Attributs:
+        viewer (ForeignKey): Utilisateur dont l'entrée compose le flux.
+        post_type (PositiveSmallIntegerField): Type du post
+        (0 pour un ticket, 1 pour une critique).
+        post_id (PositiveBigIntegerField): Identifiant du post.
+        ticket (ForeignKey): Ticket affiché, si le post est un ticket.
+        review (ForeignKey): Critique affichée, si le post est une critique.
+        time_created (DateTimeField): Date de création du post,
+        recopiée pour le tri du flux.
+    """
+
+    viewer = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+        )
+    post_type = models.PositiveSmallIntegerField()
+    post_id = models.PositiveBigIntegerField()
+    ticket = models.ForeignKey(
+        to=Ticket, on_delete=models.CASCADE,
+        null=True, blank=True, related_name='+'
+        )
+    review = models.ForeignKey(
+        to=Review, on_delete=models.CASCADE,
+        null=True, blank=True, related_name='+'
+        )
+    time_created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['viewer', 'post_type', 'post_id'],
+                name='unique_feed_entry'
+                ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['viewer', '-time_created', '-post_type', '-post_id'],
+                name='feed_entry_page_idx'
+                ),
+        ]
+
+
+class RequestProfile(models.Model):
+    """
+    Modèle représentant le profil d'exécution d'une requête, demandé
+    par un membre du staff (voir website.profiling).
+
+    Le profil cProfile complet est enregistré dans un fichier .prof
+    du répertoire PROFILE_DIR ; le modèle en conserve un résumé
+    consultable dans l'administration.
+
+    Attributs:
+        user (ForeignKey): Membre du staff ayant demandé le profil.
+        path (CharField): Chemin de la requête, paramètres compris.
+        view_name (CharField): Nom de l'URL de la vue profilée.
+        duration_ms (FloatField): Durée de la requête profilée.
+        peak_kb (FloatField): Pic de mémoire allouée pendant la requête.
+        file_name (CharField): Nom du fichier .prof dans PROFILE_DIR.
+        top_functions (TextField): Fonctions les plus coûteuses,
+        triées par temps cumulé.
+        top_allocations (TextField): Lignes de code ayant alloué
+        le plus de mémoire.
+        time_created (DateTimeField): Date du profil.
+    """
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+'
+        )
+    path = models.CharField(max_length=2048)
+    view_name = models.CharField(max_length=128, blank=True)
+    duration_ms = models.FloatField()
+    peak_kb = models.FloatField()
+    file_name = models.CharField(max_length=255)
+    top_functions = models.TextField()
+    top_allocations = models.TextField(blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-time_created']
+
+    def __str__(self):
+        return f'{self.view_name or self.path} ({self.duration_ms:.0f} ms)'
+
+    @property
+    def file_path(self):
+        """Chemin du fichier .prof"""
+        return os.path.join(settings.PROFILE_DIR, self.file_name)
+
+
+class SlowQuery(models.Model):
+    """
+    Modèle représentant une requête SQL plus longue que
+    SLOW_QUERY_THRESHOLD_MS, relevée par website.slow_queries.
+
+    Attributs:
+        view (CharField): Fonction de la vue ayant exécuté la requête.
+        path (CharField): Chemin de la requête HTTP, paramètres compris.
+        database (CharField): Alias de la base de données.
+        sql (TextField): La requête SQL.
+        params (TextField): Ses paramètres, en JSON.
+        duration_ms (FloatField): Durée d'exécution.
+        plan (TextField): Plan d'exécution (EXPLAIN), pour une lecture.
+        time_created (DateTimeField): Date d'exécution.
+    """
+
+    view = models.CharField(max_length=255, blank=True)
+    path = models.CharField(max_length=2048)
+    database = models.CharField(max_length=64)
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    duration_ms = models.FloatField()
+    plan = models.TextField(blank=True)
+    time_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-time_created']
+        verbose_name = 'slow query'
+        verbose_name_plural = 'slow queries'
+
+    def __str__(self):
+        return f'{self.sql[:80]} ({self.duration_ms:.0f} ms)'
+
+
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     """
@@ -200,7 +472,7 @@ def create_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
+def save_profile(sender, instance, created, update_fields=None, **kwargs):
     """
     Enregistre le profil associé à une instance donnée.
 
@@ -211,7 +483,16 @@ def save_profile(sender, instance, **kwargs):
     Args:
         sender (type): La classe de l'instance qui envoie le signal.
         instance (object): L'instance de l'objet qui est sauvegardée.
+        created (bool): Indique si l'instance vient d'être créée.
+        update_fields (frozenset | None): Champs mis à jour, lors d'un
+        enregistrement partiel.
     """
 
+    # Le profil vient d'être créé par create_profile, et un enregistrement
+    # partiel (last_login à chaque connexion) ne le concerne pas :
+    # inutile de le relire et de le réécrire
+    if created or update_fields:
+        return
+
     if hasattr(instance, 'profile'):
         instance.profile.save()
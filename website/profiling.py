@@ -0,0 +1,178 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+from .models import RequestProfile
+
+
+# Paramètre GET et en-tête HTTP demandant le profil d'une requête
+PROFILE_PARAMETER = "profile"
+PROFILE_HEADER = "HTTP_X_PROFILE"
+
+# Nombre de fonctions et de lignes d'allocation conservées dans le résumé
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 15
+
+# tracemalloc est global au processus : deux requêtes profilées en même
+# temps (serveur multi-threads) s'arrêteraient mutuellement la mesure
+# et mêleraient leurs allocations. Elles sont donc profilées l'une après
+# l'autre.
+_profiling = threading.Lock()
+
+
+def profile_requested(request):
+    """
+    Indique si un membre du staff demande le profil de la requête,
+    avec le paramètre GET "profile" ou l'en-tête "X-Profile".
+    """
+
+    if (
+        PROFILE_PARAMETER not in request.GET
+        and not request.META.get(PROFILE_HEADER)
+    ):
+        return False
+    return request.user.is_staff
+
+
+def _summaries(profiler, before, after):
+    """
+    Résumés textuels du profil : fonctions triées par temps cumulé,
+    et lignes ayant alloué le plus de mémoire pendant la requête.
+    """
+
+    functions = io.StringIO()
+    pstats.Stats(profiler, stream=functions).sort_stats(
+        pstats.SortKey.CUMULATIVE
+    ).print_stats(TOP_FUNCTIONS)
+
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    differences = after.filter_traces(ignored).compare_to(
+        before.filter_traces(ignored), "lineno"
+    )
+    allocations = "\n".join(
+        str(difference) for difference in differences[:TOP_ALLOCATIONS]
+    )
+    return functions.getvalue(), allocations
+
+
+def _measure(run):
+    """
+    Exécute run sous cProfile et tracemalloc, un seul appel à la fois.
+
+    Returns:
+        tuple: Le résultat de run, le profil, la durée en secondes,
+        les instantanés de la mémoire avant et après, et le pic
+        de mémoire en octets.
+    """
+
+    with _profiling:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            result = profiler.runcall(run)
+        finally:
+            duration = time.perf_counter() - start
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+
+    return result, profiler, duration, before, after, peak
+
+
+def profile_request(request, get_response):
+    """
+    Traite une requête sous cProfile et tracemalloc, puis enregistre
+    le profil dans PROFILE_DIR et dans le modèle RequestProfile.
+
+    Une réponse en flux continu est entièrement générée pendant
+    le profil. tracemalloc ralentit fortement l'exécution : les durées
+    du profil sont à comparer entre elles, pas au temps réel de la page.
+    Les requêtes profilées s'exécutent l'une après l'autre : une requête
+    profilée attend la fin de celle en cours.
+
+    Args:
+        request (HttpRequest): La requête à profiler.
+        get_response (Callable): La suite du traitement de la requête.
+
+    Returns:
+        HttpResponse: La réponse, avec le nom du fichier du profil
+        dans l'en-tête "X-Profile".
+    """
+
+    def run():
+        response = get_response(request)
+        if response.streaming:
+            response.streaming_content = list(response.streaming_content)
+        return response
+
+    response, profiler, duration, before, after, peak = _measure(run)
+
+    match = request.resolver_match
+    view_name = match.view_name if match else ""
+    file_name = (
+        f"{timezone.now():%Y%m%d-%H%M%S}-{view_name or 'request'}-"
+        f"{uuid.uuid4().hex[:8]}.prof"
+    )
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(directory / file_name)
+
+    top_functions, top_allocations = _summaries(profiler, before, after)
+    RequestProfile.objects.create(
+        user=request.user,
+        path=request.get_full_path()[:2048],
+        view_name=view_name,
+        duration_ms=round(duration * 1000, 1),
+        peak_kb=round(peak / 1024, 1),
+        file_name=file_name,
+        top_functions=top_functions,
+        top_allocations=top_allocations
+    )
+    prune_profiles()
+
+    response["X-Profile"] = file_name
+    return response
+
+
+def prune_profiles():
+    """
+    Supprime les profils au-delà des PROFILE_KEEP plus récents
+    (leurs fichiers sont supprimés par le signal post_delete).
+    """
+
+    stale = RequestProfile.objects.values_list("pk", flat=True)[
+        settings.PROFILE_KEEP:
+    ]
+    RequestProfile.objects.filter(pk__in=list(stale)).delete()
+
+
+class ProfilerMiddleware:
+    """
+    Middleware profilant, à la demande d'un membre du staff,
+    le traitement d'une requête (voir profile_request).
+
+    Placé en dernier dans MIDDLEWARE, il ne profile que la résolution
+    de l'URL et la vue. Les autres requêtes ne subissent qu'un test
+    sur leurs paramètres.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if profile_requested(request):
+            return profile_request(request, self.get_response)
+        return self.get_response(request)
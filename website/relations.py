@@ -0,0 +1,425 @@
+from collections import Counter
+from typing import NamedTuple
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from .cache import bump_feed_versions
+from .feed import sync_feed
+from .models import Profile, Relation
+
+
+FOLLOW = Relation.FOLLOW
+BLOCK = Relation.BLOCK
+
+# Nombre maximal d'utilisateurs visés par un appel de l'API des relations
+MAX_BATCH = 500
+
+# Nombre d'utilisateurs par page des listes de la page "follows"
+LIST_PAGE_SIZE = 50
+
+# Listes de la page "follows" : type de relation, côté de l'utilisateur
+# dont la liste est affichée et côté des utilisateurs listés
+LISTS = {
+    "following": (FOLLOW, "user", "target"),
+    "followers": (FOLLOW, "target", "user"),
+    "blocked": (BLOCK, "user", "target"),
+}
+
+# Compteur de Profile correspondant à chaque côté d'une relation
+COUNTERS = {
+    (FOLLOW, "user"): "following_count",
+    (FOLLOW, "target"): "followers_count",
+    (BLOCK, "user"): "blocked_count",
+}
+
+
+class RelationPage(NamedTuple):
+    """
+    Page d'une liste d'utilisateurs (abonnements, abonnés ou blocages).
+
+    Attributs:
+        users (list): Les utilisateurs de la page.
+        next_cursor (str | None): Curseur de la page suivante,
+        ou None s'il s'agit de la dernière page.
+    """
+
+    users: list
+    next_cursor: str | None
+
+
+def relation_page(user, name: str, cursor: str | None = None,
+                  page_size: int = LIST_PAGE_SIZE):
+    """
+    Retourne une page d'une liste d'utilisateurs liés à un utilisateur,
+    triée par identifiant.
+
+    La page est lue sur un index de Relation à partir du curseur
+    (le dernier identifiant de la page précédente), avec les utilisateurs
+    en jointure : son coût ne dépend pas de la longueur de la liste.
+
+    Args:
+        user (User): L'utilisateur dont la liste est affichée.
+        name (str): "following", "followers" ou "blocked".
+        cursor (str | None): Curseur de la page demandée
+        (première page s'il est absent ou invalide).
+        page_size (int): Nombre d'utilisateurs par page.
+
+    Returns:
+        RelationPage: Les utilisateurs de la page et le curseur suivant.
+    """
+
+    kind, side, other = LISTS[name]
+    relations = Relation.objects.filter(
+        kind=kind, **{side: user}
+    ).select_related(other).only(
+        other, f"{other}__username"
+    ).order_by(f"{other}_id")
+
+    try:
+        relations = relations.filter(**{f"{other}_id__gt": int(cursor)})
+    except (TypeError, ValueError):
+        pass
+
+    rows = list(relations[:page_size + 1])
+    users = [getattr(relation, other) for relation in rows[:page_size]]
+    next_cursor = str(users[-1].pk) if len(rows) > page_size else None
+    return RelationPage(users, next_cursor)
+
+
+def is_following(user, target) -> bool:
+    """
+    Indique si un utilisateur en suit un autre.
+    """
+
+    return Relation.objects.filter(
+        user=user, target=target, kind=FOLLOW
+    ).exists()
+
+
+def blocked_between(user, target_ids):
+    """
+    Utilisateurs, parmi target_ids, bloqués par l'utilisateur
+    ou qui l'ont bloqué.
+
+    Returns:
+        set: Leurs identifiants.
+    """
+
+    target_ids = list(target_ids)
+    pairs = Relation.objects.filter(kind=BLOCK).filter(
+        Q(user=user, target__in=target_ids)
+        | Q(user__in=target_ids, target=user)
+    ).values_list("user_id", "target_id")
+    return {
+        target_id if user_id == user.pk else user_id
+        for user_id, target_id in pairs
+    }
+
+
+def resolve_users(usernames=(), ids=()):
+    """
+    Identifie des utilisateurs par leur nom ou leur identifiant,
+    en une requête (index unique sur le nom et clé primaire).
+
+    Returns:
+        dict: Les noms des utilisateurs trouvés, par identifiant.
+    """
+
+    usernames = list(usernames)
+    ids = list(ids)
+    if not usernames and not ids:
+        return {}
+    return dict(
+        User.objects.filter(Q(username__in=usernames) | Q(pk__in=ids))
+        .values_list("pk", "username")
+    )
+
+
+def _targets(user, target_ids):
+    """
+    Utilisateurs existants parmi target_ids, hors l'utilisateur lui-même.
+    """
+
+    target_ids = {int(pk) for pk in target_ids} - {user.pk}
+    return set(
+        User.objects.filter(pk__in=target_ids).values_list("pk", flat=True)
+    )
+
+
+def _lock(user_ids):
+    """
+    Verrouille les profils des utilisateurs jusqu'à la fin
+    de la transaction, dans l'ordre des clés pour éviter les interblocages.
+
+    Deux changements de relations entre les mêmes utilisateurs sont
+    ainsi sérialisés (sans effet sous SQLite, où les écritures le sont
+    déjà).
+    """
+
+    list(
+        Profile.objects.select_for_update().filter(user__in=user_ids)
+        .order_by("pk").values_list("pk", flat=True)
+    )
+
+
+def _add(counter: str, user_ids, delta: int):
+    """
+    Ajoute delta au compteur des profils des utilisateurs.
+    """
+
+    user_ids = list(user_ids)
+    if user_ids and delta:
+        Profile.objects.filter(user__in=user_ids).update(
+            **{counter: F(counter) + delta}
+        )
+
+
+def _create(user, kind: int, target_ids):
+    """
+    Crée les relations de l'utilisateur vers target_ids qui n'existent
+    pas encore, et met à jour les compteurs.
+
+    Returns:
+        set: Les utilisateurs visés par une nouvelle relation.
+    """
+
+    existing = Relation.objects.filter(
+        user=user, kind=kind, target__in=list(target_ids)
+    ).values_list("target_id", flat=True)
+    added = set(target_ids) - set(existing)
+
+    Relation.objects.bulk_create(
+        Relation(user=user, kind=kind, target_id=target_id)
+        for target_id in sorted(added)
+    )
+    _add(COUNTERS[kind, "user"], [user.pk], len(added))
+    if (kind, "target") in COUNTERS:
+        _add(COUNTERS[kind, "target"], added, 1)
+    return added
+
+
+def _delete(user, kind: int, target_ids, both_ways: bool = False):
+    """
+    Supprime les relations de l'utilisateur vers target_ids, et aussi
+    celles de target_ids vers l'utilisateur si both_ways est vrai,
+    puis met à jour les compteurs.
+
+    Chaque sens est supprimé avec une requête target__in ou user__in
+    sur un index de Relation : l'expression SQL ne grandit pas
+    avec le nombre d'utilisateurs visés.
+
+    Returns:
+        list: Les couples (utilisateur, cible) effectivement supprimés.
+    """
+
+    target_ids = list(target_ids)
+    directions = [
+        Relation.objects.filter(kind=kind, user=user, target__in=target_ids)
+    ]
+    if both_ways:
+        directions.append(Relation.objects.filter(
+            kind=kind, target=user, user__in=target_ids
+        ))
+
+    removed = []
+    for relations in directions:
+        pairs = list(relations.values_list("user_id", "target_id"))
+        if pairs:
+            relations.delete()
+            removed += pairs
+    if not removed:
+        return []
+
+    # Un même utilisateur peut perdre plusieurs relations de chaque côté
+    # (blocage de plusieurs abonnés) : chaque compteur est décrémenté
+    # du nombre de relations supprimées, pas d'une unité
+    for side, index in (("user", 0), ("target", 1)):
+        if (kind, side) not in COUNTERS:
+            continue
+        removed_by_user = Counter(pair[index] for pair in removed)
+        for user_id, count in removed_by_user.items():
+            _add(COUNTERS[kind, side], [user_id], -count)
+    return removed
+
+
+def _sync_feeds(pairs):
+    """
+    Resynchronise le flux de chaque utilisateur pour les utilisateurs
+    dont la relation avec lui a changé, et invalide les caches.
+
+    Args:
+        pairs (Iterable[tuple]): Couples (utilisateur, utilisateur ciblé).
+    """
+
+    targets = {}
+    for user_id, target_id in pairs:
+        targets.setdefault(user_id, set()).add(target_id)
+    if not targets:
+        return
+
+    # La nouvelle version invalide les pages et les auteurs visibles
+    # en cache ; sync_feed calcule ces derniers sous cette version
+    bump_feed_versions(targets)
+    users = User.objects.in_bulk(targets)
+    for user_id, target_ids in targets.items():
+        if user_id in users:
+            sync_feed(users[user_id], target_ids)
+
+
+def follow(user, target_ids):
+    """
+    Abonne un utilisateur à d'autres utilisateurs.
+
+    Les utilisateurs inexistants, déjà suivis, bloqués par l'utilisateur
+    ou qui l'ont bloqué sont ignorés.
+
+    Args:
+        user (User): L'utilisateur qui s'abonne.
+        target_ids (Iterable[int]): Les utilisateurs à suivre.
+
+    Returns:
+        set: Les utilisateurs effectivement suivis.
+    """
+
+    with transaction.atomic():
+        targets = _targets(user, target_ids)
+        _lock(targets | {user.pk})
+        added = _create(user, FOLLOW, targets - blocked_between(user, targets))
+        _sync_feeds((user.pk, target_id) for target_id in added)
+    return added
+
+
+def unfollow(user, target_ids):
+    """
+    Désabonne un utilisateur d'autres utilisateurs.
+
+    Args:
+        user (User): L'utilisateur qui se désabonne.
+        target_ids (Iterable[int]): Les utilisateurs à ne plus suivre.
+
+    Returns:
+        set: Les utilisateurs qui étaient suivis.
+    """
+
+    with transaction.atomic():
+        targets = _targets(user, target_ids)
+        _lock(targets | {user.pk})
+        removed = _delete(user, FOLLOW, targets)
+        _sync_feeds(removed)
+    return {target_id for _, target_id in removed}
+
+
+def block(user, target_ids):
+    """
+    Bloque des utilisateurs.
+
+    Les abonnements entre l'utilisateur et les utilisateurs bloqués
+    sont supprimés, dans les deux sens, et leurs posts disparaissent
+    des flux de l'un et de l'autre.
+
+    Args:
+        user (User): L'utilisateur qui bloque.
+        target_ids (Iterable[int]): Les utilisateurs à bloquer.
+
+    Returns:
+        set: Les utilisateurs nouvellement bloqués.
+    """
+
+    with transaction.atomic():
+        targets = _targets(user, target_ids)
+        _lock(targets | {user.pk})
+        added = _create(user, BLOCK, targets)
+        _delete(user, FOLLOW, added, both_ways=True)
+        _sync_feeds([
+            pair
+            for target_id in added
+            for pair in ((user.pk, target_id), (target_id, user.pk))
+        ])
+    return added
+
+
+def unblock(user, target_ids):
+    """
+    Débloque des utilisateurs. Les abonnements supprimés par le blocage
+    ne sont pas rétablis.
+
+    Args:
+        user (User): L'utilisateur qui débloque.
+        target_ids (Iterable[int]): Les utilisateurs à débloquer.
+
+    Returns:
+        set: Les utilisateurs qui étaient bloqués.
+    """
+
+    with transaction.atomic():
+        targets = _targets(user, target_ids)
+        _lock(targets | {user.pk})
+        removed = _delete(user, BLOCK, targets)
+        _sync_feeds(
+            removed + [(target_id, user_id) for user_id, target_id in removed]
+        )
+    return {target_id for _, target_id in removed}
+
+
+def _counts(side: str, kind: int):
+    """
+    Sous-requête comptant les relations d'un type dont le profil courant
+    est l'utilisateur (side="user") ou la cible (side="target").
+    """
+
+    return Coalesce(Subquery(
+        Relation.objects.filter(kind=kind, **{side: OuterRef("user_id")})
+        .order_by().values(side).annotate(total=Count("pk")).values("total")
+    ), 0)
+
+
+def stale_counters(profiles=None):
+    """
+    Profils dont les compteurs ne correspondent pas à la table Relation.
+
+    Args:
+        profiles (QuerySet | None): Les profils à vérifier
+        (tous par défaut).
+
+    Returns:
+        QuerySet: Les profils à recompter.
+    """
+
+    profiles = Profile.objects.all() if profiles is None else profiles
+    condition = Q()
+    aliases = {}
+    for (kind, side), counter in COUNTERS.items():
+        aliases[f"actual_{counter}"] = _counts(side, kind)
+        condition |= ~Q(**{counter: F(f"actual_{counter}")})
+    return profiles.alias(**aliases).filter(condition)
+
+
+def recount_relations(profiles=None):
+    """
+    Recalcule les compteurs des profils à partir de la table Relation,
+    après une insertion directe des relations (seed_scale) ou pour
+    réparer des compteurs faussés.
+
+    Args:
+        profiles (QuerySet | None): Les profils à recompter
+        (tous par défaut).
+
+    Returns:
+        int: Le nombre de profils mis à jour.
+    """
+
+    profiles = Profile.objects.all() if profiles is None else profiles
+    return profiles.update(**{
+        counter: _counts(side, kind)
+        for (kind, side), counter in COUNTERS.items()
+    })
+
+
+# Opérations de l'API des relations, par nom d'action
+ACTIONS = {
+    "follow": follow,
+    "unfollow": unfollow,
+    "block": block,
+    "unblock": unblock,
+}
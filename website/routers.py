@@ -0,0 +1,139 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+
+
+STICKY_COOKIE = "primary_reads_until"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Gestionnaire de contexte envoyant les lectures de l'ORM
+    vers la réplique, si elle est configurée.
+    """
+
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def is_sticky(request):
+    """
+    Indique si les lectures de l'utilisateur doivent rester sur la base
+    principale, parce qu'il vient d'effectuer une écriture.
+    """
+
+    try:
+        until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+def read_only_view(view_func):
+    """
+    Décorateur pour les vues qui ne font que lire la base de données.
+
+    Les requêtes GET et HEAD lisent sur la réplique, sauf si l'utilisateur
+    a écrit récemment : il voit alors toujours ses propres modifications.
+    Les autres méthodes restent sur la base principale.
+    Le contenu d'une réponse en flux continu, lu après le retour
+    de la vue, est lui aussi généré en lisant sur la réplique.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if (
+            settings.DATABASE_REPLICA is None
+            or request.method not in ("GET", "HEAD")
+            or is_sticky(request)
+        ):
+            return view_func(request, *args, **kwargs)
+
+        with replica_reads():
+            response = view_func(request, *args, **kwargs)
+
+        if response.streaming:
+            response.streaming_content = _read_on_replica(
+                response.streaming_content
+            )
+        return response
+
+    return wrapper
+
+
+def _read_on_replica(content):
+    """
+    Génère le contenu d'une réponse en flux continu en envoyant
+    les lectures de chaque morceau vers la réplique.
+
+    Le contexte est rétabli entre deux morceaux : le serveur peut
+    traiter d'autres requêtes dans le même thread pendant l'envoi.
+    """
+
+    iterator = iter(content)
+    while True:
+        with replica_reads():
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+class ReplicaRouter:
+    """
+    Routeur envoyant les lectures des vues en lecture seule vers
+    la réplique (settings.DATABASE_REPLICA), et tout le reste vers
+    la base principale.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICA and _replica_reads.get():
+            return settings.DATABASE_REPLICA
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplique contient les mêmes données que la base principale
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplique reçoit le schéma par réplication
+        return db != settings.DATABASE_REPLICA
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Middleware qui, après une requête d'écriture (POST, PUT, PATCH,
+    DELETE), maintient les lectures de l'utilisateur sur la base
+    principale pendant REPLICA_STICKINESS secondes, le temps que
+    la réplique rattrape son retard.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if (
+            settings.DATABASE_REPLICA
+            and request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+        ):
+            window = settings.REPLICA_STICKINESS
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + window),
+                max_age=window, httponly=True, samesite="Lax"
+            )
+
+        return response
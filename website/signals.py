@@ -0,0 +1,115 @@
+import os
+from django.db.models import F
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from .models import Profile, Relation, RequestProfile, Ticket, Review
+from .cache import bump_feed_versions
+from .feed import fan_out, post_viewers
+from .relations import recount_relations
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=Review)
+def add_post_to_feeds(sender, instance, created, **kwargs):
+    """
+    Ajoute un nouveau ticket ou une nouvelle critique aux flux concernés
+    et invalide leurs pages en cache.
+
+    Une critique invalide aussi le cache de l'auteur du ticket.
+    Une modification invalide le cache des utilisateurs qui voient le post.
+    """
+
+    if not created:
+        bump_feed_versions(post_viewers(instance))
+        return
+
+    viewer_ids = fan_out(instance)
+    if isinstance(instance, Review):
+        viewer_ids.append(instance.ticket.user_id)
+    bump_feed_versions(viewer_ids)
+
+
+def _add_to_review_count(review: Review, delta: int):
+    """
+    Met à jour le nombre de critiques du ticket critiqué, et invalide
+    le cache des utilisateurs qui voient ce ticket.
+    """
+
+    Ticket.objects.filter(pk=review.ticket_id).update(
+        review_count=F("review_count") + delta
+    )
+    bump_feed_versions(post_viewers(review.ticket))
+
+
+@receiver(post_save, sender=Review)
+def increment_review_count(sender, instance, created, **kwargs):
+    """
+    Incrémente le nombre de critiques du ticket lors d'une création.
+    """
+
+    if created:
+        _add_to_review_count(instance, 1)
+
+
+@receiver(post_delete, sender=Review)
+def decrement_review_count(sender, instance, **kwargs):
+    """
+    Décrémente le nombre de critiques du ticket lors d'une suppression.
+    """
+
+    _add_to_review_count(instance, -1)
+
+
+@receiver(pre_delete, sender=Ticket)
+@receiver(pre_delete, sender=Review)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    """
+    Invalide le cache des utilisateurs qui voient un post supprimé.
+
+    Les entrées du flux sont ensuite supprimées en cascade avec le post.
+    """
+
+    bump_feed_versions(post_viewers(instance))
+
+
+@receiver(pre_delete, sender=User)
+def remember_relations(sender, instance, **kwargs):
+    """
+    Mémorise les utilisateurs liés à un utilisateur supprimé :
+    ses relations sont supprimées en cascade, sans mettre à jour
+    les compteurs de leurs profils.
+    """
+
+    instance._related_user_ids = set(
+        Relation.objects.filter(user=instance)
+        .values_list("target_id", flat=True)
+    ) | set(
+        Relation.objects.filter(target=instance)
+        .values_list("user_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=User)
+def recount_related_profiles(sender, instance, **kwargs):
+    """
+    Recompte les relations des utilisateurs qui étaient liés
+    à un utilisateur supprimé.
+    """
+
+    user_ids = instance.__dict__.pop("_related_user_ids", set())
+    if user_ids:
+        recount_relations(Profile.objects.filter(user__in=user_ids))
+        bump_feed_versions(user_ids)
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_file(sender, instance, **kwargs):
+    """
+    Supprime le fichier .prof d'un profil de requête supprimé.
+    """
+
+    try:
+        os.remove(instance.file_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,143 @@
+import json
+import logging
+import re
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, transaction
+from .instrumentation import observe_queries
+from .models import SlowQuery
+
+
+logger = logging.getLogger(__name__)
+
+# Taille maximale des paramètres conservés pour une requête
+MAX_PARAMS_LENGTH = 2000
+
+# Seules les requêtes ne portant que sur ces tables conservent leurs
+# paramètres : ceux des autres (sessions, utilisateurs et leurs mots
+# de passe, adresses électroniques...) sont masqués
+PARAMS_TABLES = frozenset({
+    "website_ticket",
+    "website_review",
+    "website_feedentry",
+    "website_relation",
+    "website_profile",
+})
+
+# Tables lues ou écrites par une requête générée par l'ORM
+TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+"(\w+)"', re.I)
+
+
+def loggable_params(sql: str, params):
+    """
+    Paramètres d'une requête tels qu'ils sont conservés : masqués,
+    sauf si toutes les tables de la requête font partie de PARAMS_TABLES.
+    """
+
+    tables = set(TABLE_PATTERN.findall(sql))
+    if tables and tables <= PARAMS_TABLES:
+        return params
+    return "masqués"
+
+
+def explain(connection, sql: str, params):
+    """
+    Plan d'exécution d'une requête de lecture (EXPLAIN QUERY PLAN
+    pour SQLite, EXPLAIN pour PostgreSQL).
+
+    Returns:
+        str: Le plan, une étape par ligne, ou une chaîne vide
+        si la requête n'est pas une lecture.
+    """
+
+    words = sql.lstrip(" \n(").split(None, 1)
+    if not words or words[0].upper() not in ("SELECT", "WITH"):
+        return ""
+
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        # Point de sauvegarde : une erreur n'interrompt pas la transaction
+        # de la vue (PostgreSQL)
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}", params)
+                rows = cursor.fetchall()
+    except DatabaseError as error:
+        return f"EXPLAIN impossible : {error}"
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+class SlowQueryRecorder:
+    """
+    Observateur des requêtes SQL (observe_queries) relevant
+    les requêtes plus longues que SLOW_QUERY_THRESHOLD_MS, avec leur plan
+    d'exécution, capturé aussitôt.
+    """
+
+    def __init__(self):
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        self.records = []
+
+    def __call__(self, connection, sql, params, many, duration):
+        if duration < self.threshold:
+            return
+
+        self.records.append({
+            "database": connection.alias,
+            "sql": sql,
+            "params": json.dumps(
+                loggable_params(sql, params), default=str, ensure_ascii=False
+            )[:MAX_PARAMS_LENGTH],
+            "duration_ms": round(duration * 1000, 2),
+            "plan": "" if many else explain(connection, sql, params),
+        })
+
+
+def save_records(request, records):
+    """
+    Journalise les requêtes lentes d'une requête HTTP et les enregistre
+    dans le modèle SlowQuery, en ne gardant que les SLOW_QUERY_KEEP
+    plus récentes.
+    """
+
+    match = request.resolver_match
+    view = match._func_path if match else ""
+    path = request.get_full_path()[:2048]
+
+    for record in records:
+        logger.warning(json.dumps(
+            {"view": view, "path": path, **record}, ensure_ascii=False
+        ))
+
+    SlowQuery.objects.bulk_create(
+        SlowQuery(view=view, path=path, **record) for record in records
+    )
+    stale = SlowQuery.objects.values_list("pk", flat=True)[
+        settings.SLOW_QUERY_KEEP:
+    ]
+    SlowQuery.objects.filter(pk__in=list(stale)).delete()
+
+
+class SlowQueryMiddleware:
+    """
+    Middleware relevant les requêtes SQL lentes de chaque requête HTTP
+    sur toutes les bases (voir SlowQueryRecorder).
+
+    Les requêtes relevées sont enregistrées après la réponse de la vue,
+    hors de ses transactions. Désactivé si SLOW_QUERY_THRESHOLD_MS vaut 0
+    (valeur par défaut).
+    """
+
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_THRESHOLD_MS <= 0:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder()
+        with observe_queries(recorder):
+            response = self.get_response(request)
+
+        if recorder.records:
+            save_records(request, recorder.records)
+        return response
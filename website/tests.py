@@ -0,0 +1,1971 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from .benchmarks import compare, core_cases, count_queries
+from .management.commands.import_posts import (
+    Command as ImportPostsCommand
+)
+from .instrumentation import RequestStats, observe_queries
+from .metrics import (
+    STALE_AFTER, QueryCounter, Registry, collect, registry
+)
+from . import relations
+from .feed import (
+    PAGE_SIZE, POST_REVIEW, POST_TICKET, FeedPage, decode_cursor,
+    encode_cursor, feed_page, iter_feed_page, iter_merged_feed, merged_feed,
+    rebuild_feed, visible_reviews, visible_tickets
+)
+from .profiling import _measure
+from .slow_queries import SlowQueryRecorder
+from .visibility import AUTHORS_KEY, visible_authors
+from .routers import STICKY_COOKIE, ReplicaRouter, replica_reads
+from .models import (
+    FeedEntry, Profile, Relation, RequestProfile, SlowQuery, Ticket, Review
+)
+
+
+# Nombre maximal de requêtes SQL de chaque vue, cache vide
+QUERY_BUDGETS = {
+    "flux": 5,
+    "posts": 8,
+    "follows": 6,
+    "search_users": 3,
+    "create_ticket": 9,
+    "create_standalone_review": 16,
+}
+
+# Motif reconnaissant le parcours d'une table dans un plan d'exécution
+PLAN_PATTERNS = {
+    "sqlite": r"SCAN|SEARCH",
+    "postgresql": r"Scan",
+}
+
+TEST_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "website-tests",
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_STREAMING=False)
+class QueryBudgetTests(TestCase):
+    """
+    Le nombre de requêtes SQL des vues principales est borné et ne dépend
+    pas du nombre de posts ou d'abonnements affichés : une requête par
+    post ou par utilisateur dans un template (N+1) fait échouer ces tests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user("viewer", password="password")
+        cls.created = 0
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.viewer)
+
+    def add_network(self, count):
+        """
+        Ajoute count utilisateurs suivis, abonnés ou bloqués, avec
+        des tickets et des critiques visibles dans le flux du viewer.
+        """
+
+        for _ in range(count):
+            index = type(self).created = type(self).created + 1
+            followed = User.objects.create_user(f"user-followed-{index}")
+            follower = User.objects.create_user(f"user-follower-{index}")
+            blocked = User.objects.create_user(f"user-blocked-{index}")
+            relations.follow(self.viewer, [followed.pk])
+            relations.follow(follower, [self.viewer.pk])
+            relations.block(self.viewer, [blocked.pk])
+
+            ticket = Ticket.objects.create(
+                user=followed, title=f"Ticket {index}"
+            )
+            own_ticket = Ticket.objects.create(
+                user=self.viewer, title=f"Ticket du viewer {index}"
+            )
+            Review.objects.create(
+                ticket=ticket, user=self.viewer, headline="Critique",
+                rating=3
+            )
+            Review.objects.create(
+                ticket=own_ticket, user=followed, headline="Réponse",
+                rating=5
+            )
+
+    def query_counts(self, start=0):
+        counts = {}
+        for index, case in enumerate(core_cases("user"), start=start):
+            cache.clear()
+            counts[case.name] = count_queries(self.client, case, index)
+        return counts
+
+    def test_views_stay_within_query_budget(self):
+        self.add_network(3)
+        for name, count in self.query_counts().items():
+            with self.subTest(view=name):
+                self.assertLessEqual(count, QUERY_BUDGETS[name])
+
+    def test_query_count_does_not_grow_with_data(self):
+        self.add_network(2)
+        small = self.query_counts(start=0)
+        self.add_network(10)
+        large = self.query_counts(start=100)
+        self.assertEqual(small, large)
+
+    @override_settings(FEED_STREAMING=True)
+    def test_streamed_pages_stay_within_query_budget(self):
+        self.add_network(3)
+        for case in core_cases("user")[:2]:
+            with self.subTest(view=case.name):
+                self.assertLessEqual(
+                    count_queries(self.client, case),
+                    QUERY_BUDGETS[case.name]
+                )
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_STREAMING=True)
+class StreamingTests(TestCase):
+    """
+    Pages "flux" et "posts" envoyées en flux continu (stream_page).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author")
+        for index in range(PAGE_SIZE + 1):
+            Ticket.objects.create(user=cls.user, title=f"Ticket {index}")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_head_is_sent_before_reading_posts(self):
+        for name in ("flux", "posts"):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name))
+                content = iter(response.streaming_content)
+                with CaptureQueriesContext(connection) as queries:
+                    head = next(content).decode()
+                self.assertIn('class="posts-list"', head)
+                self.assertFalse(
+                    any("website_" in query["sql"] for query in queries)
+                )
+
+                page = head + b"".join(content).decode()
+                self.assertEqual(page.count('class="post"'), PAGE_SIZE)
+                self.assertLess(
+                    page.rindex('class="post"'), page.index("?cursor=")
+                )
+                self.assertTrue(page.rstrip().endswith("</html>"))
+
+    def test_page_template_is_rendered_once(self):
+        for name in ("flux", "posts"):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name))
+                b"".join(response.streaming_content)
+                self.assertEqual(
+                    [template.name for template in response.templates].count(
+                        f"website/{name}.html"
+                    ),
+                    1
+                )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FeedPaginationTests(TestCase):
+    """
+    Pagination par curseur (time_created, type, id) des pages "posts"
+    (merged_feed) et "flux" (feed_page), y compris entre posts créés
+    au même instant.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author")
+        tickets = [
+            Ticket.objects.create(user=cls.user, title=f"Ticket {index}")
+            for index in range(7)
+        ]
+        for ticket in tickets[:5]:
+            Review.objects.create(
+                ticket=ticket, user=cls.user, headline="Critique", rating=3
+            )
+
+        # Deux instants seulement : la plupart des posts sont à égalité
+        instants = [timezone.now(), timezone.now() - timedelta(hours=1)]
+        for model in (Ticket, Review):
+            for index, pk in enumerate(
+                model.objects.values_list("pk", flat=True)
+            ):
+                model.objects.filter(pk=pk).update(
+                    time_created=instants[index % 2]
+                )
+        FeedEntry.objects.all().delete()
+        rebuild_feed(cls.user)
+
+        cls.expected = sorted(
+            [
+                (ticket.time_created, POST_TICKET, ticket.pk)
+                for ticket in Ticket.objects.all()
+            ] + [
+                (review.time_created, POST_REVIEW, review.pk)
+                for review in Review.objects.all()
+            ],
+            reverse=True
+        )
+
+    def walk(self, build_page):
+        """
+        Parcourt toutes les pages et retourne les posts lus,
+        sous forme de tuples (time_created, type, id).
+        """
+
+        posts = []
+        cursor = None
+        for _ in range(len(self.expected) + 1):
+            page = build_page(cursor)
+            self.assertLessEqual(len(page.posts), 3)
+            posts.extend(
+                (
+                    post.time_created,
+                    POST_TICKET if post.is_ticket else POST_REVIEW,
+                    post.pk
+                )
+                for post in page.posts
+            )
+            cursor = page.next_cursor
+            if cursor is None:
+                return posts
+        self.fail("La dernière page n'a pas été atteinte.")
+
+    def merged_page(self, cursor):
+        return merged_feed(
+            Ticket.objects.filter(user=self.user),
+            Review.objects.filter(user=self.user),
+            cursor=cursor, page_size=3
+        )
+
+    def test_posts_pages_have_no_duplicates_or_gaps(self):
+        self.assertEqual(self.walk(self.merged_page), self.expected)
+
+    def test_flux_pages_have_no_duplicates_or_gaps(self):
+        self.assertEqual(
+            self.walk(lambda cursor: feed_page(self.user, cursor, 3)),
+            self.expected
+        )
+
+    def test_streamed_pages_have_no_duplicates_or_gaps(self):
+        def drain(posts):
+            page = []
+            while True:
+                try:
+                    page.append(next(posts))
+                except StopIteration as end:
+                    return FeedPage(page, end.value)
+
+        for name, build_page in (
+            ("posts", lambda cursor: iter_merged_feed(
+                Ticket.objects.filter(user=self.user),
+                Review.objects.filter(user=self.user),
+                cursor=cursor, page_size=3
+            )),
+            ("flux", lambda cursor: iter_feed_page(self.user, cursor, 3)),
+        ):
+            with self.subTest(view=name):
+                self.assertEqual(
+                    self.walk(lambda cursor: drain(build_page(cursor))),
+                    self.expected
+                )
+
+    def test_last_page_has_no_next_cursor(self):
+        page = merged_feed(
+            Ticket.objects.filter(user=self.user),
+            Review.objects.filter(user=self.user),
+            page_size=len(self.expected)
+        )
+        self.assertEqual(len(page.posts), len(self.expected))
+        self.assertIsNone(page.next_cursor)
+
+    def test_invalid_cursor_returns_first_page(self):
+        first = self.merged_page(None)
+        malformed = base64.urlsafe_b64encode(b"a|b|c").decode()
+        for cursor in ("invalide", malformed, "", "%%"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+                self.assertEqual(self.merged_page(cursor), first)
+        self.assertEqual(
+            decode_cursor(encode_cursor(*self.expected[0])),
+            self.expected[0]
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class VisibleAuthorsTests(TestCase):
+    """
+    Auteurs visibles en cache (website.visibility), sous la version
+    du flux de l'utilisateur.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.ticket = Ticket.objects.create(user=cls.bob, title="De Bob")
+
+    def setUp(self):
+        cache.clear()
+
+    def authors(self):
+        """
+        Auteurs visibles par Alice, lus comme par une nouvelle requête
+        (la version du flux n'est mémorisée que sur l'objet User).
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return visible_authors(User.objects.get(pk=self.alice.pk))
+
+    def test_second_read_is_served_from_cache(self):
+        self.authors()
+        with CaptureQueriesContext(connection) as queries:
+            authors = self.authors()
+        self.assertFalse(
+            any("website_relation" in query["sql"] for query in queries)
+        )
+        self.assertEqual(list(authors.authors), [self.alice.pk])
+
+    def test_follow_and_block_change_the_cached_authors(self):
+        self.authors()
+        with self.captureOnCommitCallbacks(execute=True):
+            relations.follow(self.alice, [self.bob.pk])
+        self.assertEqual(list(self.authors().followed), [self.bob.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            relations.block(self.bob, [self.alice.pk])
+        authors = self.authors()
+        self.assertEqual(list(authors.followed), [])
+        self.assertEqual(list(authors.hidden), [self.bob.pk])
+
+    def test_entry_cached_before_a_block_is_not_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            relations.follow(self.alice, [self.bob.pk])
+        stale = self.authors()
+        version = Profile.objects.get(user=self.alice).feed_version
+
+        # Un autre processus bloque Bob : l'entrée déjà en cache reste
+        # en place, mais la version du flux d'Alice a changé
+        relations.block(self.alice, [self.bob.pk])
+        self.assertEqual(
+            cache.get(AUTHORS_KEY.format(
+                user_id=self.alice.pk, version=version
+            )),
+            stale
+        )
+
+        alice = User.objects.get(pk=self.alice.pk)
+        self.assertEqual(list(visible_authors(alice).hidden), [self.bob.pk])
+        self.assertFalse(visible_tickets(alice).exists())
+
+    def test_rolled_back_change_is_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                relations.follow(self.alice, [self.bob.pk])
+                transaction.set_rollback(True)
+
+        self.assertEqual(list(self.authors().followed), [])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FanOutTests(TestCase):
+    """
+    Le flux matérialisé (FeedEntry) contient exactement les posts
+    visibles de chaque utilisateur (visible_tickets et visible_reviews)
+    après chaque écriture.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice, cls.bob, cls.carol, cls.dave = [
+            User.objects.create_user(name)
+            for name in ("alice", "bob", "carol", "dave")
+        ]
+        relations.follow(cls.alice, [cls.bob.pk])
+        relations.follow(cls.carol, [cls.alice.pk])
+        cls.ticket = Ticket.objects.create(user=cls.bob, title="De Bob")
+
+    def setUp(self):
+        cache.clear()
+
+    def assertFeedsMatchVisibility(self):
+        for user in (self.alice, self.bob, self.carol, self.dave):
+            with self.subTest(user=user.username):
+                entries = set(FeedEntry.objects.filter(
+                    viewer=user
+                ).values_list("post_type", "post_id"))
+                visible = {
+                    (POST_TICKET, pk) for pk in
+                    visible_tickets(user).values_list("pk", flat=True)
+                } | {
+                    (POST_REVIEW, pk) for pk in
+                    visible_reviews(user).values_list("pk", flat=True)
+                }
+                self.assertEqual(entries, visible)
+
+    def test_new_ticket(self):
+        Ticket.objects.create(user=self.alice, title="D'Alice")
+        self.assertFeedsMatchVisibility()
+
+    def test_review_of_a_followed_users_ticket(self):
+        Review.objects.create(
+            ticket=self.ticket, user=self.dave, headline="De Dave", rating=2
+        )
+        self.assertFeedsMatchVisibility()
+        self.assertTrue(FeedEntry.objects.filter(
+            viewer=self.alice, review__user=self.dave
+        ).exists())
+
+    def test_follow_and_unfollow(self):
+        Ticket.objects.create(user=self.dave, title="De Dave")
+        relations.follow(self.alice, [self.dave.pk])
+        self.assertFeedsMatchVisibility()
+        relations.unfollow(self.alice, [self.bob.pk])
+        self.assertFeedsMatchVisibility()
+
+    def test_block_and_unblock(self):
+        relations.follow(self.bob, [self.carol.pk])
+        Review.objects.create(
+            ticket=self.ticket, user=self.carol, headline="De Carol",
+            rating=4
+        )
+        self.assertFeedsMatchVisibility()
+        self.assertTrue(FeedEntry.objects.filter(
+            viewer=self.bob, review__user=self.carol
+        ).exists())
+
+        relations.block(self.bob, [self.carol.pk])
+        self.assertFeedsMatchVisibility()
+        self.assertFalse(FeedEntry.objects.filter(
+            viewer=self.bob, review__user=self.carol
+        ).exists())
+        relations.unblock(self.bob, [self.carol.pk])
+        self.assertFeedsMatchVisibility()
+
+    def test_deleted_posts(self):
+        review = Review.objects.create(
+            ticket=self.ticket, user=self.alice, headline="D'Alice",
+            rating=5
+        )
+        review.delete()
+        self.assertFeedsMatchVisibility()
+        self.ticket.delete()
+        self.assertFeedsMatchVisibility()
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_rebuild_feed_matches_fan_out(self):
+        Review.objects.create(
+            ticket=self.ticket, user=self.alice, headline="D'Alice",
+            rating=5
+        )
+        before = set(FeedEntry.objects.values_list(
+            "viewer", "post_type", "post_id", "time_created"
+        ))
+        for user in (self.alice, self.bob, self.carol, self.dave):
+            rebuild_feed(user)
+        self.assertEqual(set(FeedEntry.objects.values_list(
+            "viewer", "post_type", "post_id", "time_created"
+        )), before)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FeedJsonTests(TestCase):
+    """
+    Pages du flux au format JSON (vue feed_posts, défilement infini).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.carol = User.objects.create_user("carol")
+        relations.follow(cls.alice, [cls.bob.pk, cls.carol.pk])
+        cls.tickets = [
+            Ticket.objects.create(user=cls.bob, title=f"Ticket {index}")
+            for index in range(PAGE_SIZE + 2)
+        ]
+        Ticket.objects.create(user=cls.carol, title="De Carol")
+        Review.objects.create(
+            ticket=cls.tickets[0], user=cls.carol, headline="Par Carol",
+            rating=2
+        )
+        relations.block(cls.alice, [cls.carol.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def get(self, cursor=None):
+        params = {"cursor": cursor} if cursor is not None else {}
+        response = self.client.get(reverse("feed_posts"), params)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return json.loads(b"".join(response.streaming_content))
+
+    def walk(self):
+        first = self.get()
+        self.assertEqual(len(first["posts"]), PAGE_SIZE)
+        self.assertIsNotNone(first["next_cursor"])
+
+        second = self.get(first["next_cursor"])
+        self.assertIsNone(second["next_cursor"])
+        return first["posts"] + second["posts"]
+
+    def test_cursor_walks_all_pages(self):
+        expected = sorted(
+            self.tickets,
+            key=lambda ticket: (ticket.time_created, ticket.pk),
+            reverse=True
+        )
+        self.assertEqual(
+            [(post["type"], post["id"]) for post in self.walk()],
+            [("ticket", ticket.pk) for ticket in expected]
+        )
+
+    def test_hidden_authors_are_excluded(self):
+        posts = self.walk()
+        self.assertNotIn("carol", {post["author"] for post in posts})
+        self.assertNotIn("Par Carol", {post["title"] for post in posts})
+
+    def test_invalid_cursor_returns_first_page(self):
+        first = self.get()
+        for cursor in ("invalide", "", "%%"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.get(cursor), first)
+
+    def test_empty_feed(self):
+        self.client.force_login(User.objects.create_user("dave"))
+        self.assertEqual(self.get(), {"posts": [], "next_cursor": None})
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_STREAMING=False)
+class FeedCacheTests(TestCase):
+    """
+    Invalidation des pages "flux" en cache par la version du flux,
+    stockée dans la base (website.cache).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.carol = User.objects.create_user("carol")
+        relations.follow(cls.alice, [cls.bob.pk])
+        cls.ticket = Ticket.objects.create(user=cls.bob, title="Premier")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def version(self):
+        return Profile.objects.get(user=self.alice).feed_version
+
+    def assertInvalidates(self, action, expected):
+        """
+        Vérifie qu'une action change la version du flux d'Alice,
+        et que la page suivante est reconstruite avec expected.
+        """
+
+        self.client.get(reverse("flux"))
+        before = self.version()
+        action()
+        self.assertGreater(self.version(), before)
+        self.assertContains(self.client.get(reverse("flux")), expected)
+
+    def test_page_is_cached_until_the_version_changes(self):
+        self.assertContains(self.client.get(reverse("flux")), "Premier")
+        Ticket.objects.filter(pk=self.ticket.pk).update(
+            title="Renommé", updated_at=timezone.now()
+        )
+        self.assertContains(self.client.get(reverse("flux")), "Premier")
+
+        # Incrément par un autre processus, dont le cache n'est pas partagé
+        Profile.objects.filter(user=self.alice).update(
+            feed_version=F("feed_version") + 1
+        )
+        self.assertContains(self.client.get(reverse("flux")), "Renommé")
+
+    def test_new_post_invalidates_followers_pages(self):
+        self.assertInvalidates(
+            lambda: Ticket.objects.create(user=self.bob, title="Nouveau"),
+            "Nouveau"
+        )
+
+    def test_review_invalidates_the_page(self):
+        own = Ticket.objects.create(user=self.alice, title="Mon ticket")
+        self.assertInvalidates(
+            lambda: Review.objects.create(
+                ticket=own, user=self.bob, headline="Réponse de Bob",
+                rating=4
+            ),
+            "Réponse de Bob"
+        )
+
+    def test_follow_and_block_invalidate_the_page(self):
+        Ticket.objects.create(user=self.carol, title="De Carol")
+        self.assertInvalidates(
+            lambda: relations.follow(self.alice, [self.carol.pk]),
+            "De Carol"
+        )
+        self.assertInvalidates(
+            lambda: relations.block(self.alice, [self.bob.pk]),
+            "De Carol"
+        )
+        self.assertNotContains(self.client.get(reverse("flux")), "Premier")
+
+    def test_deleted_post_leaves_the_page(self):
+        self.assertInvalidates(self.ticket.delete, "flux")
+        self.assertNotContains(self.client.get(reverse("flux")), "Premier")
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_STREAMING=False)
+class CardCacheTests(TestCase):
+    """
+    Cartes des posts en cache ({% cache %} dans les templates de carte) :
+    toute modification d'un post ou de son ticket apparaît aussitôt.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        relations.follow(cls.alice, [cls.bob.pk])
+        cls.ticket = Ticket.objects.create(
+            user=cls.bob, title="Titre initial", description="Résumé initial"
+        )
+        cls.review = Review.objects.create(
+            ticket=cls.ticket, user=cls.bob, headline="Avis initial",
+            rating=2, comment="Commentaire initial"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def page(self, user, name):
+        self.client.force_login(user)
+        return self.client.get(reverse(name)).content.decode()
+
+    def edit(self, name, post, data):
+        self.client.force_login(post.user)
+        response = self.client.post(
+            reverse(name, args=[post.pk, name.split("_")[1]]), data
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_edited_ticket_replaces_its_cached_cards(self):
+        for user, name in ((self.alice, "flux"), (self.bob, "posts")):
+            self.assertIn("Titre initial", self.page(user, name))
+
+        self.edit("edit_ticket", self.ticket, {
+            "title": "Titre modifié", "description": "Résumé modifié"
+        })
+
+        for user, name in ((self.alice, "flux"), (self.bob, "posts")):
+            with self.subTest(view=name):
+                page = self.page(user, name)
+                self.assertNotIn("Titre initial", page)
+                self.assertNotIn("Résumé initial", page)
+                # Carte du ticket, et ticket rappelé dans celle de la critique
+                self.assertEqual(page.count("Titre modifié"), 2)
+
+    def test_edited_review_replaces_its_cached_cards(self):
+        for user, name in ((self.alice, "flux"), (self.bob, "posts")):
+            self.assertIn("Commentaire initial", self.page(user, name))
+
+        self.edit("edit_review", self.review, {
+            "headline": "Avis modifié", "rating": 5,
+            "comment": "Commentaire modifié"
+        })
+
+        for user, name in ((self.alice, "flux"), (self.bob, "posts")):
+            with self.subTest(view=name):
+                page = self.page(user, name)
+                self.assertNotIn("Commentaire initial", page)
+                self.assertIn("Avis modifié", page)
+                self.assertIn("Commentaire modifié", page)
+
+    def test_new_review_of_a_cached_ticket_hides_the_review_button(self):
+        ticket = Ticket.objects.create(user=self.bob, title="Sans critique")
+        button = reverse("create_related_review", args=[ticket.pk])
+        self.assertIn(button, self.page(self.alice, "flux"))
+
+        Review.objects.create(
+            ticket=ticket, user=self.alice, headline="Première", rating=4
+        )
+
+        page = self.page(self.alice, "flux")
+        self.assertNotIn(button, page)
+        self.assertIn("Première", page)
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_STREAMING=False)
+class ConditionalGetTests(TestCase):
+    """
+    Réponses "304 Not Modified" des pages "flux" et "posts".
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        relations.follow(cls.alice, [cls.bob.pk])
+        Ticket.objects.create(user=cls.alice, title="D'Alice")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def get(self, name, etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get(reverse(name), headers=headers)
+
+    def test_not_modified_until_a_write(self):
+        writes = {
+            "flux": lambda: Ticket.objects.create(
+                user=self.bob, title="De Bob"
+            ),
+            "posts": lambda: Ticket.objects.create(
+                user=self.alice, title="Encore d'Alice"
+            ),
+        }
+        for name, write in writes.items():
+            with self.subTest(view=name):
+                first = self.get(name)
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(
+                    self.get(name, first["ETag"]).status_code, 304
+                )
+
+                write()
+                after = self.get(name, first["ETag"])
+                self.assertEqual(after.status_code, 200)
+                self.assertNotEqual(after["ETag"], first["ETag"])
+
+    def test_etag_does_not_depend_on_the_process_cache(self):
+        etag = self.get("flux")["ETag"]
+        cache.clear()
+        self.assertEqual(self.get("flux", etag).status_code, 304)
+
+        # Écriture faite par un autre processus, dont le cache est distinct
+        Profile.objects.filter(user=self.alice).update(
+            feed_version=F("feed_version") + 1
+        )
+        self.assertEqual(self.get("flux", etag).status_code, 200)
+
+
+class TicketTests(TestCase):
+    """
+    Unicité du titre des tickets d'un utilisateur.
+    """
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = Path(media.name)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user("author")
+
+    def upload(self):
+        image = BytesIO()
+        Image.new("RGB", (10, 10)).save(image, "PNG")
+        return SimpleUploadedFile(
+            "cover.png", image.getvalue(), content_type="image/png"
+        )
+
+    def test_duplicate_title_is_rejected_without_leaving_its_image(self):
+        first = Ticket.objects.create(
+            user=self.user, title="Titre", image=self.upload()
+        )
+
+        with self.assertRaises(ValidationError):
+            Ticket.objects.create(
+                user=self.user, title="Titre", image=self.upload()
+            )
+
+        images = list(self.media.rglob("*.png"))
+        self.assertEqual(images, [self.media / first.image.name])
+        Ticket.objects.create(
+            user=User.objects.create_user("other"), title="Titre"
+        )
+
+
+@override_settings(
+    CACHES=TEST_CACHES, DATABASE_REPLICA="replica", FEED_STREAMING=False
+)
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    Lectures des vues en lecture seule sur la réplique (website.routers).
+
+    L'alias "replica" est, pendant les tests, un miroir de la base
+    principale : les requêtes sont attribuées à l'une ou à l'autre
+    d'après la connexion qui les exécute.
+    """
+
+    databases = {"default", "replica"}
+
+    @classmethod
+    def tearDownClass(cls):
+        # Sous PostgreSQL, le pool de connexions du miroir empêcherait
+        # la suppression de la base de test
+        if hasattr(connections["replica"], "close_pool"):
+            connections["replica"].close_pool()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("reader")
+        Ticket.objects.create(user=self.user, title="Lu sur la réplique")
+        self.client.force_login(self.user)
+
+    def get(self, name):
+        """
+        Charge une page et retourne la réponse, avec les requêtes SQL
+        exécutées sur la base principale et sur la réplique.
+        """
+
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(reverse(name))
+            content = b"".join(
+                response.streaming_content
+            ) if response.streaming else response.content
+        return content.decode(), primary, replica
+
+    def post_queries(self, queries):
+        """
+        Requêtes lisant les posts ou le flux, par opposition à celles
+        de la session et de l'authentification.
+        """
+
+        return [
+            query for query in queries.captured_queries
+            if "website_feedentry" in query["sql"]
+            or "website_ticket" in query["sql"]
+        ]
+
+    def test_router_sends_writes_to_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Ticket), "default")
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Ticket), "replica")
+            self.assertEqual(router.db_for_write(Ticket), "default")
+
+    def test_read_only_views_read_on_replica(self):
+        for name in ("flux", "posts", "follows", "feed_posts"):
+            with self.subTest(view=name):
+                content, primary, replica = self.get(name)
+                self.assertGreater(len(replica), 0)
+                self.assertFalse(self.post_queries(primary))
+
+    @override_settings(FEED_STREAMING=True)
+    def test_streamed_pages_read_on_replica(self):
+        for name in ("flux", "posts"):
+            with self.subTest(view=name):
+                content, primary, replica = self.get(name)
+                self.assertIn("Lu sur la réplique", content)
+                self.assertFalse(self.post_queries(primary))
+                self.assertTrue(self.post_queries(replica))
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        response = self.client.post(reverse("create_ticket"), {
+            "title": "Écrit sur la base principale", "description": ""
+        })
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        content, primary, replica = self.get("flux")
+        self.assertIn("Écrit sur la base principale", content)
+        self.assertEqual(len(replica), 0)
+
+        self.client.cookies[STICKY_COOKIE] = "0"
+        content, primary, replica = self.get("flux")
+        self.assertGreater(len(replica), 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ImportPostsTests(TestCase):
+    """
+    Import de tickets et de critiques par lots (commande import_posts).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        relations.follow(cls.bob, [cls.alice.pk])
+        Ticket.objects.create(user=cls.alice, title="Existant")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "posts.jsonl"
+
+    def run_import(self, rows, *args):
+        self.path.write_text(
+            "".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8"
+        )
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_posts", str(self.path), *args,
+            stdout=stdout, stderr=stderr
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_imports_posts_with_feed_and_review_counts(self):
+        version = Profile.objects.get(user=self.bob).feed_version
+        stdout, stderr = self.run_import([
+            {"type": "ticket", "author": "alice", "title": "Importé"},
+            {"type": "review", "author": "alice", "ticket_author": "alice",
+             "ticket_title": "Importé", "headline": "Critique", "rating": 4},
+            {"type": "review", "author": "bob", "ticket_author": "alice",
+             "ticket_title": "Existant", "headline": "Autre", "rating": 2},
+        ], "--batch-size", "2")
+
+        self.assertIn("1 tickets, 2 critiques", stdout)
+        self.assertEqual(stderr, "")
+        counts = dict(Ticket.objects.values_list("title", "review_count"))
+        self.assertEqual(counts, {"Existant": 1, "Importé": 1})
+        self.assertEqual(
+            FeedEntry.objects.filter(viewer=self.bob).count(), 4
+        )
+        self.assertGreater(
+            Profile.objects.get(user=self.bob).feed_version, version
+        )
+        self.assertFalse(Path(f"{self.path}.checkpoint").exists())
+
+    def test_rejects_duplicates_and_unknown_rows(self):
+        stdout, stderr = self.run_import([
+            {"type": "ticket", "author": "alice", "title": "Nouveau"},
+            {"type": "ticket", "author": "alice", "title": "Nouveau"},
+            {"type": "ticket", "author": "alice", "title": "Existant"},
+            {"type": "ticket", "author": "inconnu", "title": "Titre"},
+            {"type": "review", "author": "bob", "ticket_author": "alice",
+             "ticket_title": "Absent", "headline": "Critique", "rating": 1},
+            {"type": "poll", "author": "alice"},
+        ])
+
+        self.assertIn("1 tickets, 0 critiques", stdout)
+        self.assertIn("5 lignes rejetées", stdout)
+        for number, message in (
+            (2, "ticket en double (Nouveau)"),
+            (3, "Ticket déjà existant pour (Existant)."),
+            (4, "auteur inconnu (inconnu)"),
+            (5, "ticket introuvable (Absent)"),
+            (6, "type inconnu"),
+        ):
+            self.assertIn(f"Ligne {number} : {message}", stderr)
+        self.assertEqual(Ticket.objects.filter(title="Nouveau").count(), 1)
+
+    def test_resume_after_a_failed_batch(self):
+        class FailingImport(ImportPostsCommand):
+            def import_batch(self, batch):
+                if batch[0][0] > 2:
+                    raise RuntimeError("panne")
+                super().import_batch(batch)
+
+        rows = [
+            {"type": "ticket", "author": "alice", "title": f"Ticket {index}"}
+            for index in range(1, 6)
+        ]
+        self.path.write_text(
+            "".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8"
+        )
+        checkpoint = Path(f"{self.path}.checkpoint")
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    FailingImport(), str(self.path), "--batch-size", "2",
+                    stdout=StringIO()
+                )
+            self.assertFalse(checkpoint.exists())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(json.loads(checkpoint.read_text()), {"line": 2})
+        self.assertEqual(Ticket.objects.filter(user=self.alice).count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stdout, stderr = self.run_import(
+                rows, "--batch-size", "2", "--resume"
+            )
+        self.assertIn("Reprise après la ligne 2.", stdout)
+        self.assertIn("3 tickets", stdout)
+        self.assertEqual(stderr, "")
+        self.assertEqual(Ticket.objects.filter(user=self.alice).count(), 6)
+        self.assertFalse(checkpoint.exists())
+
+    def test_replayed_reviews_are_not_duplicated(self):
+        # Un arrêt entre la validation d'un lot et l'écriture du point
+        # de reprise fait relire ce lot : ses critiques sont rejetées.
+        rows = [
+            {"type": "review", "author": "bob", "ticket_author": "alice",
+             "ticket_title": "Existant", "headline": "Critique", "rating": 3},
+        ]
+        self.run_import(rows)
+        stdout, stderr = self.run_import(rows, "--resume")
+
+        self.assertIn("0 critiques", stdout)
+        self.assertIn(
+            "Ligne 1 : critique déjà existante (Critique)", stderr
+        )
+        self.assertEqual(Review.objects.count(), 1)
+        self.assertEqual(
+            Ticket.objects.get(title="Existant").review_count, 1
+        )
+
+    def test_reviews_of_many_existing_tickets_in_one_batch(self):
+        count = 1200
+        Ticket.objects.bulk_create(
+            Ticket(user=self.alice, title=f"Livre {index}")
+            for index in range(count)
+        )
+        stdout, stderr = self.run_import([
+            {"type": "review", "author": "bob", "ticket_author": "alice",
+             "ticket_title": f"Livre {index}", "headline": "Critique",
+             "rating": 4}
+            for index in range(count)
+        ], "--batch-size", str(count))
+
+        self.assertIn(f"0 tickets, {count} critiques", stdout)
+        self.assertEqual(stderr, "")
+        self.assertEqual(
+            Review.objects.filter(ticket__title__startswith="Livre").count(),
+            count
+        )
+
+    def test_social_rows_are_reported_as_skipped(self):
+        stdout, stderr = self.run_import([
+            {"type": "follow", "author": "alice", "target": "bob"},
+            {"type": "block", "author": "alice", "target": "bob"},
+            {"type": "ticket", "author": "alice", "title": "Avec réseau"},
+        ])
+
+        self.assertIn("2 abonnements et blocages ignorés", stdout)
+        self.assertIn("0 lignes rejetées", stdout)
+        self.assertEqual(stderr, "")
+        self.assertEqual(Relation.objects.filter(user=self.alice).count(), 0)
+
+    def test_export_then_import_on_empty_database(self):
+        bob_ticket = Ticket.objects.create(
+            user=self.bob, title="Livre de Bob", description="Résumé, « cité »"
+        )
+        existing = Ticket.objects.get(title="Existant")
+        Review.objects.create(
+            ticket=existing, user=self.alice, headline="Mien", rating=3
+        )
+        Review.objects.create(
+            ticket=existing, user=self.bob, headline="Sien", rating=5,
+            comment="Sur\nplusieurs lignes"
+        )
+        Review.objects.create(
+            ticket=bob_ticket, user=self.bob, headline="Zéro", rating=0
+        )
+        Ticket.objects.update(review_count=0)
+        for review in Review.objects.all():
+            Ticket.objects.filter(pk=review.ticket_id).update(
+                review_count=F("review_count") + 1
+            )
+
+        def posts():
+            return (
+                set(Ticket.objects.values_list(
+                    "user__username", "title", "description", "review_count"
+                )),
+                set(Review.objects.values_list(
+                    "user__username", "ticket__user__username",
+                    "ticket__title", "headline", "rating", "comment"
+                )),
+            )
+
+        expected = posts()
+        for file_format in ("jsonl", "csv"):
+            with self.subTest(file_format=file_format):
+                paths = []
+                for username in ("alice", "bob"):
+                    path = self.path.with_name(f"{username}.{file_format}")
+                    call_command(
+                        "export_posts", "--user", username,
+                        "--format", file_format, "--output", str(path)
+                    )
+                    paths.append(path)
+
+                Ticket.objects.all().delete()
+                for path in paths:
+                    stderr = StringIO()
+                    call_command(
+                        "import_posts", str(path),
+                        stdout=StringIO(), stderr=stderr
+                    )
+                    self.assertEqual(stderr.getvalue(), "")
+
+                self.assertEqual(posts(), expected)
+
+
+class CreateProfilesTests(TestCase):
+    """
+    Réparation des profils (commande create_profiles) : profils
+    manquants et compteurs d'abonnements et de blocages faussés.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.carol = User.objects.create_user("carol")
+        cls.ticket = Ticket.objects.create(user=cls.alice, title="D'Alice")
+        relations.follow(cls.bob, [cls.alice.pk])
+        relations.follow(cls.carol, [cls.alice.pk])
+
+        # Alice a publié avant la création de son profil, et les
+        # compteurs de Bob ont été faussés par une mise à jour directe
+        Profile.objects.filter(user=cls.alice).delete()
+        FeedEntry.objects.filter(viewer=cls.alice).delete()
+        Profile.objects.filter(user=cls.bob).update(following_count=5)
+
+    def run_command(self, *args):
+        stdout = StringIO()
+        call_command("create_profiles", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_check_reports_without_repairing(self):
+        stdout = self.run_command("--check")
+
+        self.assertIn(
+            "1 utilisateurs sans profil, 0 profils orphelins, "
+            "1 profils aux compteurs faussés.", stdout
+        )
+        self.assertFalse(Profile.objects.filter(user=self.alice).exists())
+        self.assertEqual(
+            Profile.objects.get(user=self.bob).following_count, 5
+        )
+
+    def test_repair_creates_profiles_and_recounts(self):
+        stdout = self.run_command()
+
+        self.assertIn("1/1 profils créés", stdout)
+        # Bob, et Alice dont le nouveau profil ne compte pas ses abonnés
+        self.assertIn("2 profils recomptés.", stdout)
+        profile = Profile.objects.get(user=self.alice)
+        self.assertEqual(profile.followers_count, 2)
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                viewer=self.alice, ticket=self.ticket
+            ).exists()
+        )
+        self.assertFalse(relations.stale_counters().exists())
+        self.assertIn(
+            "0 utilisateurs sans profil, 0 profils orphelins, "
+            "0 profils aux compteurs faussés.", self.run_command("--check")
+        )
+
+    def test_block_of_several_followers_leaves_nothing_to_repair(self):
+        self.run_command()
+        relations.block(self.alice, [self.bob.pk, self.carol.pk])
+
+        self.assertIn(
+            "0 profils aux compteurs faussés.", self.run_command("--check")
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.alice).followers_count, 0
+        )
+
+
+class CompareTests(SimpleTestCase):
+    """
+    Détection des régressions entre deux exécutions du benchmark.
+    """
+
+    baseline = {"100": {"flux": {
+        "wall_ms": 10.0, "queries": 4, "peak_kb": 300.0
+    }}}
+
+    def run_compare(self, **changes):
+        results = {"100": {"flux": {**self.baseline["100"]["flux"]}}}
+        results["100"]["flux"].update(changes)
+        return compare(self.baseline, results, threshold=0.2)
+
+    def test_tolerates_noise_below_threshold(self):
+        self.assertEqual(self.run_compare(wall_ms=11.9, peak_kb=350.0), [])
+
+    def test_reports_time_and_memory_above_threshold(self):
+        regressions = self.run_compare(wall_ms=12.5, peak_kb=400.0)
+        self.assertEqual(len(regressions), 2)
+
+    def test_any_additional_query_is_a_regression(self):
+        self.assertEqual(len(self.run_compare(queries=5)), 1)
+
+    def test_ignores_cases_missing_from_baseline(self):
+        results = {"1000": {"flux": {
+            "wall_ms": 99.0, "queries": 40, "peak_kb": 900.0
+        }}}
+        self.assertEqual(compare(self.baseline, results, 0.2), [])
+
+
+class BenchViewsCommandTests(TestCase):
+    """
+    La commande bench_views enregistre ses mesures et échoue
+    en cas de régression.
+    """
+
+    def test_writes_results_and_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "bench.json"
+            call_command(
+                "bench_views", sizes=[5], repeat=1, output=str(output),
+                stdout=StringIO()
+            )
+            report = json.loads(output.read_text(encoding="utf-8"))
+            self.assertEqual(
+                set(report["results"]["5"]), set(QUERY_BUDGETS)
+            )
+            self.assertFalse(User.objects.filter(
+                username__startswith="bench5-"
+            ).exists())
+
+            report["results"]["5"]["flux"]["queries"] = 0
+            output.write_text(json.dumps(report), encoding="utf-8")
+            with self.assertRaises(CommandError):
+                call_command(
+                    "bench_views", sizes=[5], repeat=1,
+                    compare=str(output), stdout=StringIO(),
+                    stderr=StringIO()
+                )
+
+
+class SeedScaleTests(TestCase):
+    """
+    Jeu de données généré (commande seed_scale) : les posts gardent
+    leurs dates réparties sur --days jours.
+    """
+
+    def test_posts_keep_generated_dates(self):
+        call_command(
+            "seed_scale", users=10, tickets=40, review_ratio=0.5,
+            follows=3, days=30, batch_size=16, stdout=StringIO()
+        )
+
+        oldest = timezone.now() - timedelta(days=1)
+        for model in (Ticket, Review):
+            with self.subTest(model=model.__name__):
+                dates = list(model.objects.values_list(
+                    "time_created", flat=True
+                ))
+                self.assertTrue(dates)
+                self.assertTrue(any(date < oldest for date in dates))
+                self.assertTrue(
+                    model._meta.get_field("time_created").auto_now_add
+                )
+
+        entries = FeedEntry.objects.filter(ticket__isnull=False)
+        self.assertTrue(entries.exists())
+        self.assertFalse(entries.exclude(
+            time_created=F("ticket__time_created")
+        ).exists())
+        self.assertFalse(FeedEntry.objects.filter(
+            review__isnull=False
+        ).exclude(time_created=F("review__time_created")).exists())
+
+
+@override_settings(CACHES=TEST_CACHES, REQUEST_TIMING_SAMPLE_RATE=1)
+class RequestTimingTests(TestCase):
+    """
+    Mesure des requêtes HTTP par RequestTimingMiddleware.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("timed")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sampled_request_reports_server_timing_and_log(self):
+        with self.assertLogs("website.instrumentation", "INFO") as logs:
+            response = self.client.get(reverse("flux"))
+
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+, queries;desc="\d+", duplicates;desc="0", '
+            r"tpl;dur=[\d.]+, total;dur=[\d.]+$"
+        )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "flux")
+        self.assertEqual(record["function"], "website.views.flux")
+        self.assertGreater(record["queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_disabled_when_sample_rate_is_zero(self):
+        response = self.client.get(reverse("flux"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_repeated_queries_are_reported_as_duplicates(self):
+        stats = RequestStats()
+        with observe_queries(stats):
+            for _ in range(3):
+                User.objects.get(pk=self.user.pk)
+            User.objects.filter(username="timed").exists()
+
+        self.assertEqual(stats.queries, 4)
+        [(sql, count)] = stats.duplicates()
+        self.assertEqual(count, 3)
+        self.assertIn("auth_user", sql)
+
+
+    def test_observers_share_one_execute_wrapper(self):
+        stats, counter = RequestStats(), QueryCounter()
+        wrappers = len(connection.execute_wrappers)
+        with observe_queries(stats), observe_queries(counter):
+            self.assertEqual(len(connection.execute_wrappers), wrappers + 1)
+            User.objects.get(pk=self.user.pk)
+            User.objects.filter(username="timed").exists()
+
+        self.assertEqual(len(connection.execute_wrappers), wrappers)
+        self.assertEqual((stats.queries, counter.count), (2, 2))
+
+@override_settings(CACHES=TEST_CACHES, PROFILE_KEEP=2)
+class ProfilerTests(TestCase):
+    """
+    Profils de requêtes demandés par le staff.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            "staff", is_staff=True, is_superuser=True
+        )
+        cls.member = User.objects.create_user("member")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(PROFILE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_staff_request_is_profiled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("flux"), {"profile": 1})
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response["X-Profile"], profile.file_name)
+        self.assertTrue((self.directory / profile.file_name).exists())
+        self.assertEqual(profile.view_name, "flux")
+        self.assertIn("views.py", profile.top_functions)
+
+        admin_url = reverse(
+            "admin:website_requestprofile_change", args=[profile.pk]
+        )
+        self.assertContains(self.client.get(admin_url), profile.file_name)
+        download = self.client.get(reverse(
+            "admin:website_requestprofile_download", args=[profile.pk]
+        ))
+        self.assertEqual(download.status_code, 200)
+        download.close()
+
+    def test_header_triggers_profile_and_old_profiles_are_pruned(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse("posts"), headers={"X-Profile": "1"})
+
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        self.assertEqual(len(list(self.directory.glob("*.prof"))), 2)
+
+    def test_profiled_requests_run_one_at_a_time(self):
+        started = threading.Event()
+
+        def concurrent():
+            _measure(started.set)
+
+        def run():
+            thread = threading.Thread(target=concurrent)
+            thread.start()
+            # La mesure en cours garde tracemalloc pour elle seule
+            self.assertFalse(started.wait(0.2))
+            self.assertTrue(tracemalloc.is_tracing())
+            return thread
+
+        thread = _measure(run)[0]
+        thread.join()
+        self.assertTrue(started.is_set())
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_other_users_are_not_profiled(self):
+        self.client.force_login(self.member)
+        response = self.client.get(reverse("flux"), {"profile": 1})
+
+        self.assertNotIn("X-Profile", response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES, METRICS_DIR=None, METRICS_TOKEN=None)
+class MetricsTests(TestCase):
+    """
+    Registre des métriques et point d'accès /metrics/.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.member = User.objects.create_user("member")
+
+    def sample(self, name, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        return collect()[name].get(key)
+
+    def test_records_requests_durations_queries_and_cache(self):
+        self.client.force_login(self.member)
+        requests = self.sample(
+            "litreview_requests_total", method="GET", status=200, view="flux"
+        ) or 0
+        durations = self.sample(
+            "litreview_request_duration_seconds", view="flux"
+        ) or {"count": 0}
+        misses = self.sample(
+            "litreview_feed_cache_total", kind="flux", outcome="miss"
+        ) or 0
+
+        cache.clear()
+        self.client.get(reverse("flux"))
+
+        self.assertEqual(self.sample(
+            "litreview_requests_total", method="GET", status=200, view="flux"
+        ), requests + 1)
+        after = self.sample("litreview_request_duration_seconds", view="flux")
+        self.assertEqual(after["count"], durations["count"] + 1)
+        self.assertGreater(
+            self.sample("litreview_request_queries", view="flux")["sum"], 0
+        )
+        self.assertEqual(self.sample(
+            "litreview_feed_cache_total", kind="flux", outcome="miss"
+        ), misses + 1)
+
+    def test_records_upload_sizes(self):
+        image = BytesIO()
+        Image.new("RGB", (10, 10)).save(image, "PNG")
+        upload = SimpleUploadedFile(
+            "cover.png", image.getvalue(), content_type="image/png"
+        )
+        before = self.sample(
+            "litreview_upload_bytes", view="create_ticket"
+        ) or {"sum": 0}
+
+        self.client.force_login(self.member)
+        with tempfile.TemporaryDirectory() as media, \
+                self.settings(MEDIA_ROOT=media):
+            self.client.post(reverse("create_ticket"), {
+                "title": "Avec image", "description": "", "image": upload
+            })
+
+        after = self.sample("litreview_upload_bytes", view="create_ticket")
+        self.assertEqual(after["sum"] - before["sum"], len(image.getvalue()))
+
+    def test_endpoint_is_restricted_to_staff_or_token(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+        with self.settings(METRICS_TOKEN="secret"):
+            response = self.client.get(
+                reverse("metrics"), headers={"Authorization": "Bearer secret"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertContains(
+            response, "# TYPE litreview_request_duration_seconds histogram"
+        )
+        self.assertContains(response, 'view="metrics",le="+Inf"')
+
+    def test_collect_adds_values_from_other_processes(self):
+        other = Registry()
+        other.inc("litreview_requests_total", 5, view="posts", method="GET",
+                  status=200)
+        local = self.sample(
+            "litreview_requests_total", view="posts", method="GET", status=200
+        ) or 0
+
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(METRICS_DIR=directory):
+            Path(directory, f"{os.getppid()}.json").write_text(
+                json.dumps(other.snapshot()), encoding="utf-8"
+            )
+            registry.flush(force=True)
+            total = self.sample(
+                "litreview_requests_total", view="posts", method="GET",
+                status=200
+            )
+
+        self.assertEqual(total, local + 5)
+
+    def test_collect_skips_ended_and_stale_processes(self):
+        other = Registry()
+        other.inc("litreview_requests_total", 5, view="posts", method="GET",
+                  status=200)
+        local = self.sample(
+            "litreview_requests_total", view="posts", method="GET", status=200
+        ) or 0
+        ended = subprocess.Popen([sys.executable, "-c", ""])
+        ended.wait()
+
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(METRICS_DIR=directory):
+            dead = Path(directory, f"{ended.pid}.json")
+            stale = Path(directory, f"{os.getppid()}.json")
+            for path in (dead, stale):
+                path.write_text(
+                    json.dumps(other.snapshot()), encoding="utf-8"
+                )
+            old = time.time() - STALE_AFTER - 1
+            os.utime(stale, (old, old))
+
+            total = self.sample(
+                "litreview_requests_total", view="posts", method="GET",
+                status=200
+            )
+            self.assertFalse(dead.exists())
+            self.assertTrue(stale.exists())
+
+        self.assertEqual(total or 0, local)
+
+
+@override_settings(
+    CACHES=TEST_CACHES, SLOW_QUERY_THRESHOLD_MS=0.0001, SLOW_QUERY_KEEP=500
+)
+class SlowQueryTests(TestCase):
+    """
+    Relevé des requêtes SQL lentes (website.slow_queries).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user("member")
+
+    def test_records_queries_with_view_and_plan(self):
+        self.client.force_login(self.member)
+        with self.assertLogs("website.slow_queries", "WARNING") as logs:
+            self.client.get(reverse("flux"))
+
+        queries = SlowQuery.objects.filter(view="website.views.flux")
+        self.assertTrue(queries.exists())
+        self.assertEqual(len(logs.records), queries.count())
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], reverse("flux"))
+
+        select = queries.filter(sql__startswith="SELECT").first()
+        self.assertEqual(select.database, "default")
+        self.assertRegex(select.plan, PLAN_PATTERNS[connection.vendor])
+        self.assertFalse(select.plan.startswith("EXPLAIN impossible"))
+
+    def test_keeps_only_latest_queries(self):
+        self.client.force_login(self.member)
+        with self.settings(SLOW_QUERY_KEEP=3), \
+                self.assertLogs("website.slow_queries", "WARNING"):
+            self.client.get(reverse("flux"))
+            self.client.get(reverse("posts"))
+
+        self.assertEqual(SlowQuery.objects.count(), 3)
+        self.assertTrue(all(
+            query.view == "website.views.posts"
+            for query in SlowQuery.objects.all()
+        ))
+
+    def test_masks_params_outside_post_tables(self):
+        self.client.force_login(self.member)
+        with self.assertLogs("website.slow_queries", "WARNING") as logs:
+            self.client.get(reverse("flux"))
+            self.client.post(reverse("create_ticket"), {
+                "title": "Paramètre visible", "description": ""
+            })
+
+        for table in ("auth_user", "django_session"):
+            with self.subTest(table=table):
+                queries = SlowQuery.objects.filter(
+                    sql__contains=f'FROM "{table}"'
+                )
+                self.assertTrue(queries.exists())
+                self.assertEqual(
+                    set(queries.values_list("params", flat=True)),
+                    {'"masqués"'}
+                )
+        self.assertNotIn(self.member.password, "".join(logs.output))
+        self.assertTrue(SlowQuery.objects.filter(
+            sql__startswith='INSERT INTO "website_ticket"',
+            params__contains="Paramètre visible"
+        ).exists())
+
+    def test_explain_queries_are_not_observed(self):
+        recorder, counter = SlowQueryRecorder(), QueryCounter()
+        with observe_queries(counter), observe_queries(recorder):
+            User.objects.filter(username="member").exists()
+
+        self.assertEqual(counter.count, 1)
+        [record] = recorder.records
+        self.assertRegex(record["plan"], PLAN_PATTERNS[connection.vendor])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_disabled_without_threshold(self):
+        self.client.force_login(self.member)
+        self.client.get(reverse("flux"))
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RelationTests(TestCase):
+    """
+    Abonnements et blocages (website.relations) : table Relation,
+    compteurs des profils et flux.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.carol = User.objects.create_user("carol")
+        cls.ticket = Ticket.objects.create(user=cls.bob, title="De Bob")
+
+    def counters(self, user):
+        profile = Profile.objects.get(user=user)
+        return (
+            profile.following_count,
+            profile.followers_count,
+            profile.blocked_count,
+        )
+
+    def in_feed(self, user, ticket):
+        return FeedEntry.objects.filter(viewer=user, ticket=ticket).exists()
+
+    def test_follow_and_unfollow_update_counters_and_feed(self):
+        added = relations.follow(
+            self.alice, [self.bob.pk, self.carol.pk, self.alice.pk, 0]
+        )
+        self.assertEqual(added, {self.bob.pk, self.carol.pk})
+        self.assertEqual(relations.follow(self.alice, [self.bob.pk]), set())
+        self.assertEqual(self.counters(self.alice), (2, 0, 0))
+        self.assertEqual(self.counters(self.bob), (0, 1, 0))
+        self.assertTrue(self.in_feed(self.alice, self.ticket))
+        self.assertEqual(
+            relations.relation_page(self.bob, "followers").users, [self.alice]
+        )
+
+        self.assertEqual(
+            relations.unfollow(self.alice, [self.bob.pk]), {self.bob.pk}
+        )
+        self.assertEqual(self.counters(self.alice), (1, 0, 0))
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+        self.assertFalse(self.in_feed(self.alice, self.ticket))
+
+    def test_block_removes_follows_in_both_directions(self):
+        relations.follow(self.alice, [self.bob.pk])
+        relations.follow(self.bob, [self.alice.pk])
+
+        self.assertEqual(
+            relations.block(self.bob, [self.alice.pk]), {self.alice.pk}
+        )
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+        self.assertEqual(self.counters(self.bob), (0, 0, 1))
+        self.assertFalse(self.in_feed(self.alice, self.ticket))
+        self.assertEqual(relations.follow(self.alice, [self.bob.pk]), set())
+
+        relations.unblock(self.bob, [self.alice.pk])
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+        self.assertEqual(
+            relations.follow(self.alice, [self.bob.pk]), {self.bob.pk}
+        )
+        self.assertTrue(self.in_feed(self.alice, self.ticket))
+
+    def test_blocking_several_followers_decrements_each_counter(self):
+        relations.follow(self.bob, [self.alice.pk])
+        relations.follow(self.carol, [self.alice.pk])
+        relations.follow(self.alice, [self.bob.pk, self.carol.pk])
+
+        relations.block(self.alice, [self.bob.pk, self.carol.pk])
+
+        self.assertEqual(self.counters(self.alice), (0, 0, 2))
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+        self.assertFalse(relations.stale_counters().exists())
+
+    def test_block_and_unfollow_hundreds_of_users(self):
+        users = User.objects.bulk_create(
+            User(username=f"many-{index}", password="!")
+            for index in range(600)
+        )
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+        ids = [user.pk for user in users]
+        Relation.objects.bulk_create(
+            Relation(user=user, target=self.alice, kind=Relation.FOLLOW)
+            for user in users
+        )
+        relations.recount_relations()
+        relations.follow(self.alice, ids)
+
+        self.assertEqual(len(relations.unfollow(self.alice, ids[:300])), 300)
+        self.assertEqual(len(relations.block(self.alice, ids)), 600)
+
+        self.assertEqual(self.counters(self.alice), (0, 0, 600))
+        self.assertFalse(
+            Relation.objects.filter(kind=Relation.FOLLOW).exists()
+        )
+        self.assertFalse(relations.stale_counters().exists())
+
+    def test_deleting_a_user_recounts_related_profiles(self):
+        relations.follow(self.alice, [self.bob.pk])
+        relations.block(self.carol, [self.bob.pk])
+
+        self.bob.delete()
+
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+
+    def test_create_profiles_repairs_stale_counters(self):
+        relations.follow(self.alice, [self.bob.pk])
+        Profile.objects.filter(user=self.bob).update(followers_count=5)
+
+        output = StringIO()
+        call_command("create_profiles", "--check", stdout=output)
+        self.assertIn("1 profils aux compteurs faussés", output.getvalue())
+
+        call_command("create_profiles", stdout=StringIO())
+        self.assertEqual(self.counters(self.bob), (0, 1, 0))
+        self.assertFalse(relations.stale_counters().exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RelationApiTests(TestCase):
+    """
+    API JSON des abonnements et blocages (vue update_relations).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user("viewer")
+        cls.others = [
+            User.objects.create_user(f"other-{index}") for index in range(40)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.viewer)
+
+    def post(self, action, data):
+        return self.client.post(
+            reverse("update_relations", args=[action]),
+            json.dumps(data), content_type="application/json"
+        )
+
+    def test_batch_follow_reports_each_user(self):
+        first, second = self.others[:2]
+        relations.follow(self.viewer, [first.pk])
+
+        response = self.post("follow", {
+            "usernames": [first.username, "inconnu", "viewer"],
+            "ids": [second.pk, 0],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "changed": [second.username],
+            "unchanged": [first.username, "viewer"],
+            "not_found": ["inconnu", 0],
+            "counts": {"following": 2, "followers": 0, "blocked": 0},
+        })
+
+    def test_block_and_unblock(self):
+        target = self.others[0]
+        relations.follow(target, [self.viewer.pk])
+
+        data = self.post("block", {"ids": [target.pk]}).json()
+        self.assertEqual(data["changed"], [target.username])
+        self.assertEqual(data["counts"]["followers"], 0)
+        self.assertEqual(data["counts"]["blocked"], 1)
+
+        data = self.post("unblock", {"usernames": [target.username]}).json()
+        self.assertEqual(data["changed"], [target.username])
+        self.assertEqual(data["counts"]["blocked"], 0)
+
+    def test_batch_block_of_followers_reports_exact_counts(self):
+        followers = self.others[:3]
+        for follower in followers:
+            relations.follow(follower, [self.viewer.pk])
+        relations.follow(self.viewer, [followers[0].pk])
+
+        data = self.post(
+            "block", {"ids": [user.pk for user in followers]}
+        ).json()
+
+        self.assertEqual(data["counts"], {
+            "following": 0, "followers": 0, "blocked": 3
+        })
+        profile = Profile.objects.get(user=self.viewer)
+        self.assertEqual(profile.followers_count, 0)
+        self.assertFalse(relations.stale_counters().exists())
+        for follower in followers:
+            self.assertEqual(
+                Profile.objects.get(user=follower).following_count, 0
+            )
+
+    def test_block_and_unblock_a_full_batch(self):
+        users = User.objects.bulk_create(
+            User(username=f"batch-{index}", password="!")
+            for index in range(relations.MAX_BATCH)
+        )
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+        usernames = [user.username for user in users]
+        Relation.objects.bulk_create(
+            Relation(user=user, target=self.viewer, kind=Relation.FOLLOW)
+            for user in users
+        )
+        relations.recount_relations()
+
+        response = self.post("block", {"usernames": usernames})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["counts"], {
+            "following": 0, "followers": 0, "blocked": relations.MAX_BATCH
+        })
+
+        response = self.post("unblock", {"usernames": usernames})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["changed"]), relations.MAX_BATCH)
+        self.assertFalse(relations.stale_counters().exists())
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.post("mute", {"ids": [1]}).status_code, 404)
+        self.assertEqual(self.post("follow", ["viewer"]).status_code, 400)
+        for ids in (["a"], [3.9], [True], ["5"]):
+            with self.subTest(ids=ids):
+                self.assertEqual(
+                    self.post("follow", {"ids": ids}).status_code, 400
+                )
+        self.assertEqual(
+            self.post("follow", {"usernames": "viewer"}).status_code, 400
+        )
+        self.assertEqual(
+            self.post(
+                "follow", {"ids": list(range(relations.MAX_BATCH + 1))}
+            ).status_code,
+            400
+        )
+        response = self.client.get(
+            reverse("update_relations", args=["follow"])
+        )
+        self.assertEqual(response.status_code, 405)
+
+    def test_cost_does_not_grow_with_follows(self):
+        def follow_queries(target):
+            with CaptureQueriesContext(connection) as queries:
+                self.post("follow", {"usernames": [target.username]})
+            return len(queries)
+
+        few = follow_queries(self.others[0])
+        relations.follow(self.viewer, [user.pk for user in self.others[1:-1]])
+        many = follow_queries(self.others[-1])
+        self.assertEqual(few, many)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FollowsListTests(TestCase):
+    """
+    Listes paginées de la page "follows" et chargement des pages suivantes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user("viewer")
+        cls.users = User.objects.bulk_create(
+            User(username=f"user-{index:02}")
+            for index in range(relations.LIST_PAGE_SIZE + 5)
+        )
+        Relation.objects.bulk_create(
+            Relation(user=user, target=cls.viewer, kind=Relation.FOLLOW)
+            for user in cls.users
+        )
+        relations.recount_relations()
+
+    def setUp(self):
+        self.client.force_login(self.viewer)
+
+    def test_pages_follow_the_cursor(self):
+        pages = []
+        cursor = None
+        while True:
+            page = relations.relation_page(
+                self.viewer, "followers", cursor, page_size=20
+            )
+            pages.append(page.users)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        self.assertEqual([len(users) for users in pages], [20, 20, 15])
+        self.assertEqual(sum(pages, []), self.users)
+        self.assertEqual(
+            relations.relation_page(self.viewer, "followers", "x").users[0],
+            self.users[0]
+        )
+
+    def test_page_is_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            page = relations.relation_page(self.viewer, "followers")
+            [user.username for user in page.users]
+
+    def test_follows_page_shows_first_page(self):
+        last = self.users[relations.LIST_PAGE_SIZE - 1]
+        response = self.client.get(reverse("follows"))
+
+        self.assertContains(response, f"Abonnés ({len(self.users)})")
+        self.assertContains(response, f"../block/user_{self.users[0].pk}/")
+        self.assertContains(response, f'data-next-cursor="{last.pk}"')
+        self.assertNotContains(response, self.users[-1].username)
+
+    def test_load_more_endpoint(self):
+        url = reverse("follows_page", args=["followers"])
+        cursor = self.users[-3].pk
+        data = self.client.get(url, {"cursor": cursor}).json()
+
+        self.assertEqual(data, {
+            "users": [
+                {"id": user.pk, "username": user.username}
+                for user in self.users[-2:]
+            ],
+            "next_cursor": None,
+        })
+        self.assertEqual(
+            self.client.get(
+                reverse("follows_page", args=["nobody"])
+            ).status_code,
+            404
+        )
@@ -1,25 +1,53 @@
+import json
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User
-from django.db.models import Value, BooleanField, F, Q
-from .models import Ticket, Review
+from .models import Profile, Ticket, Review
 from django.core.exceptions import ValidationError
-from django.http import JsonResponse, HttpRequest
-from itertools import chain
-from . import forms
-from .functions import clear_messages, handle_action
+from django.http import (
+    HttpResponse, HttpResponseForbidden, JsonResponse, HttpRequest,
+    StreamingHttpResponse
+)
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_POST
+from . import forms, relations
+from .cache import cache_stats, cached_feed, feed_etag
+from .exchange import CONTENT_TYPES, encode_rows, user_rows
+from .feed import (
+    feed_page, iter_feed_page, iter_merged_feed, latest_feed_post,
+    latest_user_post, merged_feed, stream_feed_json
+)
+from . import metrics as metrics_registry
+from .functions import (
+    clear_messages, conditional_page, handle_action, stream_page
+)
+from .routers import read_only_view
 
 
 @login_required
+@read_only_view
+@conditional_page(
+    lambda request: feed_etag("flux", request),
+    lambda request: latest_feed_post(request.user)
+)
 def flux(request: HttpRequest):
     """
     Vue pour afficher le flux des tickets et critiques.
 
     Cette vue récupère et combine les tickets et critiques de l'utilisateur,
     des utilisateurs suivis, et des critiques sur les tickets de l'utilisateur.
-    Les résultats sont triés par date de création et rendus
-    dans le template "website/flux.html".
+    Les résultats sont lus dans le flux matérialisé (FeedEntry), triés
+    par date de création et rendus dans le template "website/flux.html",
+    une page à la fois (paramètre GET "cursor").
+    Le contenu de la page est mis en cache jusqu'au prochain changement
+    des posts visibles par l'utilisateur, et le navigateur reçoit
+    une réponse "304 Not Modified" s'il possède déjà la page à jour.
+    Si FEED_STREAMING est activé, la page est envoyée en flux continu,
+    au fur et à mesure de la lecture des posts, sans passer par le cache
+    des pages.
 
     Args:
         request (HttpRequest): L'objet de requête HTTP.
@@ -28,58 +56,34 @@ def flux(request: HttpRequest):
         HttpResponse: La réponse HTTP avec le template rendu.
     """
 
-    # Utilisateurs suivis par l'utilisateur actuel
-    followed_profiles = request.user.profile.follows.all()
-
-    # Tickets de l'utilisateur et des utilisateurs suivis
-    # Ajoute un champ "is_ticket" pour distinguer les tickets des critiques
-    tickets = Ticket.objects.filter(
-        Q(user__profile__in=followed_profiles) | Q(user=request.user)
-    ).exclude(
-        Q(user__profile__blocked=request.user.profile) | Q(user__profile__in=request.user.profile.blocked.all())
-    ).annotate(
-        is_ticket=Value(True, output_field=BooleanField())
-    ).select_related("user").order_by("-time_created")
-
-    # Critiques de l'utilisateur et des utilisateurs suivis
-    # Ajoute un champ "is_ticket" pour distinguer les critiques des tickets
-    # Renomme le champ "headline" en "title"
-    reviews = Review.objects.filter(
-        Q(user__profile__in=followed_profiles)
-        | Q(user=request.user)
-        | Q(ticket__user__profile__in=followed_profiles)
-    ).exclude(
-        Q(user__profile__blocked=request.user.profile)
-        | Q(ticket__user__profile__blocked=request.user.profile)
-        | Q(user__profile__in=request.user.profile.blocked.all())
-        | Q(ticket__user__profile__in=request.user.profile.blocked.all())
-    ).annotate(
-        is_ticket=Value(False, output_field=BooleanField()),
-        title=F("headline")
-    ).select_related("user", "ticket").order_by("-time_created")
-
-    # Tickets déjà critiqués sur l'application
-    reviewed_tickets = set(Review.objects.filter(
-        Q(user__profile__in=followed_profiles) | Q(user=request.user)
-    ).values_list("ticket_id", flat=True))
-
-    posts = sorted(
-        chain(tickets, reviews),
-        key=lambda x: x.time_created,
-        reverse=True
+    cursor = request.GET.get("cursor")
+
+    if settings.FEED_STREAMING:
+        return stream_page(
+            request,
+            "website/flux.html",
+            "website/cards/flux-card.html",
+            "website/cards/flux-more.html",
+            iter_feed_page(request.user, cursor=cursor)
+        )
+
+    page = cached_feed(
+        "flux", request.user, cursor,
+        lambda: feed_page(request.user, cursor=cursor)
     )
 
     return render(
         request,
         "website/flux.html",
         context={
-            "posts": posts,
-            "reviewed_tickets": reviewed_tickets
+            "posts": page.posts,
+            "next_cursor": page.next_cursor
         }
     )
 
 
 @login_required
+@read_only_view
 @clear_messages
 def follows(request: HttpRequest):
     """
@@ -89,6 +93,9 @@ def follows(request: HttpRequest):
     de suivre d'autres utilisateurs.
     Elle traite également les soumissions de formulaire pour ajouter
     de nouveaux utilisateurs à la liste des suivis.
+    Chaque liste est paginée par un curseur (paramètres GET "following",
+    "followers" et "blocked") ; les pages suivantes sont chargées
+    par la vue follows_page.
 
     Args:
         request (HttpRequest): L'objet de requête HTTP.
@@ -100,16 +107,16 @@ def follows(request: HttpRequest):
     Context:
         form (FollowUserForm): Le formulaire pour suivre un utilisateur.
         message (str): Un message indiquant le résultat de l'action de suivi.
-        followed_users (QuerySet): La liste des utilisateurs suivis
+        profile (Profile): Le profil de l'utilisateur connecté,
+        avec le nombre d'abonnements, d'abonnés et de blocages.
+        following (RelationPage): La première page des utilisateurs suivis
         par l'utilisateur connecté.
-        followers (QuerySet): La liste des utilisateurs qui suivent
-        l'utilisateur connecté.
+        followers (RelationPage): La première page des utilisateurs
+        qui suivent l'utilisateur connecté.
+        blocked_users (RelationPage): La première page des utilisateurs
+        bloqués.
     """
 
-    following = request.user.profile.follows.all()
-    followers = request.user.profile.followed_by.all()
-    blocked_users = request.user.profile.blocked.all()
-
     if request.method == "POST":
         form = forms.FollowUserForm(request.POST)
 
@@ -117,19 +124,23 @@ def follows(request: HttpRequest):
             username = form.cleaned_data["username"]
 
             def action():
-                if not User.objects.filter(username=username).exists():
-                    raise ValueError("Cet utilisateur n'existe pas !")
-                elif request.user.username == username:
+                if request.user.username == username:
                     raise ValueError(
                         "Vous ne pouvez pas vous suivre vous-même !"
                         )
 
-                user_to_follow = User.objects.get(username=username)
+                user_id = User.objects.filter(
+                    username=username
+                ).values_list("pk", flat=True).first()
 
-                if user_to_follow.profile in following:
+                if user_id is None:
+                    raise ValueError("Cet utilisateur n'existe pas !")
+                elif relations.is_following(request.user, user_id):
                     raise ValueError("Vous suivez déjà cet utilisateur !")
-                else:
-                    request.user.profile.follows.add(user_to_follow.profile)
+                elif not relations.follow(request.user, [user_id]):
+                    raise ValueError(
+                        "Vous ne pouvez pas suivre cet utilisateur !"
+                        )
 
             return handle_action(
                 request,
@@ -141,11 +152,17 @@ def follows(request: HttpRequest):
     else:
         form = forms.FollowUserForm()
 
+    following, followers, blocked_users = (
+        relations.relation_page(request.user, name, request.GET.get(name))
+        for name in ("following", "followers", "blocked")
+    )
+
     return render(
         request,
         "website/follows.html",
         context={
             "form": form,
+            "profile": request.user.profile,
             "following": following,
             "followers": followers,
             "blocked_users": blocked_users
@@ -153,6 +170,40 @@ def follows(request: HttpRequest):
     )
 
 
+@login_required
+@read_only_view
+def follows_page(request: HttpRequest, name: str):
+    """
+    Retourne une page d'une liste de la page "follows" au format JSON,
+    à partir d'un curseur.
+
+    Utilisée par les boutons "Afficher plus" de la page "follows".
+
+    Args:
+        request (HttpRequest): La requête HTTP contenant
+        le paramètre "cursor".
+        name (str): "following", "followers" ou "blocked".
+
+    Returns:
+        JsonResponse: Les utilisateurs de la page ("users", avec leur
+        identifiant et leur nom) et le curseur de la page suivante
+        ("next_cursor").
+    """
+
+    if name not in relations.LISTS:
+        return JsonResponse({"error": "Liste inconnue."}, status=404)
+
+    page = relations.relation_page(
+        request.user, name, request.GET.get("cursor")
+    )
+    return JsonResponse({
+        "users": [
+            {"id": user.pk, "username": user.username} for user in page.users
+        ],
+        "next_cursor": page.next_cursor,
+    })
+
+
 @login_required
 def unfollow(request: HttpRequest, user_id: str):
     """
@@ -182,8 +233,7 @@ def unfollow(request: HttpRequest, user_id: str):
             raise ValueError(
                 "Vous ne pouvez pas vous désabonner de vous-même !"
                 )
-        user_to_unfollow = User.objects.get(id=user_id)
-        request.user.profile.follows.remove(user_to_unfollow.profile)
+        relations.unfollow(request.user, [user_id])
 
     return handle_action(
         request,
@@ -214,9 +264,7 @@ def block(request: HttpRequest, user_id: str):
             raise ValueError("Cet utilisateur n'existe pas !")
         elif user_id == request.user.id:
             raise ValueError("Vous ne pouvez pas vous bloquer vous-même !")
-        user_to_block = User.objects.get(id=user_id)
-        request.user.profile.blocked.add(user_to_block.profile)
-        request.user.profile.follows.remove(user_to_block.profile)
+        relations.block(request.user, [user_id])
 
     return handle_action(
         request,
@@ -246,8 +294,7 @@ def unblock(request, user_id):
     def action():
         if not User.objects.filter(id=user_id).exists():
             raise ValueError("Cet utilisateur n'existe pas !")
-        user_to_unblock = User.objects.get(id=user_id)
-        request.user.profile.blocked.remove(user_to_unblock.profile)
+        relations.unblock(request.user, [user_id])
 
     return handle_action(
         request,
@@ -258,7 +305,91 @@ def unblock(request, user_id):
     )
 
 
+def _batch(data, key: str, value_type):
+    """
+    Liste de valeurs d'un corps JSON, toutes du type value_type.
+
+    Raises:
+        ValueError: Si la valeur n'est pas une liste de valeurs de ce type.
+    """
+
+    values = data.get(key, [])
+    if not isinstance(values, list):
+        raise ValueError(f'"{key}" doit être une liste.')
+    # Type exact : 3.9 ou true ne sont pas des identifiants
+    if any(type(value) is not value_type for value in values):
+        raise ValueError(f'"{key}" contient une valeur invalide.')
+    return values
+
+
 @login_required
+@require_POST
+def update_relations(request: HttpRequest, action: str):
+    """
+    Abonne, désabonne, bloque ou débloque un lot d'utilisateurs (API JSON).
+
+    Le corps de la requête est un objet JSON listant les utilisateurs
+    visés par leur nom ("usernames") et/ou leur identifiant ("ids"),
+    au plus MAX_BATCH. Les utilisateurs sont identifiés en une requête
+    et l'opération est appliquée au lot en une transaction : son coût
+    ne dépend pas du nombre d'abonnements existants.
+
+    Args:
+        request (HttpRequest): La requête HTTP POST.
+        action (str): "follow", "unfollow", "block" ou "unblock".
+
+    Returns:
+        JsonResponse: Les noms des utilisateurs dont la relation
+        a changé ("changed"), de ceux déjà dans l'état demandé
+        ou pour lesquels l'action est impossible ("unchanged"),
+        les noms et identifiants introuvables ("not_found"),
+        et les compteurs du profil ("counts").
+        Une erreur 400 ou 404 contient un message ("error").
+    """
+
+    operation = relations.ACTIONS.get(action)
+    if operation is None:
+        return JsonResponse({"error": "Action inconnue."}, status=404)
+
+    try:
+        data = json.loads(request.body or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("Le corps doit être un objet JSON.")
+        usernames = _batch(data, "usernames", str)
+        ids = _batch(data, "ids", int)
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+
+    if len(usernames) + len(ids) > relations.MAX_BATCH:
+        return JsonResponse(
+            {"error": f"Au plus {relations.MAX_BATCH} utilisateurs."},
+            status=400
+        )
+
+    users = relations.resolve_users(usernames, ids)
+    changed = operation(request.user, users)
+    found = set(users.values())
+    counts = Profile.objects.filter(user=request.user).values(
+        "following_count", "followers_count", "blocked_count"
+    ).first() or {}
+
+    return JsonResponse({
+        "changed": sorted(users[pk] for pk in changed),
+        "unchanged": sorted(
+            username for pk, username in users.items() if pk not in changed
+        ),
+        "not_found": [name for name in usernames if name not in found]
+        + [pk for pk in ids if pk not in users],
+        "counts": {
+            "following": counts.get("following_count", 0),
+            "followers": counts.get("followers_count", 0),
+            "blocked": counts.get("blocked_count", 0),
+        },
+    })
+
+
+@login_required
+@read_only_view
 def search_users(request: HttpRequest):
     """
     Recherche des utilisateurs dont le nom d'utilisateur
@@ -291,6 +422,77 @@ def search_users(request: HttpRequest):
     return JsonResponse({}, safe=False)
 
 
+@login_required
+@read_only_view
+def feed_posts(request: HttpRequest):
+    """
+    Retourne une page du flux au format JSON, à partir d'un curseur.
+
+    Utilisée par le défilement infini de la page "flux" :
+    la réponse est diffusée au fur et à mesure de la sérialisation
+    des posts.
+
+    Args:
+        request (HttpRequest): La requête HTTP contenant
+        le paramètre "cursor".
+
+    Returns:
+        StreamingHttpResponse: Un document JSON contenant les posts
+        de la page ("posts") et le curseur de la page suivante
+        ("next_cursor").
+    """
+
+    return StreamingHttpResponse(
+        stream_feed_json(request.user, cursor=request.GET.get("cursor")),
+        content_type="application/json"
+    )
+
+
+@staff_member_required
+def feed_cache_stats(request: HttpRequest):
+    """
+    Retourne les statistiques du cache des flux (réservé au staff).
+
+    Args:
+        request (HttpRequest): La requête HTTP.
+
+    Returns:
+        JsonResponse: Nombre de succès, d'échecs et taux de succès
+        du cache des pages "flux" et "posts".
+    """
+
+    return JsonResponse(cache_stats())
+
+
+def metrics(request: HttpRequest):
+    """
+    Retourne les métriques de l'application au format texte
+    de Prometheus (réservé au staff).
+
+    Un collecteur peut aussi y accéder sans session, avec l'en-tête
+    "Authorization: Bearer <METRICS_TOKEN>".
+
+    Args:
+        request (HttpRequest): La requête HTTP.
+
+    Returns:
+        HttpResponse: Les métriques de tous les processus du serveur.
+    """
+
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    authorized = request.user.is_staff or (
+        token and constant_time_compare(authorization, f"Bearer {token}")
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @login_required
 @clear_messages
 def create_ticket(request: HttpRequest):
@@ -389,9 +591,14 @@ def edit_post(request, post_id, post_type):
         )
 
         if form.is_valid():
-            form.save()
-            messages.success(request, success_message)
-            return redirect("posts")
+            try:
+                form.save()
+            except ValidationError as error:
+                # Titre déjà utilisé, détecté par la contrainte d'unicité
+                form.add_error(None, error)
+            else:
+                messages.success(request, success_message)
+                return redirect("posts")
     else:
         form = (
             forms.TicketForm(instance=post) if post_type == "ticket"
@@ -444,6 +651,11 @@ def delete_post(request, post_id, post_type):
 
 
 @login_required
+@read_only_view
+@conditional_page(
+    lambda request: feed_etag("posts", request),
+    lambda request: latest_user_post(request.user)
+)
 def posts(request):
     """
     Gère l'affichage des posts de l'utilisateur connecté.
@@ -460,42 +672,76 @@ def posts(request):
         et le contexte contenant les posts de l'utilisateur.
 
     Contexte:
-        posts (list): Liste des tickets et critiques de l'utilisateur,
+        posts (list): Page des tickets et critiques de l'utilisateur,
         triée par date de création décroissante.
+        next_cursor (str | None): Curseur de la page suivante.
+
+    Si FEED_STREAMING est activé, le haut de la page est envoyé avant
+    la lecture des posts, qui sont ensuite rendus un à un au fur et
+    à mesure de leur lecture, sans passer par le cache des pages.
     """
 
-    tickets = (
-        Ticket.objects.filter(user=request.user)
-        .annotate(is_ticket=Value(True, output_field=BooleanField()))
-        .select_related("user")
-        .order_by("-time_created")
-        )
+    cursor = request.GET.get("cursor")
+    tickets = Ticket.objects.filter(user=request.user)
+    reviews = Review.objects.filter(user=request.user)
 
-    reviews = (
-        Review.objects.filter(user=request.user)
-        .annotate(
-            is_ticket=Value(False, output_field=BooleanField()),
-            title=F("headline")
-            )
-        .select_related("user", "ticket")
-        .order_by("-time_created")
-    )
+    if settings.FEED_STREAMING:
+        return stream_page(
+            request,
+            "website/posts.html",
+            "website/cards/posts-card.html",
+            "website/cards/posts-more.html",
+            iter_merged_feed(tickets, reviews, cursor=cursor)
+        )
 
-    user_posts = sorted(
-        chain(tickets, reviews),
-        key=lambda x: x.time_created,
-        reverse=True
+    page = cached_feed(
+        "posts", request.user, cursor,
+        lambda: merged_feed(tickets, reviews, cursor=cursor)
     )
 
     return render(
         request,
         "website/posts.html",
         context={
-            "posts": user_posts
+            "posts": page.posts,
+            "next_cursor": page.next_cursor
         }
     )
 
 
+@login_required
+def export_posts(request: HttpRequest):
+    """
+    Télécharge les tickets, critiques, abonnements et blocages
+    de l'utilisateur connecté.
+
+    Le fichier est envoyé en flux continu, au fur et à mesure de la lecture
+    de la base de données : la mémoire utilisée ne dépend pas du nombre
+    de posts.
+
+    Args:
+        request (HttpRequest): La requête HTTP, dont le paramètre GET
+        "format" vaut "jsonl" (par défaut) ou "csv".
+
+    Returns:
+        StreamingHttpResponse: Le fichier, en pièce jointe.
+    """
+
+    file_format = request.GET.get("format", "jsonl")
+    if file_format not in CONTENT_TYPES:
+        file_format = "jsonl"
+
+    response = StreamingHttpResponse(
+        encode_rows(user_rows(request.user), file_format),
+        content_type=CONTENT_TYPES[file_format]
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="litreview-{request.user.username}'
+        f'.{file_format}"'
+    )
+    return response
+
+
 @login_required
 @clear_messages
 def create_standalone_review(request):
@@ -525,21 +771,26 @@ def create_standalone_review(request):
         if ticket_form.is_valid():
             ticket: Ticket = ticket_form.save(commit=False)
             ticket.user = request.user
-            ticket.save()
-
-            if review_form.is_valid():
-                review: Review = review_form.save(commit=False)
-                review.ticket = ticket
-                review.user = request.user
-                review.save()
-
-                messages.success(request, "Critique créée avec succès !")
-                return redirect("flux")
+            try:
+                ticket.save()
+            except ValidationError as error:
+                ticket_form.add_error(None, error)
+                for message in error.messages:
+                    messages.error(request, message)
             else:
-                ticket.delete()
-                messages.error(
-                    request, "Erreur lors de la création de la critique."
-                    )
+                if review_form.is_valid():
+                    review: Review = review_form.save(commit=False)
+                    review.ticket = ticket
+                    review.user = request.user
+                    review.save()
+
+                    messages.success(request, "Critique créée avec succès !")
+                    return redirect("flux")
+                else:
+                    ticket.delete()
+                    messages.error(
+                        request, "Erreur lors de la création de la critique."
+                        )
         else:
             messages.error(request, "Erreur lors de la création du ticket.")
     else:
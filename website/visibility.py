@@ -0,0 +1,116 @@
+import json
+from array import array
+from typing import NamedTuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Expression, Q
+from .cache import feed_version
+from .models import Relation
+
+
+AUTHORS_KEY = "feed:authors:{user_id}:{version}"
+
+
+class VisibleAuthors(NamedTuple):
+    """
+    Auteurs visibles par un utilisateur, sous forme de tableaux triés
+    d'identifiants d'utilisateurs.
+
+    Attributs:
+        authors (array): Auteurs dont les posts sont visibles :
+        l'utilisateur et ses abonnements, hors utilisateurs masqués.
+        followed (array): Utilisateurs suivis, hors utilisateurs masqués.
+        hidden (array): Utilisateurs bloqués par l'utilisateur
+        ou qui l'ont bloqué.
+    """
+
+    authors: array
+    followed: array
+    hidden: array
+
+
+def _compute_visible_authors(user):
+    """
+    Calcule les auteurs visibles par un utilisateur à partir
+    de ses abonnements et blocages.
+    """
+
+    # Relations de l'utilisateur et blocages qui le visent,
+    # lus en une requête sur les deux index de Relation
+    relations = Relation.objects.filter(
+        Q(user=user) | Q(target=user, kind=Relation.BLOCK)
+    ).values_list("user_id", "target_id", "kind")
+
+    followed = set()
+    hidden = set()
+    for user_id, target_id, kind in relations:
+        if kind == Relation.FOLLOW:
+            followed.add(target_id)
+        else:
+            hidden.add(target_id if user_id == user.pk else user_id)
+
+    followed -= hidden
+
+    return VisibleAuthors(
+        array("q", sorted(followed | {user.pk})),
+        array("q", sorted(followed)),
+        array("q", sorted(hidden))
+    )
+
+
+def visible_authors(user):
+    """
+    Retourne les auteurs visibles par un utilisateur.
+
+    La clé du cache contient la version du flux de l'utilisateur
+    (Profile.feed_version), incrémentée à chaque changement d'abonnement
+    ou de blocage le concernant : comme pour les pages, tous les processus
+    cessent de lire l'ancienne valeur dès la validation du changement,
+    même avec un cache propre à chaque processus.
+
+    La valeur n'est mise en cache qu'à la validation de la transaction
+    en cours : des relations modifiées puis annulées n'y entrent jamais.
+
+    Args:
+        user (User): L'utilisateur concerné.
+
+    Returns:
+        VisibleAuthors: Les utilisateurs suivis et masqués.
+    """
+
+    key = AUTHORS_KEY.format(user_id=user.pk, version=feed_version(user))
+    authors = cache.get(key)
+
+    if authors is None:
+        authors = _compute_visible_authors(user)
+        transaction.on_commit(
+            lambda: cache.set(key, authors, settings.FEED_CACHE_TIMEOUT)
+        )
+
+    return authors
+
+
+class IdList(Expression):
+    """
+    Liste d'identifiants utilisable comme valeur d'un filtre "__in".
+
+    La liste est transmise à la base de données en un seul paramètre
+    (tableau JSON pour SQLite, tableau pour PostgreSQL) : la requête
+    reste courte et rapide à compiler, quelle que soit la taille
+    de la liste.
+    """
+
+    def __init__(self, ids):
+        super().__init__(output_field=models.BigIntegerField())
+        self.ids = list(ids)
+
+    def as_sql(self, compiler, connection):
+        placeholders = ", ".join(["%s"] * len(self.ids)) or "NULL"
+        return f"({placeholders})", self.ids
+
+    def as_sqlite(self, compiler, connection):
+        return "(SELECT value FROM json_each(%s))", [json.dumps(self.ids)]
+
+    def as_postgresql(self, compiler, connection):
+        return "(SELECT unnest(%s::bigint[]))", [self.ids]